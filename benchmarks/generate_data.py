@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+r"""
+Generate synthetic OMNeT++ SQLite result files for benchmarking.
+
+The files contain the tables of `sql_model.OmnetppTableModel`, with one run per
+file. Every combination of the values of the iteration variables is repeated
+`repetitions` times, each one resulting in one file. The run attributes and
+parameters are filled in like the ones written by OMNeT++, so the tag
+extraction finds the iteration variables, e.g. `$period=0.1s` in the
+`iterationvars` attribute and `**.vehicle_rate` in the `runParam` table.
+
+Every module records the same set of vectors at its own events: the vectors
+`positionX:vector` and `positionY:vector` and `vectors` signals named
+`signal<k>:vector`. The events of all modules are interleaved, like in the
+`vectorData` table of a real simulation. Each module also has `scalars`
+scalars named `signal<k>:last` and `statistics` statistics named
+`signal<k>:stats`.
+"""
+
+import sys
+import argparse
+import itertools
+import json
+import logging
+import pathlib
+import sqlite3
+import time
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# ---
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+from common.logging_facilities import logi, loge, logd, logw \
+                                        , setup_logging_defaults, set_logging_level
+
+
+# The SQL statements of OMNeT++ for creating the tables, see `sql_model.OmnetppTableModel`
+CREATE_TABLE_STATEMENTS = [
+      """CREATE TABLE run ( runId       INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL
+                          , runName     TEXT NOT NULL
+                          , simtimeExp  INTEGER NOT NULL );"""
+    , """CREATE TABLE runAttr ( runId       INTEGER  NOT NULL REFERENCES run(runId) ON DELETE CASCADE
+                              , attrName    TEXT NOT NULL
+                              , attrValue   TEXT NOT NULL );"""
+    , """CREATE TABLE runParam ( runId       INTEGER NOT NULL REFERENCES run(runId) ON DELETE CASCADE
+                               , paramKey    TEXT NOT NULL
+                               , paramValue  TEXT NOT NULL
+                               , paramOrder  INTEGER NOT NULL );"""
+    , """CREATE TABLE scalar ( scalarId      INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL
+                             , runId         INTEGER  NOT NULL REFERENCES run(runId) ON DELETE CASCADE
+                             , moduleName    TEXT NOT NULL
+                             , scalarName    TEXT NOT NULL
+                             , scalarValue   REAL );"""
+    , """CREATE TABLE statistic ( statId        INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL
+                                , runId         INTEGER NOT NULL REFERENCES run(runId) ON DELETE CASCADE
+                                , moduleName    TEXT NOT NULL, statName      TEXT NOT NULL
+                                , isHistogram   INTEGER NOT NULL
+                                , isWeighted    INTEGER NOT NULL
+                                , statCount     INTEGER NOT NULL
+                                , statMean      REAL
+                                , statStddev    REAL
+                                , statSum       REAL
+                                , statSqrsum    REAL
+                                , statMin       REAL
+                                , statMax       REAL
+                                , statWeights          REAL
+                                , statWeightedSum      REAL
+                                , statSqrSumWeights    REAL
+                                , statWeightedSqrSum   REAL );"""
+    , """CREATE TABLE vector ( vectorId        INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL
+                             , runId           INTEGER NOT NULL REFERENCES run(runId) ON DELETE CASCADE
+                             , moduleName      TEXT NOT NULL, vectorName      TEXT NOT NULL
+                             , vectorCount     INTEGER
+                             , vectorMin       REAL
+                             , vectorMax       REAL
+                             , vectorSum       REAL
+                             , vectorSumSqr    REAL
+                             , startEventNum   INTEGER
+                             , endEventNum     INTEGER
+                             , startSimtimeRaw INTEGER
+                             , endSimtimeRaw   INTEGER );"""
+    , """CREATE TABLE vectorData ( vectorId      INTEGER NOT NULL REFERENCES vector(vectorId) ON DELETE CASCADE
+                                 , eventNumber   INTEGER NOT NULL
+                                 , simtimeRaw    INTEGER NOT NULL
+                                 , value         REAL );"""
+]
+
+VECTOR_INDEX_STATEMENT = 'CREATE INDEX vectorData_idx ON vectorData (vectorId);'
+
+# the exponent of the raw simulation time, i.e. picoseconds
+SIMTIME_EXPONENT = -12
+# the simulated time between two consecutive events, in seconds
+EVENT_INTERVAL = 1e-3
+
+# the side length of the square the positions of the modules are confined to
+AREA_SIZE = 1000.
+
+DEFAULT_ITERATIONVARS = { 'vehicle_rate': ['0.1', '0.2'], 'period': ['0.1s', '0.5s'] }
+
+
+def get_runs(iterationvars:Dict[str, List[str]], repetitions:int) -> List[dict]:
+    r"""
+    Return the description of every run, i.e. every combination of the values
+    of the iteration variables, repeated `repetitions` times
+
+    Parameters
+    ----------
+    iterationvars : Dict[str, List[str]]
+        the values of every iteration variable, as they appear in an ini file
+
+    repetitions : int
+        the number of repetitions of every combination
+    """
+    names = sorted(iterationvars.keys())
+    runs = []
+    for values in itertools.product(*[ iterationvars[name] for name in names ]):
+        for repetition in range(0, repetitions):
+            runs.append({ 'itervars': dict(zip(names, values)), 'repetition': repetition, 'runnumber': len(runs) })
+    return runs
+
+
+def get_run_name(run:dict) -> str:
+    values = '-'.join([ f'{name}={value}' for name, value in run['itervars'].items() ])
+    return f'Benchmark-{values}-#{run["repetition"]}'
+
+
+def write_run(connection:sqlite3.Connection, run:dict, parameters:int, seed:int):
+    r"""
+    Fill the `run`, `runAttr` and `runParam` tables for the given run
+    """
+    itervars = run['itervars']
+    iterationvars = ', '.join([ f'${name}={value}' for name, value in itervars.items() ])
+
+    connection.execute('INSERT INTO run (runId, runName, simtimeExp) VALUES (1, ?, ?);'
+                       , (get_run_name(run), SIMTIME_EXPONENT))
+
+    attributes = { 'configname': 'Benchmark'
+                 , 'datetime': time.strftime('%Y%m%d-%H:%M:%S')
+                 , 'experiment': 'Benchmark'
+                 , 'inifile': 'benchmark.ini'
+                 , 'iterationvars': iterationvars
+                 , 'iterationvarsf': iterationvars.replace('$', '').replace(', ', '-').replace('=', '_') + '-'
+                 , 'measurement': iterationvars
+                 , 'network': 'World'
+                 , 'processid': '0'
+                 , 'repetition': str(run['repetition'])
+                 , 'replication': f'#{run["repetition"]}'
+                 , 'resultdir': 'results'
+                 , 'runnumber': str(run['runnumber'])
+                 , 'seedset': str(seed)
+                 }
+    # OMNeT++ adds the iteration variables as attributes too
+    attributes.update(itervars)
+    connection.executemany('INSERT INTO runAttr (runId, attrName, attrValue) VALUES (1, ?, ?);'
+                           , attributes.items())
+
+    params = [ (f'**.{name}', value) for name, value in itervars.items() ]
+    params += [ (f'*.node[*].app.param{k}', str(k)) for k in range(0, parameters) ]
+    connection.executemany('INSERT INTO runParam (runId, paramKey, paramValue, paramOrder) VALUES (1, ?, ?, ?);'
+                           , [ (key, value, order) for order, (key, value) in enumerate(params) ])
+
+
+def generate_database(path:str, run:dict
+                      , modules:int = 10
+                      , vectors:int = 4
+                      , rows_per_vector:int = 1000
+                      , scalars:int = 4
+                      , statistics:int = 2
+                      , parameters:int = 20
+                      , index:bool = True
+                      , seed:int = 23):
+    r"""
+    Write one synthetic OMNeT++ result file for the given run
+
+    Parameters
+    ----------
+    path : str
+        the path of the output file, an existing file is replaced
+
+    run : dict
+        the description of the run, as returned by `get_runs`
+
+    modules : int
+        the number of modules recording results
+
+    vectors : int
+        the number of signal vectors per module, in addition to the position vectors
+
+    rows_per_vector : int
+        the number of rows in the `vectorData` table for every vector
+
+    scalars : int
+        the number of scalars per module
+
+    statistics : int
+        the number of statistics per module
+
+    parameters : int
+        the number of parameters in the `runParam` table, in addition to the iteration variables
+
+    index : bool
+        whether to create the index over the `vectorId` column of the
+        `vectorData` table, like OMNeT++ does at the end of a run
+
+    seed : int
+        the seed for the random number generator, the runnumber is added to it
+    """
+    rng = np.random.default_rng(seed + run['runnumber'])
+
+    path = pathlib.Path(path)
+    path.unlink(missing_ok=True)
+
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode = OFF;')
+    connection.execute('PRAGMA synchronous = OFF;')
+    for statement in CREATE_TABLE_STATEMENTS:
+        connection.execute(statement)
+
+    write_run(connection, run, parameters, seed)
+
+    module_names = [ f'World.node[{m}].app' for m in range(0, modules) ]
+    vector_names = [ 'positionX:vector', 'positionY:vector' ] + [ f'signal{k}:vector' for k in range(0, vectors) ]
+    n_vectors = len(vector_names)
+
+    # the k-th event of module m has the event number m + k * modules, so the
+    # events of all modules are interleaved and every event belongs to exactly one module
+    k = np.arange(0, rows_per_vector, dtype=np.int64)
+    events = np.arange(0, modules, dtype=np.int64)[np.newaxis, :] + k[:, np.newaxis] * modules
+    simtimes = (events * EVENT_INTERVAL * 10**(-SIMTIME_EXPONENT)).astype(np.int64)
+
+    # the values, with the shape (rows, modules, vectors)
+    values = np.empty((rows_per_vector, modules, n_vectors))
+    # the positions are random walks within the area
+    steps = rng.normal(0, 5., size=(rows_per_vector, modules, 2))
+    start = rng.uniform(0, AREA_SIZE, size=(1, modules, 2))
+    values[:, :, 0:2] = np.abs(np.mod(start + np.cumsum(steps, axis=0), 2 * AREA_SIZE) - AREA_SIZE)
+    # the signals are normally distributed, with a mean depending on the signal and the run
+    means = np.arange(1, vectors + 1) * (1 + 0.1 * run['runnumber'])
+    values[:, :, 2:] = rng.normal(means, 1., size=(rows_per_vector, modules, vectors))
+
+    # the vector ids, in the order of the `vector` table
+    vector_ids = 1 + np.arange(0, modules * n_vectors).reshape(modules, n_vectors)
+
+    vector_rows = []
+    for m, module_name in enumerate(module_names):
+        for v, vector_name in enumerate(vector_names):
+            vector_values = values[:, m, v]
+            vector_rows.append((int(vector_ids[m, v]), module_name, vector_name
+                                , rows_per_vector
+                                , float(vector_values.min()) if rows_per_vector > 0 else None
+                                , float(vector_values.max()) if rows_per_vector > 0 else None
+                                , float(vector_values.sum()), float((vector_values**2).sum())
+                                , int(events[0, m]) if rows_per_vector > 0 else None
+                                , int(events[-1, m]) if rows_per_vector > 0 else None
+                                , int(simtimes[0, m]) if rows_per_vector > 0 else None
+                                , int(simtimes[-1, m]) if rows_per_vector > 0 else None
+                                ))
+    connection.executemany('INSERT INTO vector (vectorId, runId, moduleName, vectorName, vectorCount'
+                           ', vectorMin, vectorMax, vectorSum, vectorSumSqr'
+                           ', startEventNum, endEventNum, startSimtimeRaw, endSimtimeRaw)'
+                           ' VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);'
+                           , vector_rows)
+
+    # the rows of `vectorData` in the order of the events
+    shape = (rows_per_vector, modules, n_vectors)
+    data_vector_ids = np.broadcast_to(vector_ids[np.newaxis, :, :], shape).ravel()
+    data_events = np.broadcast_to(events[:, :, np.newaxis], shape).ravel()
+    data_simtimes = np.broadcast_to(simtimes[:, :, np.newaxis], shape).ravel()
+    connection.executemany('INSERT INTO vectorData (vectorId, eventNumber, simtimeRaw, value) VALUES (?, ?, ?, ?);'
+                           , zip(data_vector_ids.tolist(), data_events.tolist()
+                                 , data_simtimes.tolist(), values.ravel().tolist()))
+
+    scalar_rows = [ (module_name, f'signal{s}:last', float(values[-1, m, 2 + s % vectors]) if vectors > 0 and rows_per_vector > 0 else float(s))
+                    for m, module_name in enumerate(module_names) for s in range(0, scalars) ]
+    connection.executemany('INSERT INTO scalar (runId, moduleName, scalarName, scalarValue) VALUES (1, ?, ?, ?);'
+                           , scalar_rows)
+
+    statistic_rows = []
+    for m, module_name in enumerate(module_names):
+        for s in range(0, statistics):
+            sample = rng.normal(s + 1, 1., size=100)
+            statistic_rows.append((module_name, f'signal{s}:stats', len(sample)
+                                   , float(sample.mean()), float(sample.std())
+                                   , float(sample.sum()), float((sample**2).sum())
+                                   , float(sample.min()), float(sample.max())))
+    connection.executemany('INSERT INTO statistic (runId, moduleName, statName, isHistogram, isWeighted'
+                           ', statCount, statMean, statStddev, statSum, statSqrsum, statMin, statMax)'
+                           ' VALUES (1, ?, ?, 0, 0, ?, ?, ?, ?, ?, ?, ?);'
+                           , statistic_rows)
+
+    if index:
+        connection.execute(VECTOR_INDEX_STATEMENT)
+
+    connection.commit()
+    connection.close()
+
+
+def generate_dataset(output_directory:str
+                     , iterationvars:Dict[str, List[str]] = DEFAULT_ITERATIONVARS
+                     , repetitions:int = 2
+                     , modules:int = 10
+                     , vectors:int = 4
+                     , rows_per_vector:int = 1000
+                     , scalars:int = 4
+                     , statistics:int = 2
+                     , parameters:int = 20
+                     , index:bool = True
+                     , seed:int = 23) -> List[str]:
+    r"""
+    Write one synthetic OMNeT++ result file per run into `output_directory`,
+    see `generate_database` for the parameters. The parameters are saved in
+    `dataset.json` in the same directory and the files are only generated
+    again if they differ.
+
+    Returns
+    -------
+    The list of the paths of the generated files
+    """
+    output_path = pathlib.Path(output_directory)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    configuration = { 'iterationvars': iterationvars, 'repetitions': repetitions
+                    , 'modules': modules, 'vectors': vectors, 'rows_per_vector': rows_per_vector
+                    , 'scalars': scalars, 'statistics': statistics, 'parameters': parameters
+                    , 'index': index, 'seed': seed }
+
+    runs = get_runs(iterationvars, repetitions)
+    files = [ str(output_path / f'run-{run["runnumber"]}.db') for run in runs ]
+
+    configuration_file = output_path / 'dataset.json'
+    if configuration_file.exists() and all([ pathlib.Path(f).exists() for f in files ]):
+        with open(configuration_file, 'r') as f:
+            if json.load(f) == configuration:
+                logi(f'generate_dataset: reusing the existing dataset in {output_directory}')
+                return files
+
+    configuration_file.unlink(missing_ok=True)
+    for stale_file in output_path.glob('run-*.db'):
+        stale_file.unlink()
+
+    for run, path in zip(runs, files):
+        generate_database(path, run
+                          , modules=modules, vectors=vectors, rows_per_vector=rows_per_vector
+                          , scalars=scalars, statistics=statistics, parameters=parameters
+                          , index=index, seed=seed)
+        logi(f'generate_dataset: generated {path}')
+
+    with open(configuration_file, 'w') as f:
+        json.dump(configuration, f, indent=2)
+
+    return files
+
+
+def parse_iterationvars(definitions:Optional[List[str]]) -> Dict[str, List[str]]:
+    r"""
+    Parse definitions of the form `name=value1,value2,...` into a dictionary
+    """
+    if not definitions:
+        return DEFAULT_ITERATIONVARS
+
+    iterationvars = {}
+    for definition in definitions:
+        if not '=' in definition:
+            raise ValueError(f'bad iteration variable definition, expected `name=value1,value2,...`: {definition}')
+        name, values = definition.split('=', 1)
+        iterationvars[name] = values.split(',')
+    return iterationvars
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Generate synthetic OMNeT++ SQLite result files')
+    parser.add_argument('output_directory', help='the directory for the generated files')
+
+    parser.add_argument('--iterationvar', type=str, action='append', help='an iteration variable and its values, as `name=value1,value2,...`; may be given multiple times')
+    parser.add_argument('--repetitions', type=int, default=2, help='the number of repetitions of every combination of the iteration variables')
+    parser.add_argument('--modules', type=int, default=10, help='the number of modules per run')
+    parser.add_argument('--vectors', type=int, default=4, help='the number of signal vectors per module')
+    parser.add_argument('--rows', type=int, default=1000, help='the number of rows per vector')
+    parser.add_argument('--scalars', type=int, default=4, help='the number of scalars per module')
+    parser.add_argument('--statistics', type=int, default=2, help='the number of statistics per module')
+    parser.add_argument('--parameters', type=int, default=20, help='the number of additional run parameters')
+    parser.add_argument('--no-index', action='store_true', default=False, help='do not create the index over the `vectorId` column of the `vectorData` table')
+    parser.add_argument('--seed', type=int, default=23, help='the seed for the random number generator')
+
+    parser.add_argument('--verbose', '-v', action='count', default=0, help='increase logging verbosity')
+
+    return parser.parse_args(arguments)
+
+
+def main():
+    setup_logging_defaults()
+
+    args = parse_arguments(sys.argv[1:])
+    set_logging_level(logging.INFO if args.verbose > 0 else logging.WARNING)
+
+    files = generate_dataset(args.output_directory
+                             , iterationvars=parse_iterationvars(args.iterationvar)
+                             , repetitions=args.repetitions
+                             , modules=args.modules
+                             , vectors=args.vectors
+                             , rows_per_vector=args.rows
+                             , scalars=args.scalars
+                             , statistics=args.statistics
+                             , parameters=args.parameters
+                             , index=not args.no_index
+                             , seed=args.seed)
+    print(f'generated {len(files)} files in {args.output_directory}')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+r"""
+Run the benchmark recipes in `benchmarks/recipes` on synthetic OMNeT++ result
+files and record the throughput and memory usage of every run.
+
+The recipes are templates, `${data_directory}`, `${plot_data_directory}` and
+`${output_directory}` are substituted before running them with `run_recipe.py`.
+The recipes starting with `extract_` and `transform_` are run with
+`--eval-only`, the ones starting with `plot_` with `--plot-only` on the data
+extracted by `setup_plot_data.yaml`, which is not timed.
+
+Every run is profiled with `--profile`. The rows and files per second are
+calculated from the rows returned by the extractors (or the plot readers) and
+the number of input files, over the wall time of the whole `run_recipe.py`
+process. The peak memory is the maximum of the peak RSS of the process and of
+its workers. The results are appended to a CSV file together with the commit,
+so runs of different commits can be compared with `--compare`.
+
+The startup benchmarks (`startup_*`) run the command line tools without
+computing anything, e.g. `run_recipe.py --help` or `--dump-recipe-only`, the
+import benchmarks (`import_*`) only import a module. Both are run with
+`python -X importtime` and record the time spent importing modules in the
+process as `import_time`.
+"""
+
+import sys
+import argparse
+import logging
+import os
+import pathlib
+import shutil
+import socket
+import string
+import subprocess
+import time
+
+from typing import List, Optional
+
+import pandas as pd
+
+# ---
+
+REPOSITORY_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(REPOSITORY_DIRECTORY))
+
+from common.logging_facilities import logi, loge, logd, logw \
+                                        , setup_logging_defaults, set_logging_level
+
+from utility.stopwatch import startWatch, stopWatch
+
+import generate_data
+
+RECIPE_DIRECTORY = pathlib.Path(__file__).resolve().parent / 'recipes'
+
+SETUP_PLOT_DATA_RECIPE = 'setup_plot_data'
+
+# the parameters of the synthetic datasets, see `generate_data.generate_dataset`
+SIZES = {
+    'small': { 'repetitions': 2, 'modules': 10, 'vectors': 4, 'rows_per_vector': 1000 }
+    , 'medium': { 'repetitions': 4, 'modules': 20, 'vectors': 8, 'rows_per_vector': 5000 }
+    , 'large': { 'repetitions': 8, 'modules': 50, 'vectors': 8, 'rows_per_vector': 20000 }
+}
+
+# the command lines of the startup benchmarks: the script, the benchmark recipe
+# passed to it, if any, and the arguments
+STARTUP_BENCHMARKS = {
+    'startup_run_recipe_help': ('run_recipe.py', None, ['--help'])
+    , 'startup_dump_eval_recipe': ('run_recipe.py', 'transform_concat', ['--dump-recipe-only', '--eval-only'])
+    , 'startup_dump_plot_recipe': ('run_recipe.py', 'plot_relational', ['--dump-recipe-only', '--plot-only'])
+    , 'startup_inspect_feather_help': ('inspect_feather.py', None, ['--help'])
+}
+
+# the modules of the import benchmarks
+IMPORT_BENCHMARKS = ['run_recipe', 'extractors', 'transforms', 'exporters', 'plots', 'recipe_server', 'data_io']
+
+RESULT_COLUMNS = ['timestamp', 'commit', 'dirty', 'host', 'size', 'benchmark', 'repetition', 'status'
+                  , 'wall_time', 'cpu_time', 'files', 'rows', 'rows_per_s', 'files_per_s', 'peak_rss'
+                  , 'extract_time', 'transform_time', 'export_time', 'read_time', 'plot_time', 'import_time']
+
+
+def get_commit() -> tuple:
+    r"""
+    Return the abbreviated hash of the checked out commit and whether the
+    working tree has uncommitted changes
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY_DIRECTORY
+                                , capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPOSITORY_DIRECTORY
+                                , capture_output=True, text=True, check=True).stdout.strip()
+        return commit, len(status) > 0
+    except Exception as e:
+        logw(f'could not determine the commit: {e!r}')
+        return 'unknown', False
+
+
+def get_benchmarks(patterns:Optional[List[str]]) -> List[str]:
+    r"""
+    Return the names of the benchmark recipes, optionally restricted to the
+    ones matching any of the glob `patterns`
+    """
+    names = sorted([ path.stem for path in RECIPE_DIRECTORY.glob('*.yaml') if not path.stem.startswith('setup_') ])
+    names += list(STARTUP_BENCHMARKS.keys()) + [ f'import_{module}' for module in IMPORT_BENCHMARKS ]
+    if patterns:
+        names = [ name for name in names if any([ pathlib.PurePath(name).match(pattern) for pattern in patterns ]) ]
+    return names
+
+
+def write_recipe(name:str, recipe_directory:pathlib.Path, **substitutions) -> str:
+    r"""
+    Substitute the placeholders in the benchmark recipe `name` and write the
+    result to `recipe_directory`
+    """
+    template = string.Template((RECIPE_DIRECTORY / f'{name}.yaml').read_text())
+    recipe_directory.mkdir(parents=True, exist_ok=True)
+    path = recipe_directory / f'{name}.yaml'
+    path.write_text(template.substitute(**substitutions))
+    return str(path)
+
+
+def run_process(command:List[str], log_file:str) -> tuple:
+    r"""
+    Run `command` in the repository directory, with its output redirected to
+    `log_file`
+
+    Returns
+    -------
+    The exit code, the wall time, the CPU time and the peak RSS of the process
+    """
+    start = startWatch()
+    with open(log_file, 'w') as log:
+        process = subprocess.Popen(command, cwd=REPOSITORY_DIRECTORY, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        # the process has been reaped already
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time, _ = stopWatch(start)
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    # the unit of `ru_maxrss` is kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+    return process.returncode, wall_time, cpu_time, peak_rss
+
+
+def summarize_profile(profile_file:str, input_stage:str) -> dict:
+    r"""
+    Summarize the profile written by `run_recipe.py --profile`: the number of
+    rows returned and files read in `input_stage`, the peak RSS of all
+    processes and the wall time of every stage
+    """
+    summary = {}
+    if not pathlib.Path(profile_file).exists():
+        logw(f'no profile found at {profile_file}')
+        return summary
+
+    records = pd.read_csv(profile_file)
+    inputs = records[records['stage'] == input_stage]
+    summary['rows'] = int(inputs['rows_out'].sum())
+    summary['files'] = int(inputs['detail'].nunique())
+    summary['peak_rss'] = records['peak_rss'].max()
+    for stage in ['extract', 'transform', 'export', 'read', 'plot']:
+        summary[f'{stage}_time'] = records.loc[records['stage'] == stage, 'wall_time'].sum()
+
+    return summary
+
+
+def run_benchmark(name:str, options, directories:dict, recipe_options:List[str]) -> dict:
+    r"""
+    Run the benchmark recipe `name` once and return the result record
+    """
+    output_directory = directories['output'] / name
+    shutil.rmtree(output_directory, ignore_errors=True)
+    output_directory.mkdir(parents=True)
+    profile_directory = directories['output'] / 'profiles'
+
+    recipe = write_recipe(name, directories['output'] / 'recipes'
+                          , data_directory=directories['data']
+                          , plot_data_directory=directories['plot_data']
+                          , output_directory=output_directory)
+
+    is_plot = name.startswith('plot_')
+    command = [ sys.executable, str(REPOSITORY_DIRECTORY / 'run_recipe.py'), recipe
+               , '--plot-only' if is_plot else '--eval-only'
+               , '--profile', '--profile-output', str(profile_directory)
+               , '--tmpdir', str(directories['tmp'])
+               ] + recipe_options
+
+    logi(f'running benchmark {name}: {" ".join(command)}')
+    exit_code, wall_time, cpu_time, peak_rss = run_process(command, str(directories['output'] / f'{name}.log'))
+
+    profile = summarize_profile(str(profile_directory / f'{name}_profile.csv'), 'read' if is_plot else 'extract')
+
+    result = { 'benchmark': name
+             , 'status': 'ok' if exit_code == 0 else f'exit code {exit_code}'
+             , 'wall_time': wall_time, 'cpu_time': cpu_time }
+    result.update(profile)
+    result['peak_rss'] = max(peak_rss, profile.get('peak_rss', 0))
+    result['rows_per_s'] = result.get('rows', 0) / wall_time
+    result['files_per_s'] = result.get('files', 0) / wall_time
+
+    if exit_code != 0:
+        loge(f'benchmark {name} failed with exit code {exit_code}, see {directories["output"] / f"{name}.log"}')
+
+    return result
+
+
+def get_import_time(log_file:str) -> float:
+    r"""
+    Return the time in seconds spent importing modules, from the output of a
+    process run with `python -X importtime`, the sum of the cumulative times of
+    the modules imported at the top level
+    """
+    total = 0
+    with open(log_file, 'r') as f:
+        for line in f:
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line.split('|', 2)
+            # the names of nested imports are indented
+            if cumulative.strip().isdigit() and not name[1:].startswith(' '):
+                total += int(cumulative)
+    return total / 1e6
+
+
+def run_startup_benchmark(name:str, options, directories:dict) -> dict:
+    r"""
+    Run the startup benchmark `name`, see `STARTUP_BENCHMARKS`, or the import
+    benchmark `name`, see `IMPORT_BENCHMARKS`, once and return the result record
+    """
+    if name in STARTUP_BENCHMARKS:
+        script, recipe_name, arguments = STARTUP_BENCHMARKS[name]
+        if recipe_name:
+            recipe = write_recipe(recipe_name, directories['output'] / 'recipes'
+                                  , data_directory=directories['data']
+                                  , plot_data_directory=directories['plot_data']
+                                  , output_directory=directories['output'] / recipe_name)
+            arguments = [ recipe ] + arguments
+        command = [ sys.executable, '-X', 'importtime', str(REPOSITORY_DIRECTORY / script) ] + arguments
+    else:
+        module = name[len('import_'):]
+        command = [ sys.executable, '-X', 'importtime', '-c', f'import {module}' ]
+
+    log_file = str(directories['output'] / f'{name}.log')
+    logi(f'running benchmark {name}: {" ".join(command)}')
+    exit_code, wall_time, cpu_time, peak_rss = run_process(command, log_file)
+
+    if exit_code != 0:
+        loge(f'benchmark {name} failed with exit code {exit_code}, see {log_file}')
+
+    return { 'benchmark': name
+           , 'status': 'ok' if exit_code == 0 else f'exit code {exit_code}'
+           , 'wall_time': wall_time, 'cpu_time': cpu_time, 'peak_rss': peak_rss
+           , 'rows_per_s': 0., 'files_per_s': 0.
+           , 'import_time': get_import_time(log_file) }
+
+
+def setup_plot_data(options, directories:dict, recipe_options:List[str]):
+    r"""
+    Extract the datasets read by the plotting benchmarks, unless they are up to date
+    """
+    plot_data_directory = directories['plot_data']
+    dataset_file = directories['data'] / 'dataset.json'
+    outputs = [ plot_data_directory / f'{name}.feather' for name in ['position', 'signals', 'sketch'] ]
+    if all([ path.exists() and path.stat().st_mtime >= dataset_file.stat().st_mtime for path in outputs ]):
+        logi('reusing the existing data for the plotting benchmarks')
+        return
+
+    recipe = write_recipe(SETUP_PLOT_DATA_RECIPE, directories['output'] / 'recipes'
+                          , data_directory=directories['data']
+                          , plot_data_directory=plot_data_directory
+                          , output_directory=directories['output'])
+    command = [ sys.executable, str(REPOSITORY_DIRECTORY / 'run_recipe.py'), recipe, '--eval-only'
+               , '--tmpdir', str(directories['tmp']) ] + recipe_options
+    logi('extracting the data for the plotting benchmarks')
+    exit_code, _, _, _ = run_process(command, str(directories['output'] / f'{SETUP_PLOT_DATA_RECIPE}.log'))
+    if exit_code != 0:
+        raise Exception(f'extracting the data for the plotting benchmarks failed, see {directories["output"] / f"{SETUP_PLOT_DATA_RECIPE}.log"}')
+
+
+def append_results(results:pd.DataFrame, results_file:str):
+    path = pathlib.Path(results_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists() and pd.read_csv(path, nrows=0).columns.tolist() != results.columns.tolist():
+        # written before columns were added, rewrite it with the current columns
+        previous = pd.read_csv(path, dtype={'commit': str})
+        pd.concat([ previous, results ], ignore_index=True).reindex(columns=RESULT_COLUMNS).to_csv(path, index=False)
+        return
+    results.to_csv(path, mode='a', header=not path.exists(), index=False)
+
+
+def compare_results(results_file:str, size:str, benchmarks:List[str], commit:str, baseline:str) -> pd.DataFrame:
+    r"""
+    Compare the median wall time, rows per second, peak RSS and import time
+    of the `benchmarks` of `commit` with the ones of `baseline`
+    """
+    results = pd.read_csv(results_file, dtype={'commit': str})
+    results = results[(results['size'] == size) & (results['status'] == 'ok') & results['benchmark'].isin(benchmarks)]
+
+    def medians(c):
+        return results[results['commit'] == c].groupby('benchmark')[['wall_time', 'rows_per_s', 'peak_rss', 'import_time']].median()
+
+    current = medians(commit)
+    previous = medians(baseline)
+    if previous.empty:
+        logw(f'no results for the baseline commit {baseline} in {results_file}')
+
+    comparison = current.join(previous, how='inner', rsuffix='_baseline')
+    comparison['wall_time_change'] = comparison['wall_time'] / comparison['wall_time_baseline'] - 1
+    comparison['rows_per_s_change'] = comparison['rows_per_s'] / comparison['rows_per_s_baseline'] - 1
+    comparison['peak_rss_change'] = comparison['peak_rss'] / comparison['peak_rss_baseline'] - 1
+    comparison['import_time_change'] = comparison['import_time'] / comparison['import_time_baseline'] - 1
+
+    return comparison.reset_index()
+
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Run the benchmark recipes on synthetic OMNeT++ result files')
+
+    parser.add_argument('benchmarks', nargs='*', help='glob patterns for the names of the benchmarks to run; all if none are given')
+
+    parser.add_argument('--size', type=str, default='small', choices=list(SIZES.keys()), help='the size of the synthetic dataset')
+    parser.add_argument('--repeat', type=int, default=1, help='the number of runs of every benchmark')
+
+    parser.add_argument('--data-directory', type=str, default=None, help='the directory for the synthetic datasets; defaults to `<tmpdir>/ions-benchmark/data`')
+    parser.add_argument('--output-directory', type=str, default=None, help='the directory for the outputs, logs and profiles of the benchmarks; defaults to `<tmpdir>/ions-benchmark/output`')
+    parser.add_argument('--results', type=str, default=None, help='the CSV file the results are appended to; defaults to `<tmpdir>/ions-benchmark/results.csv`')
+    parser.add_argument('--compare', type=str, default=None, help='compare the results with the ones of the given commit in the results file')
+
+    parser.add_argument('--worker', type=int, default=None, help='run the recipes on a local cluster with this many worker processes instead of in single-threaded mode')
+    parser.add_argument('--tmpdir', type=str, default='/opt/tmpssd/tmp', help='directory for temporary files')
+
+    parser.add_argument('--verbose', '-v', action='count', default=0, help='increase logging verbosity')
+
+    return parser.parse_args(arguments)
+
+
+def main():
+    setup_logging_defaults()
+
+    options = parse_arguments(sys.argv[1:])
+    set_logging_level(logging.INFO if options.verbose > 0 else logging.WARNING)
+
+    base_directory = pathlib.Path(options.tmpdir) / 'ions-benchmark'
+    data_root = pathlib.Path(options.data_directory) if options.data_directory else base_directory / 'data'
+    output_root = pathlib.Path(options.output_directory) if options.output_directory else base_directory / 'output'
+    results_file = options.results if options.results else str(base_directory / 'results.csv')
+
+    directories = { 'data': data_root / options.size
+                  , 'plot_data': data_root / options.size / 'plot'
+                  , 'output': output_root / options.size
+                  , 'tmp': pathlib.Path(options.tmpdir) }
+    directories['output'].mkdir(parents=True, exist_ok=True)
+
+    if options.worker:
+        recipe_options = [ '--cluster', 'local', '--worker', str(options.worker) ]
+    else:
+        recipe_options = [ '--single-threaded' ]
+
+    benchmarks = get_benchmarks(options.benchmarks)
+    if len(benchmarks) == 0:
+        loge('no benchmarks selected')
+        return
+
+    start = startWatch()
+    files = generate_data.generate_dataset(str(directories['data']), **SIZES[options.size])
+    generation_time, _ = stopWatch(start)
+    print(f'dataset "{options.size}": {len(files)} files in {directories["data"]} ({generation_time:.1f}s)')
+
+    startup_benchmarks = list(STARTUP_BENCHMARKS.keys()) + [ f'import_{module}' for module in IMPORT_BENCHMARKS ]
+
+    if any([ name.startswith('plot_') for name in benchmarks ]):
+        setup_plot_data(options, directories, recipe_options)
+
+    commit, dirty = get_commit()
+    results = []
+    for name in benchmarks:
+        for repetition in range(0, options.repeat):
+            if name in startup_benchmarks:
+                result = run_startup_benchmark(name, options, directories)
+            else:
+                result = run_benchmark(name, options, directories, recipe_options)
+            result.update({ 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'dirty': dirty
+                          , 'host': socket.gethostname(), 'size': options.size, 'repetition': repetition })
+            results.append(result)
+            print(f'{name:<32} {result["status"]:<8} {result["wall_time"]:8.2f}s'
+                  f' {result["rows_per_s"]:12.0f} rows/s {result["files_per_s"]:8.2f} files/s'
+                  f' {result["peak_rss"] / 2**20:8.0f} MiB'
+                  + (f' {result["import_time"]:8.2f}s imports' if 'import_time' in result else ''))
+
+    results = pd.DataFrame.from_records(results, columns=RESULT_COLUMNS)
+    append_results(results, results_file)
+    print(f'appended {len(results)} results to {results_file}')
+
+    if options.compare:
+        comparison = compare_results(results_file, options.size, benchmarks, commit, options.compare)
+        with pd.option_context('display.max_columns', None, 'display.width', 200):
+            print(comparison[['benchmark', 'wall_time', 'wall_time_baseline', 'wall_time_change'
+                              , 'rows_per_s_change', 'peak_rss_change', 'import_time_change']].to_string(index=False))
+
+
+if __name__=='__main__':
+    main()
@@ -6,3 +6,6 @@ FETCH_NUMROWS = 8912
 AGGREGATION_WINDOW = int(1e11)
 
 DEFAULT_COLUMN = 'mean'
+
+# the maximum number of compiled code fragments kept per worker process
+CODE_CACHE_SIZE = 128
@@ -1,7 +1,9 @@
+import os
 import pathlib
 import re
+import time
 
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 # ---
 
@@ -10,11 +12,59 @@ from common.logging_facilities import logi, loge, logd, logw
 # ---
 
 import pandas as pd
+import pyarrow.ipc
 
-def read_from_file(path, file_format='feather', sample:Optional[float]=None, sample_seed:int=23, filter_query:str = None):
+# ---
+
+from utility.profiling import profiled
+
+
+def get_feather_columns(path) -> Optional[List[str]]:
+    r"""
+    Return the names of the columns in the given feather file, read from the
+    schema without reading any data, or None if the schema can't be read.
+    """
+    try:
+        with pyarrow.ipc.open_file(path) as reader:
+            return reader.schema.names
+    except Exception as e:
+        logd(f'could not read the schema of {path}: {e}')
+        return None
+
+@profiled('read', detail='path', input_file='path')
+def read_from_file(path, file_format='feather', sample:Optional[float]=None, sample_seed:int=23, filter_query:str = None, columns:Optional[List[str]] = None):
+    r"""
+    Read a `DataFrame` from the given file.
+
+    Parameters
+    ----------
+    path: str
+        the path to the input file
+
+    file_format: str
+        the format of the input file, either `feather` or `hdf`
+
+    sample: Optional[float]
+        if not None, the rate at which the input data is sampled
+
+    sample_seed: int
+        the seed to use for the sampling RNG
+
+    filter_query: str
+        if not None, the query expression for selecting the rows to keep
+
+    columns: Optional[List[str]]
+        if not None, only the columns of the file in this list are read.
+        Columns not in the file are ignored, so the list may be a superset.
+    """
     if file_format == 'feather':
         try:
-            data = pd.read_feather(path)
+            if columns is not None and (available_columns := get_feather_columns(path)) is not None:
+                data = pd.read_feather(path, columns=[ c for c in available_columns if c in columns ])
+            else:
+                data = pd.read_feather(path)
+                if columns is not None:
+                    data = data[[ c for c in data.columns if c in columns ]]
             if sample:
                 logi(f'sampling {sample*100}% of data from {path}')
                 data = data.sample(frac=sample, random_state=sample_seed)
@@ -27,6 +77,8 @@ def read_from_file(path, file_format='feather', sample:Optional[float]=None, sam
     elif file_format == 'hdf':
         try:
             data = pd.read_hdf(path)
+            if columns is not None:
+                data = data[[ c for c in data.columns if c in columns ]]
             if sample:
                 logi(f'sampling {sample*100}% of data from {path}')
                 data = data.sample(frac=sample, random_state=sample_seed)
@@ -75,3 +127,81 @@ class DataSet:
             if regex.match(fn:=str(filename)):
                 data_files.append(fn)
         return data_files
+
+
+class FileWatcher:
+    r"""
+    Track the files of a growing dataset, e.g. the results of a running
+    simulation campaign, and determine which of them are complete.
+
+    A file is considered complete if a marker file, the path of the file with
+    `marker_suffix` appended, exists or, without `marker_suffix`, if its size
+    and modification time haven't changed between two observations at least
+    `stable_time` seconds apart. A SQLite database with a rollback journal or a
+    write-ahead log next to it is still being written and never complete.
+
+    Parameters
+    ----------
+    stable_time : float
+        the time, in seconds, the size and modification time of a file have to
+        stay unchanged
+
+    marker_suffix : Optional[str]
+        the suffix of the marker files, e.g. `.done`
+    """
+    def __init__(self, stable_time:float = 60, marker_suffix:Optional[str] = None):
+        self.stable_time = stable_time
+        self.marker_suffix = marker_suffix
+        # the size, modification time and the time of the first observation of
+        # this size and modification time for every file
+        self.observations:Dict[str, Tuple[int, int, float]] = {}
+
+    def is_complete(self, path:str, now:Optional[float] = None) -> bool:
+        if self.marker_suffix:
+            return os.path.exists(path + self.marker_suffix)
+
+        if os.path.exists(path + '-journal') or os.path.exists(path + '-wal'):
+            return False
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+
+        now = now if now is not None else time.time()
+        size, mtime, first_seen = self.observations.get(path, (None, None, None))
+        if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+            self.observations[path] = (stat.st_size, stat.st_mtime_ns, now)
+            return False
+
+        return now - first_seen >= self.stable_time
+
+    def get_complete_files(self, paths:List[str]) -> List[str]:
+        r"""
+        Return the complete files among `paths`, in the same order
+        """
+        now = time.time()
+        complete = [ path for path in paths if self.is_complete(path, now) ]
+        for path in complete:
+            self.observations.pop(path, None)
+        return complete
+
+    @staticmethod
+    def get_files(data_path:Union[List[str], str]) -> List[str]:
+        r"""
+        Return the files matching `data_path`, like `DataSet`, but an empty
+        list if there are none yet
+        """
+        try:
+            return DataSet(data_path).get_file_list()
+        except Exception as e:
+            logd(f'FileWatcher::get_files: no files for {data_path}: {e}')
+            return []
+
+    @staticmethod
+    def get_literal_path(path:str) -> str:
+        r"""
+        Return the regular expression for `DataSet` matching only `path`
+        """
+        path = pathlib.PurePath(path)
+        return f'{path.parent}/{re.escape(path.name)}$'
@@ -4,17 +4,14 @@ import operator
 
 import json
 
+from typing import Optional
+
 import yaml
 from yaml import YAMLObject
 
 import numpy as np
 import pandas as pd
 
-# Pandas serializing handlers
-import jsonpickle
-import jsonpickle.ext.pandas as jsonpickle_pandas
-jsonpickle_pandas.register_handlers()
-
 import dask
 
 from yaml_helper import decode_node, proto_constructor
@@ -24,6 +21,7 @@ from common.logging_facilities import logi, loge, logd, logw
 from extractors import RawExtractor
 
 from utility.filesystem import check_file_access_permissions, check_directory_access_permissions
+from utility.profiling import profiled
 
 
 class FileResultProcessor(YAMLObject):
@@ -54,6 +52,13 @@ class FileResultProcessor(YAMLObject):
     raw: bool
         whether to save the raw input or convert the columns of the input
         `pandas.DataFrame` to categories before saving
+
+    batch: Optional[int]
+        The number of the batch of input files, with `concatenate`: the data
+        is saved to `<output_filename stem>_batch-<batch>.<suffix>` instead of
+        `output_filename`. This is set by `run_recipe.py --watch` for the data
+        extracted from the newly completed input files, the first batch
+        removes the batch files of an earlier watch.
     """
     yaml_tag = u'!FileResultProcessor'
 
@@ -63,6 +68,7 @@ class FileResultProcessor(YAMLObject):
                  , format:str = 'feather'
                  , concatenate:bool = False
                  , raw:bool = False
+                 , batch:Optional[int] = None
                  , *args, **kwargs):
         if (not output_filename) and concatenate:
             raise ValueError('When concatenating a dataset into a single file, the `output_filename` must be specified')
@@ -80,18 +86,28 @@ class FileResultProcessor(YAMLObject):
         self.format = format
         self.concatenate = concatenate
         self.raw = raw
-
-    def save_to_disk(self, df, filename, file_format='feather', compression='lz4', hdf_key='data'):
+        self.batch = batch
+
+    @profiled('export', detail='filename', output_file='filename')
+    def save_to_disk(self, df, filename, file_format='feather', compression='lz4', hdf_key='data') -> Optional[int]:
+        r"""
+        Save `df` to `filename`
+
+        Returns
+        -------
+        The number of rows saved, 0 if the input is empty and None if the rows
+        aren't counted (with `raw`) or saving failed
+        """
         start = time.time()
 
         logi(f'Saving "{filename}" ...')
         if df is None:
             logw('>>>> save_to_disk: input DataFrame is None')
-            return
+            return 0
 
         if not self.raw and df.empty:
             logw('>>>> save_to_disk: input DataFrame is empty')
-            return
+            return 0
 
         if file_format == 'feather':
             try:
@@ -106,6 +122,10 @@ class FileResultProcessor(YAMLObject):
                                     , key=hdf_key
                                    )
         elif file_format == 'json':
+            # only imported for this format, with the pandas serializing handlers
+            import jsonpickle
+            import jsonpickle.ext.pandas as jsonpickle_pandas
+            jsonpickle_pandas.register_handlers()
             try:
                 f = open(filename, 'w')
                 f.write(jsonpickle.encode(df, unpicklable=False, make_refs=False, keys=True))
@@ -121,6 +141,7 @@ class FileResultProcessor(YAMLObject):
         logi(f'>>>> save_to_disk: it took {stop - start}s to save {filename}')
         if not self.raw:
             logd(f'>>>> save_to_disk: {df.memory_usage(deep=True)=}')
+            return len(df)
 
     def set_data_repo(self, data_repo):
         self.data_repo = data_repo
@@ -136,13 +157,35 @@ class FileResultProcessor(YAMLObject):
 
         return data
 
+    def get_batch_filename(self, batch:int) -> str:
+        r"""
+        Return the name of the output file for the data of batch `batch`
+        """
+        path = pathlib.Path(self.output_filename)
+        return str(path.with_name(f'{path.stem}_batch-{batch}{path.suffix}'))
+
+    def remove_batch_files(self):
+        r"""
+        Remove the output files of all the batches
+        """
+        path = pathlib.Path(self.output_filename)
+        for batch_file in sorted(path.parent.glob(f'{path.stem}_batch-*{path.suffix}')):
+            logi(f'FileResultProcessor: removing "{batch_file}" of an earlier watch')
+            batch_file.unlink()
+
     def prepare_concatenated(self, data_list, job_list):
+        output_filename = self.output_filename
+        if self.batch is not None:
+            if self.batch == 0:
+                self.remove_batch_files()
+            output_filename = self.get_batch_filename(self.batch)
+
         if self.raw:
-            job = dask.delayed(self.save_to_disk)(map(operator.itemgetter(0), data_list), self.output_filename, self.format)
+            job = dask.delayed(self.save_to_disk)(map(operator.itemgetter(0), data_list), output_filename, self.format)
         else:
             concat_result = dask.delayed(pd.concat)(map(operator.itemgetter(0), data_list), ignore_index=True)
             convert_columns_result = dask.delayed(RawExtractor.convert_columns_to_category)(concat_result)
-            job = dask.delayed(self.save_to_disk)(convert_columns_result, self.output_filename, self.format)
+            job = dask.delayed(self.save_to_disk)(convert_columns_result, output_filename, self.format)
 
         job_list.append(job)
 
@@ -163,6 +206,11 @@ class FileResultProcessor(YAMLObject):
             else:
                 aliases = '_'.join(list(attributes.get_aliases()))
 
+            # a file extracted in multiple parts is saved in multiple files
+            partition = getattr(attributes, 'partition', None)
+            if partition is not None:
+                aliases += f'_part-{partition}'
+
             output_filename = self.output_directory + '/' \
                               + source_file \
                               + '_' \
@@ -0,0 +1,407 @@
+r"""
+Memory-aware planning of the extraction from SQLite result databases.
+
+Before the task graph is built, the metadata of every input file is read: the
+number and size of the pages of the database and, from the `vector` table,
+the number of rows in `vectorData` (`vectorCount`) of every vector matched by
+the extractor. From these, the memory needed for extracting the data of a
+file into a `DataFrame` is estimated.
+
+The estimates are used to
+
+- annotate every extraction task with the dask resource `MEMORY`, so that a
+  worker that declares its memory as resource (see `run_recipe.py
+  --memory-aware`) only runs as many extraction tasks at once as fit into it
+- prioritise the tasks with the largest estimates, so the largest files don't
+  end up as the tail of the computation
+- route the files whose estimate exceeds the memory budget of a task to
+  chunked extraction: the matched vectors are split into ranges of
+  `vectorId`s, every range is extracted by a separate task into a separate
+  partition of the dataset. The rows of a single vector too large for a task
+  are further split into ranges of the `rowId` of `vectorData`.
+
+Independently of the memory, large files can be split for parallelism: with a
+`split_file_size`, every file is split into `ceil(file size / split_file_size)`
+parts of about equal number of rows, which are extracted in parallel from the
+same (read-only) database file by different workers.
+
+Planning is disabled by default and the extractors then build exactly one
+task per file, without reading any metadata, unless an extractor sets a
+maximum number of rows per task (`chunk_size`) or a `split_file_size`.
+"""
+
+from typing import List, Optional, Tuple
+
+import math
+import re
+
+from contextlib import contextmanager
+
+import dask
+import pandas as pd
+import sqlalchemy as sqla
+
+from common.logging_facilities import logi, loge, logd, logw
+
+import sql_queries
+
+# the name of the dask worker resource holding the memory of a worker, in bytes
+MEMORY_RESOURCE = 'MEMORY'
+
+# The peak memory used while reading a row of a query result into a
+# `DataFrame`, measured with `tracemalloc`: the row objects of the database
+# driver dominate, the size of the final `DataFrame` is much smaller
+ROW_BYTES = 64
+COLUMN_BYTES = 96
+
+# the approximate size of a row of `vectorData` in the database file,
+# including the index over `vectorId`; used for the vectors without `vectorCount`
+STORED_ROW_BYTES = 40
+
+# the fraction of the memory of a worker a single extraction task may use,
+# the rest is left for the downstream tasks and the worker itself
+TASK_MEMORY_FRACTION = 0.5
+
+_memory_limit = None
+_annotate_resources = False
+
+
+def set_memory_limit(memory_limit:Optional[int], annotate_resources:bool = False):
+    r"""
+    Enable memory-aware planning of the extraction
+
+    Parameters
+    ----------
+    memory_limit : Optional[int]
+        the memory of a worker, in bytes; None disables the planning
+
+    annotate_resources : bool
+        whether to annotate the extraction tasks with their estimated memory
+        as the dask resource `MEMORY_RESOURCE`; only to be enabled if all
+        workers declare this resource, otherwise the tasks are never scheduled
+    """
+    global _memory_limit, _annotate_resources
+    _memory_limit = memory_limit
+    _annotate_resources = annotate_resources
+
+
+def get_memory_limit() -> Optional[int]:
+    return _memory_limit
+
+
+def get_task_memory_budget() -> Optional[int]:
+    r"""
+    Return the memory, in bytes, a single extraction task may use, or None if
+    planning is disabled
+    """
+    if _memory_limit is None:
+        return None
+    return int(_memory_limit * TASK_MEMORY_FRACTION)
+
+
+def get_worker_memory_resource(client) -> Optional[int]:
+    r"""
+    Return the smallest amount of the resource `MEMORY_RESOURCE` declared by the
+    workers of the cluster of `client`, or None if any worker doesn't declare it
+    """
+    workers = client.scheduler_info()['workers']
+    if len(workers) == 0:
+        return None
+    resources = [ worker.get('resources', {}).get(MEMORY_RESOURCE) for worker in workers.values() ]
+    if None in resources:
+        return None
+    return int(min(resources))
+
+
+def estimate_memory(rows:int, columns:int) -> int:
+    r"""
+    Estimate the peak memory, in bytes, of reading `rows` rows with `columns`
+    columns from a database into a `DataFrame`
+    """
+    return int(rows * (ROW_BYTES + columns * COLUMN_BYTES))
+
+
+class FileEstimate():
+    r"""
+    The metadata of an input file and the estimated memory for extracting the
+    data of the matched vectors from it
+
+    Parameters
+    ----------
+    db_file : str
+        the path to the database file
+
+    file_size : int
+        the size of the database, from the number and size of its pages
+
+    vector_counts : pd.DataFrame
+        the `vectorId`, `vectorName` and `vectorCount` of the matched vectors
+
+    columns : int
+        the number of columns extracted
+
+    max_row_id : int
+        the largest `rowId` in `vectorData`
+    """
+    def __init__(self, db_file:str, file_size:int, vector_counts:pd.DataFrame, columns:int, max_row_id:int = 0):
+        self.db_file = db_file
+        self.file_size = file_size
+        self.vector_counts = vector_counts
+        self.columns = columns
+        self.max_row_id = max_row_id
+        self.rows = int(vector_counts['vectorCount'].sum())
+        self.memory = estimate_memory(self.rows, columns)
+
+    def __repr__(self) -> str:
+        return f'FileEstimate({self.db_file}, file_size={self.file_size}, vectors={len(self.vector_counts)}, rows={self.rows}, memory={self.memory})'
+
+
+def read_file_estimate(db_file:str, vector_filter:Optional[sqla.sql.elements.ColumnElement] = None
+                       , name_regex:Optional[str] = None, columns:int = 4) -> FileEstimate:
+    r"""
+    Read the metadata of `db_file` and estimate the memory for extracting the
+    data of the vectors matched by `vector_filter` and `name_regex`
+
+    Parameters
+    ----------
+    db_file : str
+        the path to the database file
+
+    vector_filter : Optional[sqla.sql.elements.ColumnElement]
+        the SQL expression selecting the vectors from the `vector` table
+
+    name_regex : Optional[str]
+        a regular expression the `vectorName` of the selected vectors
+        additionally has to match
+
+    columns : int
+        the number of columns extracted
+    """
+    engine = sqla.create_engine('sqlite:///' + db_file)
+    try:
+        with engine.connect() as connection:
+            page_count = connection.execute(sql_queries.page_count_query).scalar()
+            page_size = connection.execute(sql_queries.page_size_query).scalar()
+            vectors = pd.read_sql_query(sql_queries.generate_vector_count_query(), connection)
+            max_row_id = connection.execute(sql_queries.max_row_id_query).scalar() or 0
+            if vector_filter is not None:
+                # evaluate the filter on the (small) `vector` table in the database
+                matched = pd.read_sql_query(sql_queries.generate_vector_count_query(vector_filter), connection)
+    finally:
+        engine.dispose()
+
+    file_size = page_count * page_size
+
+    # the number of rows of vectors without a `vectorCount`, e.g. of an
+    # aborted simulation, is estimated from the remaining size of the file
+    missing = vectors['vectorCount'].isna()
+    if missing.any():
+        known_size = vectors['vectorCount'].sum() * STORED_ROW_BYTES
+        rows_per_vector = max(file_size - known_size, 0) / STORED_ROW_BYTES / missing.sum()
+        logd(f'read_file_estimate: {missing.sum()} vectors without vectorCount in {db_file}, assuming {rows_per_vector:.0f} rows each')
+        vectors.loc[missing, 'vectorCount'] = int(rows_per_vector)
+
+    if vector_filter is not None:
+        vectors = vectors[vectors['vectorId'].isin(matched['vectorId'])]
+
+    if name_regex is not None:
+        regex = re.compile(name_regex)
+        vectors = vectors[vectors['vectorName'].map(lambda name: regex.search(name) is not None)]
+
+    vectors = vectors.astype({'vectorCount': 'int64'}).reset_index(drop=True)
+
+    return FileEstimate(db_file, file_size, vectors, columns, max_row_id)
+
+
+def split_vector_ranges(vector_counts:pd.DataFrame, max_rows:int) -> List[Tuple[Tuple[int, int], int]]:
+    r"""
+    Split the vectors, ordered by `vectorId`, into consecutive ranges of
+    `vectorId`s with at most `max_rows` rows each. A single vector with more
+    than `max_rows` rows forms a range on its own.
+
+    Returns
+    -------
+    A list of the inclusive ranges of `vectorId`s with the number of rows in each
+    """
+    ranges = []
+    start = None
+    end = None
+    rows = 0
+    for vector_id, count in zip(vector_counts['vectorId'], vector_counts['vectorCount']):
+        if start is not None and rows + count > max_rows:
+            ranges.append(((start, end), rows))
+            start = None
+            rows = 0
+        if start is None:
+            start = int(vector_id)
+        end = int(vector_id)
+        rows += int(count)
+
+    if start is not None:
+        ranges.append(((start, end), rows))
+
+    return ranges
+
+
+def split_row_ranges(max_row_id:int, n:int) -> List[Tuple[int, int]]:
+    r"""
+    Split the `rowId`s from 1 to `max_row_id` into `n` inclusive ranges of
+    (almost) equal size. The rows of a vector are recorded over the whole
+    simulation, interleaved with the rows of all other vectors, so every range
+    holds a similar share of the rows of the vector.
+    """
+    n = max(min(n, max_row_id), 1)
+    edges = [ (i * max_row_id) // n for i in range(0, n + 1) ]
+    return [ (edges[i] + 1, edges[i + 1]) for i in range(0, n) ]
+
+
+class ExtractionPart():
+    r"""
+    A part of the extraction of a file, extracted by a single task
+
+    Parameters
+    ----------
+    db_file : str
+        the path to the database file
+
+    vector_id_range : Optional[Tuple[int, int]]
+        the inclusive range of `vectorId`s of the part, or None for all vectors
+
+    row_id_range : Optional[Tuple[int, int]]
+        the inclusive range of `rowId`s of the part, or None for all rows
+
+    memory : Optional[int]
+        the estimated memory for extracting the part, in bytes
+
+    partition : Optional[int]
+        the index of the part, or None if the file is extracted as a whole
+    """
+    def __init__(self, db_file:str, vector_id_range:Optional[Tuple[int, int]] = None
+                 , row_id_range:Optional[Tuple[int, int]] = None
+                 , memory:Optional[int] = None, partition:Optional[int] = None):
+        self.db_file = db_file
+        self.vector_id_range = vector_id_range
+        self.row_id_range = row_id_range
+        self.memory = memory
+        self.partition = partition
+
+    def __repr__(self) -> str:
+        return f'ExtractionPart({self.db_file}, vector_id_range={self.vector_id_range}, row_id_range={self.row_id_range}, memory={self.memory}, partition={self.partition})'
+
+
+def plan_extraction(file_list:List[str], vector_filter:Optional[sqla.sql.elements.ColumnElement] = None
+                    , name_regex:Optional[str] = None, columns:int = 4
+                    , splittable:bool = True, max_rows:Optional[int] = None
+                    , split_file_size:Optional[int] = None) -> List[ExtractionPart]:
+    r"""
+    Plan the extraction of the vectors matched by `vector_filter` and
+    `name_regex` from the files in `file_list`. If planning is disabled and
+    neither `max_rows` nor `split_file_size` is given, every file is extracted
+    as a whole by one task. Otherwise, the rows and memory for every file are
+    estimated and, if `splittable`, the files with more rows than fit into the
+    memory budget of a task, more than `max_rows` or larger than
+    `split_file_size` are split into ranges of `vectorId`s and, for single
+    vectors that are still too large, into ranges of `rowId`s.
+
+    Parameters
+    ----------
+    file_list : List[str]
+        the paths to the input files
+
+    vector_filter : Optional[sqla.sql.elements.ColumnElement]
+        the SQL expression selecting the vectors extracted
+
+    name_regex : Optional[str]
+        a regular expression the names of the extracted vectors have to match
+
+    columns : int
+        the number of columns extracted
+
+    splittable : bool
+        whether the extraction can be restricted to ranges of `vectorId`s and `rowId`s
+
+    max_rows : Optional[int]
+        the maximum number of rows extracted by a task, overriding the
+        number derived from the memory budget
+
+    split_file_size : Optional[int]
+        the size of the database file, in bytes, extracted by a single task;
+        larger files are split into `ceil(file size / split_file_size)` parts
+        for parallel extraction
+
+    Returns
+    -------
+    The list of parts, in the order of the files in `file_list`
+    """
+    budget = get_task_memory_budget()
+    if budget is None and max_rows is None and split_file_size is None:
+        return [ ExtractionPart(db_file) for db_file in file_list ]
+
+    if max_rows is None and budget is not None:
+        max_rows = max(budget // (ROW_BYTES + columns * COLUMN_BYTES), 1)
+
+    parts = []
+    for db_file in file_list:
+        try:
+            estimate = read_file_estimate(db_file, vector_filter, name_regex, columns)
+        except Exception as e:
+            logw(f'plan_extraction: could not estimate the memory for {db_file}, extracting it as a whole: {e!r}')
+            parts.append(ExtractionPart(db_file))
+            continue
+
+        logd(f'plan_extraction: {estimate}')
+
+        file_max_rows = max_rows
+        if split_file_size is not None and estimate.file_size > split_file_size:
+            # the split factor for parallel extraction, from the size of the file
+            split_factor = math.ceil(estimate.file_size / split_file_size)
+            split_rows = max(math.ceil(estimate.rows / split_factor), 1)
+            file_max_rows = split_rows if file_max_rows is None else min(file_max_rows, split_rows)
+
+        if file_max_rows is None or estimate.rows <= file_max_rows or not splittable or len(estimate.vector_counts) == 0:
+            if budget is not None and estimate.memory > budget:
+                logw(f'plan_extraction: the estimated memory for {db_file} ({estimate.memory / 2**20:.0f} MiB)'
+                     f' exceeds the budget of a task ({budget / 2**20:.0f} MiB), but the extraction can not be split')
+            parts.append(ExtractionPart(db_file, memory=estimate.memory))
+            continue
+
+        file_parts = []
+        for vector_id_range, rows in split_vector_ranges(estimate.vector_counts, file_max_rows):
+            if rows <= file_max_rows:
+                file_parts.append(ExtractionPart(db_file, vector_id_range=vector_id_range
+                                                 , memory=estimate_memory(rows, columns)))
+                continue
+
+            # a single vector with more rows than fit into a task
+            row_id_ranges = split_row_ranges(estimate.max_row_id, math.ceil(rows / file_max_rows))
+            for row_id_range in row_id_ranges:
+                file_parts.append(ExtractionPart(db_file, vector_id_range=vector_id_range, row_id_range=row_id_range
+                                                 , memory=estimate_memory(rows // len(row_id_ranges), columns)))
+
+        for i, part in enumerate(file_parts):
+            part.partition = i
+        parts.extend(file_parts)
+
+        logi(f'plan_extraction: splitting the extraction of {db_file} ({estimate.rows} rows, {estimate.memory / 2**20:.0f} MiB estimated)'
+             f' into {len(file_parts)} parts of at most {file_max_rows} rows')
+
+    return parts
+
+
+@contextmanager
+def annotate_part(part:ExtractionPart):
+    r"""
+    Annotate the tasks created in the enclosed block with the estimated memory
+    of `part`, as priority and, if enabled, as resource requirement
+    """
+    if part.memory is None:
+        yield
+        return
+
+    annotations = { 'priority': int(part.memory // 2**20) }
+    if _annotate_resources:
+        # a requirement larger than the resource of the workers can never be met
+        annotations['resources'] = { MEMORY_RESOURCE: min(part.memory, _memory_limit) }
+
+    with dask.annotate(**annotations):
+        yield
@@ -1,6 +1,8 @@
 
-from typing import Optional, Union, List, Set, Tuple
+from typing import Callable, Optional, Union, List, Set, Tuple
 
+import functools
+import pathlib
 import re
 
 # ---
@@ -20,9 +22,7 @@ import pandas as pd
 # ---
 
 import dask
-import dask.dataframe as ddf
-
-import dask.distributed
+import dask.utils
 from dask.delayed import Delayed
 
 # ---
@@ -32,6 +32,9 @@ from sqlalchemy import create_engine
 # ---
 
 import sql_queries
+import extraction_planning
+
+from sql_model import OmnetppTableModel as TM
 
 from yaml_helper import decode_node, proto_constructor
 
@@ -40,6 +43,9 @@ from data_io import DataSet, read_from_file
 from tag_extractor import ExtractRunParametersTagsOperation
 import tag_regular_expressions as tag_regex
 
+from utility.profiling import profiled
+from utility import fault_tolerance
+
 from common.common_sets import BASE_TAGS_EXTRACTION_FULL, BASE_TAGS_EXTRACTION_MINIMAL \
                                , DEFAULT_CATEGORICALS_COLUMN_EXCLUSION_SET
 
@@ -66,6 +72,7 @@ class SqlLiteReader():
     def disconnect(self):
         self.connection.close()
 
+    @profiled('sql', detail='self.db_file')
     def execute_sql_query(self, query):
         self.connect()
         result = pd.read_sql_query(query, self.connection)
@@ -84,6 +91,7 @@ class SqlLiteReader():
         self.disconnect()
         return result
 
+    @profiled('tags', detail='self.db_file')
     def extract_tags(self, attributes_regex_map, iterationvars_regex_map, parameters_regex_map):
         r"""
         Parameters
@@ -186,15 +194,76 @@ class Extractor(YAMLObject):
         setattr(self, 'iterationvars_regex_map', iterationvars_regex_map)
         setattr(self, 'parameters_regex_map', parameters_regex_map)
 
+    def set_name(self, name:str):
+        r"""
+        Set the name of the extractor in the recipe, identifying its tasks for checkpointing
+        """
+        setattr(self, 'name', name)
+
+    def get_name(self) -> str:
+        return getattr(self, 'name', f'{type(self).__name__}_{getattr(self, "alias", "")}')
+
+    def delayed_extraction(self, function:Callable, *task_parameters) -> Callable:
+        r"""
+        Return `dask.delayed(function)` or, if fault tolerance is enabled, a
+        replacement constructing a task that calls `function` with retries,
+        quarantine and checkpointing, see `utility.fault_tolerance`. The first
+        argument of `function` has to be the path to the input file. The task
+        is identified by the name of the extractor, the input file and
+        `task_parameters`, e.g. the range of the file extracted.
+        """
+        if not fault_tolerance.is_fault_tolerance_enabled():
+            return dask.delayed(function)
+
+        def delayed_call(db_file, *args, **kwargs):
+            task_id = fault_tolerance.get_task_id(self.get_name(), db_file, *task_parameters)
+            return dask.delayed(fault_tolerance.run_checkpointed)(task_id, function, db_file, *args, **kwargs)
+
+        return delayed_call
+
 
 class BaseExtractor(Extractor):
     r"""
     A class for extracting and preprocessing data from a SQLite database.
     This is the base class.
+
+    The extractors of vector data support chunked extraction of large files:
+
+    Parameters
+    ----------
+    chunk_size: Optional[int]
+        the maximum number of rows extracted by a single task. The matched
+        vectors of a file with more rows are split into ranges of `vectorId`s
+        and `rowId`s that are extracted by separate tasks into separate
+        partitions of the dataset. With `chunk_output_directory`, the number of
+        rows per written chunk.
+
+    chunk_output_directory: Optional[str]
+        if set, the result of every file is streamed from the database in
+        chunks of `chunk_size` rows, which are written directly to
+        `<chunk_output_directory>/<file>_<alias>_chunk-<n>.feather`, without
+        ever holding the whole result in memory. The dataset then only
+        contains the list of written files (the columns `file` and `rows`).
+
+    split_file_size: Optional[Union[int, str]]
+        the size of a database file, in bytes or as string like `'2GiB'`,
+        extracted by a single task. Larger files are split into `ceil(file size
+        / split_file_size)` ranges of `vectorId`s and `rowId`s with about the
+        same number of rows, that are extracted in parallel by different
+        workers.
+
+    merge_partitions: bool
+        whether to concatenate the partitions extracted from a file, by
+        `chunk_size` or `split_file_size`, into a single `DataFrame` per file
+        after the extraction, instead of keeping them as separate partitions of
+        the dataset
     """
 
     yaml_tag = u'!BaseExtractor'
 
+    # the number of rows per chunk written with `chunk_output_directory`, if `chunk_size` isn't set
+    DEFAULT_CHUNK_SIZE = 1000000
+
     def __init__(self, /,
                  input_files:list
                  , categorical_columns:List[str] = []
@@ -205,6 +274,10 @@ class BaseExtractor(Extractor):
                  , simtimeRaw:bool = True
                  , moduleName:bool = True
                  , eventNumber:bool = True
+                 , chunk_size:Optional[int] = None
+                 , chunk_output_directory:Optional[str] = None
+                 , split_file_size:Optional[Union[int, str]] = None
+                 , merge_partitions:bool = False
                  , *args, **kwargs
                  ):
         self.input_files:list = input_files
@@ -227,6 +300,71 @@ class BaseExtractor(Extractor):
         self.moduleName:bool = moduleName
         self.eventNumber:bool = eventNumber
 
+        self.chunk_size:Optional[int] = chunk_size
+        self.chunk_output_directory:Optional[str] = chunk_output_directory
+
+        if isinstance(split_file_size, str):
+            split_file_size = dask.utils.parse_bytes(split_file_size)
+        self.split_file_size:Optional[int] = split_file_size
+        self.merge_partitions:bool = merge_partitions
+
+    def get_extracted_column_count(self, vectorName:bool = False) -> int:
+        r"""
+        Return the number of columns read from `vectorData`, for estimating the
+        memory needed for the extraction
+        """
+        # the `rowId` and the value column are always extracted
+        return 2 + sum([self.simtimeRaw, self.moduleName, self.eventNumber, vectorName])
+
+
+    @staticmethod
+    def concat_partitions(partitions:List[pd.DataFrame]) -> pd.DataFrame:
+        r"""
+        Concatenate the partitions extracted from a file. The `Categorical`s
+        are chosen and built per partition, so their categories differ and
+        `pandas.concat` turns them into `object` columns: the columns that are
+        `Categorical` in any partition are converted again, over the
+        concatenated data, with the threshold of `convert_columns_to_category`
+        """
+        # skip the empty results of failed extractions
+        partitions = [ partition for partition in partitions if not partition.empty ]
+        if len(partitions) == 0:
+            return pd.DataFrame()
+
+        categorical_columns = set.union(*[ set(partition.select_dtypes('category').columns) for partition in partitions ])
+        data = pd.concat(partitions, ignore_index=True)
+        threshold = len(data) / 4
+        for col in categorical_columns:
+            if data[col].dtype.name != 'category' and data[col].nunique(dropna=False) < threshold:
+                data[col] = data[col].astype('category').cat.as_ordered()
+
+        return data
+
+
+    def finalize_partitions(self, result_list:List[Tuple[Delayed, DataAttributes]]) -> List[Tuple[Delayed, DataAttributes]]:
+        r"""
+        If `merge_partitions` is set, concatenate the partitions of every file
+        in `result_list` into a single task, otherwise return `result_list` unchanged
+        """
+        if not self.merge_partitions:
+            return result_list
+
+        partitions = {}
+        for res, attributes in result_list:
+            partitions.setdefault(next(iter(attributes.get_source_files())), []).append((res, attributes))
+
+        merged_list = []
+        for source_file, file_results in partitions.items():
+            if len(file_results) == 1:
+                merged_list.append(file_results[0])
+                continue
+            res = dask.delayed(BaseExtractor.concat_partitions)([ res for res, _ in file_results ])
+            attributes = file_results[0][1]
+            attributes.partition = None
+            merged_list.append((res, attributes))
+
+        return merged_list
+
 
     @staticmethod
     def apply_tags(data, tags, base_tags=None, additional_tags=[], minimal=True):
@@ -313,11 +451,15 @@ class BaseExtractor(Extractor):
                                , simtimeRaw=True
                                , moduleName=True
                                , eventNumber=True
+                               , vector_id_range=None
+                               , row_id_range=None
                                , **kwargs):
         query = sql_queries.generate_signal_query(signal, value_label=alias
                                                   , moduleName=moduleName
                                                   , simtimeRaw=simtimeRaw
-                                                  , eventNumber=eventNumber)
+                                                  , eventNumber=eventNumber
+                                                  , vector_id_range=vector_id_range
+                                                  , row_id_range=row_id_range)
 
         return BaseExtractor.read_query_from_file(db_file, query, alias, **kwargs)
 
@@ -328,12 +470,16 @@ class BaseExtractor(Extractor):
                                , simtimeRaw:bool=True
                                , moduleName:bool=True
                                , eventNumber:bool=True
+                               , vector_id_range=None
+                               , row_id_range=None
                                , **kwargs):
         query = sql_queries.generate_signal_like_query(pattern, value_label=alias
                                                   , vectorName=vectorName
                                                   , moduleName=moduleName
                                                   , simtimeRaw=simtimeRaw
-                                                  , eventNumber=eventNumber)
+                                                  , eventNumber=eventNumber
+                                                  , vector_id_range=vector_id_range
+                                                  , row_id_range=row_id_range)
 
         return BaseExtractor.read_query_from_file(db_file, query, alias, **kwargs)
 
@@ -355,6 +501,7 @@ class BaseExtractor(Extractor):
 
 
     @staticmethod
+    @profiled('extract', detail='db_file', input_file='db_file')
     def read_query_from_file(db_file, query, alias
                                , categorical_columns=[], excluded_categorical_columns=set()
                                , base_tags = None, additional_tags = []
@@ -372,14 +519,35 @@ class BaseExtractor(Extractor):
                 tags = sql_reader.extract_tags(attributes_regex_map, iterationvars_regex_map, parameters_regex_map)
             except Exception as e:
                 loge(f'>>>> ERROR: no tags could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
                 return pd.DataFrame()
 
             try:
                 data = sql_reader.execute_sql_query(query)
             except Exception as e:
                 loge(f'>>>> ERROR: no data could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
                 return pd.DataFrame()
 
+            return BaseExtractor.process_query_result(data, tags, alias
+                                                      , categorical_columns=categorical_columns
+                                                      , excluded_categorical_columns=excluded_categorical_columns
+                                                      , base_tags=base_tags, additional_tags=additional_tags
+                                                      , minimal_tags=minimal_tags)
+
+
+    @staticmethod
+    def process_query_result(data, tags, alias
+                               , categorical_columns=[], excluded_categorical_columns=set()
+                               , base_tags = None, additional_tags = []
+                               , minimal_tags=True
+                               ):
+            r"""
+            Drop the `rowId`, add the tags and convert the columns with few
+            distinct values, except the column `alias`, into `Categorical`s
+            """
             if 'rowId' in data.columns:
                 data = data.drop(labels=['rowId'], axis=1)
 
@@ -399,6 +567,103 @@ class BaseExtractor(Extractor):
 
 
     @staticmethod
+    @profiled('extract', detail='db_file', input_file='db_file')
+    def write_query_chunks_from_file(db_file, query, alias, output_prefix:str, chunk_size:int
+                               , process_chunk:Optional[Callable]=None
+                               , categorical_columns=[], excluded_categorical_columns=set()
+                               , base_tags = None, additional_tags = []
+                               , minimal_tags=True
+                               , attributes_regex_map=tag_regex.attributes_regex_map
+                               , iterationvars_regex_map=tag_regex.iterationvars_regex_map
+                               , parameters_regex_map=tag_regex.parameters_regex_map
+                               ):
+            r"""
+            Stream the result of `query` from `db_file` in chunks of
+            `chunk_size` rows, process every chunk like `read_query_from_file`
+            (and with `process_chunk`, if given) and write it to
+            `<output_prefix>_chunk-<n>.feather`. Only one chunk is held in
+            memory at any time.
+
+            Returns
+            -------
+            A `DataFrame` with the name (`file`) and number of rows (`rows`) of every chunk written
+            """
+            sql_reader = SqlLiteReader(db_file)
+
+            try:
+                tags = sql_reader.extract_tags(attributes_regex_map, iterationvars_regex_map, parameters_regex_map)
+            except Exception as e:
+                loge(f'>>>> ERROR: no tags could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
+                return pd.DataFrame()
+
+            pathlib.Path(output_prefix).parent.mkdir(parents=True, exist_ok=True)
+
+            chunks = []
+            sql_reader.connect()
+            try:
+                for i, data in enumerate(pd.read_sql_query(query, sql_reader.connection, chunksize=chunk_size)):
+                    data = BaseExtractor.process_query_result(data, tags, alias
+                                                              , categorical_columns=categorical_columns
+                                                              , excluded_categorical_columns=excluded_categorical_columns
+                                                              , base_tags=base_tags, additional_tags=additional_tags
+                                                              , minimal_tags=minimal_tags)
+                    if process_chunk is not None:
+                        data = process_chunk(data)
+
+                    output_file = f'{output_prefix}_chunk-{i}.feather'
+                    data.reset_index(drop=True).to_feather(output_file)
+                    chunks.append({ 'file': output_file, 'rows': len(data) })
+                    logd(f'write_query_chunks_from_file: wrote {len(data)} rows from {db_file} to {output_file}')
+            except Exception as e:
+                loge(f'>>>> ERROR: no data could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
+            finally:
+                sql_reader.disconnect()
+
+            logi(f'write_query_chunks_from_file: wrote {len(chunks)} chunks from {db_file} to {output_prefix}_chunk-*.feather')
+
+            return pd.DataFrame(chunks, columns=['file', 'rows'])
+
+
+    def prepare_chunk_output(self, file_list:List[str], query, alias:str
+                             , columns:int, process_chunk:Optional[Callable]=None):
+        r"""
+        Construct a task for every file in `file_list` that streams the result
+        of `query` into chunks in `chunk_output_directory`, see
+        `write_query_chunks_from_file`
+        """
+        chunk_size = self.chunk_size or BaseExtractor.DEFAULT_CHUNK_SIZE
+
+        result_list = []
+        for db_file in file_list:
+            output_prefix = f'{self.chunk_output_directory}/{pathlib.PurePath(db_file).stem}_{alias}'
+            # the memory of the task is bounded by the size of a chunk
+            part = extraction_planning.ExtractionPart(db_file, memory=extraction_planning.estimate_memory(chunk_size, columns) \
+                                                                       if extraction_planning.get_memory_limit() else None)
+            with extraction_planning.annotate_part(part):
+                res = self.delayed_extraction(BaseExtractor.write_query_chunks_from_file)\
+                                             (db_file, query, alias, output_prefix, chunk_size
+                                              , process_chunk = process_chunk
+                                              , categorical_columns = self.categorical_columns
+                                              , excluded_categorical_columns = self.categorical_columns_excluded
+                                              , base_tags = self.base_tags
+                                              , additional_tags = self.additional_tags
+                                              , minimal_tags = self.minimal_tags
+                                              , attributes_regex_map = self.attributes_regex_map
+                                              , iterationvars_regex_map = self.iterationvars_regex_map
+                                              , parameters_regex_map = self.parameters_regex_map
+                                              )
+            attributes = DataAttributes(source_file=db_file, alias=alias)
+            result_list.append((res, attributes))
+
+        return result_list
+
+
+    @staticmethod
+    @profiled('extract', detail='db_file', input_file='db_file')
     def read_sql_from_file(db_file, query
                                , categorical_columns=[], excluded_categorical_columns=set()
                                ):
@@ -408,6 +673,8 @@ class BaseExtractor(Extractor):
                 data = sql_reader.execute_sql_query(query)
             except Exception as e:
                 loge(f'>>>> ERROR: no data could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
                 return pd.DataFrame()
 
             if 'rowId' in data.columns:
@@ -459,7 +726,7 @@ class SqlExtractor(BaseExtractor):
         # on the data and the leafs of the computation graph
         result_list = []
         for db_file in data_set.get_file_list():
-            res = dask.delayed(BaseExtractor.read_sql_from_file)\
+            res = self.delayed_extraction(BaseExtractor.read_sql_from_file)\
                                          (db_file, self.query
                                           , categorical_columns = self.categorical_columns
                                           , excluded_categorical_columns = self.categorical_columns_excluded
@@ -521,7 +788,7 @@ class RawStatisticExtractor(BaseExtractor):
         # on the data and the leafs of the computation graph
         result_list = []
         for db_file in data_set.get_file_list():
-            res = dask.delayed(BaseExtractor.read_statistic_from_file)\
+            res = self.delayed_extraction(BaseExtractor.read_statistic_from_file)\
                                          (db_file, self.signal, self.alias
                                           , moduleName = self.moduleName
                                           , statName = self.statName
@@ -593,7 +860,7 @@ class RawScalarExtractor(BaseExtractor):
         # on the data and the leafs of the computation graph
         result_list = []
         for db_file in data_set.get_file_list():
-            res = dask.delayed(BaseExtractor.read_scalars_from_file)\
+            res = self.delayed_extraction(BaseExtractor.read_scalars_from_file)\
                                          (db_file, self.signal, self.alias
                                           , moduleName = self.moduleName
                                           , scalarName = self.scalarName
@@ -646,26 +913,43 @@ class RawExtractor(BaseExtractor):
 
         # For every input file construct a `Delayed` object, a kind of a promise
         # on the data and the leafs of the computation graph
+        if self.chunk_output_directory is not None:
+            query = sql_queries.generate_signal_query(self.signal, value_label=self.alias
+                                                      , moduleName=self.moduleName
+                                                      , simtimeRaw=self.simtimeRaw
+                                                      , eventNumber=self.eventNumber)
+            return self.prepare_chunk_output(data_set.get_file_list(), query, self.alias, self.get_extracted_column_count())
+
         result_list = []
-        for db_file in data_set.get_file_list():
-            res = dask.delayed(BaseExtractor.read_signals_from_file)\
-                                         (db_file, self.signal, self.alias
-                                          , moduleName = self.moduleName
-                                          , eventNumber = self.eventNumber
-                                          , simtimeRaw = self.simtimeRaw
-                                          , categorical_columns = self.categorical_columns
-                                          , excluded_categorical_columns = self.categorical_columns_excluded
-                                          , base_tags = self.base_tags
-                                          , additional_tags = self.additional_tags
-                                          , minimal_tags = self.minimal_tags
-                                          , attributes_regex_map = self.attributes_regex_map
-                                          , iterationvars_regex_map = self.iterationvars_regex_map
-                                          , parameters_regex_map = self.parameters_regex_map
-                                          )
-            attributes = DataAttributes(source_file=db_file, alias=self.alias)
+        # estimate the memory for every file and split the files too large
+        # for a single task into ranges of `vectorId`s, if enabled
+        parts = extraction_planning.plan_extraction(data_set.get_file_list()
+                                                    , TM.vector_table.c.vectorName == self.signal
+                                                    , columns=self.get_extracted_column_count()
+                                                    , max_rows=self.chunk_size
+                                                    , split_file_size=self.split_file_size)
+        for part in parts:
+            with extraction_planning.annotate_part(part):
+                res = self.delayed_extraction(BaseExtractor.read_signals_from_file, part.vector_id_range, part.row_id_range)\
+                                             (part.db_file, self.signal, self.alias
+                                              , moduleName = self.moduleName
+                                              , eventNumber = self.eventNumber
+                                              , simtimeRaw = self.simtimeRaw
+                                              , vector_id_range = part.vector_id_range
+                                              , row_id_range = part.row_id_range
+                                              , categorical_columns = self.categorical_columns
+                                              , excluded_categorical_columns = self.categorical_columns_excluded
+                                              , base_tags = self.base_tags
+                                              , additional_tags = self.additional_tags
+                                              , minimal_tags = self.minimal_tags
+                                              , attributes_regex_map = self.attributes_regex_map
+                                              , iterationvars_regex_map = self.iterationvars_regex_map
+                                              , parameters_regex_map = self.parameters_regex_map
+                                              )
+            attributes = DataAttributes(source_file=part.db_file, alias=self.alias, partition=part.partition)
             result_list.append((res, attributes))
 
-        return result_list
+        return self.finalize_partitions(result_list)
 
 
 class PositionExtractor(BaseExtractor):
@@ -727,6 +1011,7 @@ class PositionExtractor(BaseExtractor):
             self.restriction = restriction
 
     @staticmethod
+    @profiled('extract', detail='db_file', input_file='db_file')
     def read_position_and_signal_from_file(db_file
                                            , x_signal:str
                                            , y_signal:str
@@ -751,6 +1036,8 @@ class PositionExtractor(BaseExtractor):
                 tags = sql_reader.extract_tags(attributes_regex_map, iterationvars_regex_map, parameters_regex_map)
             except Exception as e:
                 loge(f'>>>> ERROR: no tags could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
                 return pd.DataFrame()
 
             query = sql_queries.get_signal_with_position(x_signal=x_signal, y_signal=y_signal
@@ -766,6 +1053,8 @@ class PositionExtractor(BaseExtractor):
                 data = sql_reader.execute_sql_query(query)
             except Exception as e:
                 loge(f'>>>> ERROR: no data could be extracted from {db_file}:\n {e}')
+                if fault_tolerance.is_fault_tolerance_enabled():
+                    raise
                 return pd.DataFrame()
 
             if 'rowId' in data.columns:
@@ -791,25 +1080,33 @@ class PositionExtractor(BaseExtractor):
         # For every input file construct a `Delayed` object, a kind of a promise
         # on the data and the leafs of the computation graph
         result_list = []
-        for db_file in data_set.get_file_list():
-            res = dask.delayed(PositionExtractor.read_position_and_signal_from_file)\
-                               (db_file
-                                , self.x_signal
-                                , self.y_signal
-                                , self.x_alias
-                                , self.y_alias
-                                , self.signal
-                                , self.alias
-                                , restriction=self.restriction
-                                , moduleName=self.moduleName
-                                , simtimeRaw=self.simtimeRaw
-                                , eventNumber=self.eventNumber
-                                , categorical_columns=self.categorical_columns \
-                                , excluded_categorical_columns=self.categorical_columns_excluded \
-                                , base_tags=self.base_tags, additional_tags=self.additional_tags
-                                , minimal_tags=self.minimal_tags
-                               )
-            attributes = DataAttributes(source_file=db_file, alias=self.alias)
+        # the positions are joined to the signal over the `eventNumber` of all
+        # vectors, so the extraction can't be split into ranges of `vectorId`s;
+        # the rows of the signal and the two positions are extracted
+        parts = extraction_planning.plan_extraction(data_set.get_file_list()
+                                                    , TM.vector_table.c.vectorName == self.signal
+                                                    , columns=self.get_extracted_column_count() + 2
+                                                    , splittable=False)
+        for part in parts:
+            with extraction_planning.annotate_part(part):
+                res = self.delayed_extraction(PositionExtractor.read_position_and_signal_from_file, part.vector_id_range, part.row_id_range)\
+                                   (part.db_file
+                                    , self.x_signal
+                                    , self.y_signal
+                                    , self.x_alias
+                                    , self.y_alias
+                                    , self.signal
+                                    , self.alias
+                                    , restriction=self.restriction
+                                    , moduleName=self.moduleName
+                                    , simtimeRaw=self.simtimeRaw
+                                    , eventNumber=self.eventNumber
+                                    , categorical_columns=self.categorical_columns \
+                                    , excluded_categorical_columns=self.categorical_columns_excluded \
+                                    , base_tags=self.base_tags, additional_tags=self.additional_tags
+                                    , minimal_tags=self.minimal_tags
+                                   )
+            attributes = DataAttributes(source_file=part.db_file, alias=self.alias)
             result_list.append((res, attributes))
 
         return result_list
@@ -888,6 +1185,8 @@ class MatchingExtractor(BaseExtractor):
                             , moduleName:bool=True
                             , simtimeRaw:bool=True
                             , eventNumber:bool=False
+                            , vector_id_range=None
+                            , row_id_range=None
                             ):
         result_list = []
         for signal, alias in signals:
@@ -902,6 +1201,8 @@ class MatchingExtractor(BaseExtractor):
                                                       , simtimeRaw=simtimeRaw
                                                       , moduleName=moduleName
                                                       , eventNumber=eventNumber
+                                                      , vector_id_range=vector_id_range
+                                                      , row_id_range=row_id_range
                                                      )
             result_list.append((res, alias))
 
@@ -930,11 +1231,19 @@ class MatchingExtractor(BaseExtractor):
         # For every input file construct a `Delayed` object, a kind of a promise
         # on the data, and the leafs of the task graph
         result_list = []
-        for db_file in data_set.get_file_list():
+        # estimate the memory for every file and split the files too large
+        # for a single task into ranges of `vectorId`s, if enabled
+        parts = extraction_planning.plan_extraction(data_set.get_file_list()
+                                                    , name_regex=self.pattern
+                                                    , columns=self.get_extracted_column_count()
+                                                    , max_rows=self.chunk_size
+                                                    , split_file_size=self.split_file_size)
+        for part in parts:
             # get all signal names that match the given regular expression
-            matching_signals_result = dask.delayed(MatchingExtractor.get_matching_signals)(db_file, self.pattern, self.alias_pattern)
+            matching_signals_result = dask.delayed(MatchingExtractor.get_matching_signals)(part.db_file, self.pattern, self.alias_pattern)
             # get the data for the matched signals
-            res = dask.delayed(MatchingExtractor.extract_all_signals)(db_file, matching_signals_result
+            with extraction_planning.annotate_part(part):
+                res = self.delayed_extraction(MatchingExtractor.extract_all_signals, part.vector_id_range, part.row_id_range)(part.db_file, matching_signals_result
                                                                        , self.categorical_columns,self. categorical_columns_excluded
                                                                        , base_tags=self.base_tags, additional_tags=self.additional_tags
                                                                        , minimal_tags=self.minimal_tags
@@ -944,11 +1253,13 @@ class MatchingExtractor(BaseExtractor):
                                                                        , simtimeRaw=self.simtimeRaw
                                                                        , moduleName=self.moduleName
                                                                        , eventNumber=self.eventNumber
+                                                                       , vector_id_range=part.vector_id_range
+                                                                       , row_id_range=part.row_id_range
                                                                        )
-            attributes = DataAttributes(source_file=db_file, alias=self.alias)
+            attributes = DataAttributes(source_file=part.db_file, alias=self.alias, partition=part.partition)
             result_list.append((res, attributes))
 
-        return result_list
+        return self.finalize_partitions(result_list)
 
 
 class PatternMatchingBulkExtractor(BaseExtractor):
@@ -1005,6 +1316,8 @@ class PatternMatchingBulkExtractor(BaseExtractor):
                             , moduleName:bool=True
                             , simtimeRaw:bool=True
                             , eventNumber:bool=False
+                            , vector_id_range=None
+                            , row_id_range=None
                             ):
         data = BaseExtractor.read_pattern_matched_signals_from_file(db_file, pattern, alias \
                                                       , categorical_columns=categorical_columns \
@@ -1018,9 +1331,26 @@ class PatternMatchingBulkExtractor(BaseExtractor):
                                                       , simtimeRaw=simtimeRaw
                                                       , moduleName=moduleName
                                                       , eventNumber=eventNumber
+                                                      , vector_id_range=vector_id_range
+                                                      , row_id_range=row_id_range
                                                      )
 
 
+        return PatternMatchingBulkExtractor.assign_variable(data, alias_match_pattern, alias_pattern
+                                                            , categorical_columns=categorical_columns
+                                                            , excluded_categorical_columns=excluded_categorical_columns
+                                                            , db_file=db_file)
+
+
+    @staticmethod
+    def assign_variable(data, alias_match_pattern:str, alias_pattern:str
+                        , categorical_columns=[], excluded_categorical_columns=set()
+                        , db_file=None):
+        r"""
+        Replace the column `vectorName` of the extracted `data` by the column
+        `variable`, the name constructed from `alias_pattern` and the named
+        capture groups of `alias_match_pattern`
+        """
         def process_vectorName(d):
             # compile the signal matching regex
             regex = re.compile(alias_match_pattern)
@@ -1055,10 +1385,32 @@ class PatternMatchingBulkExtractor(BaseExtractor):
 
         # For every input file construct a `Delayed` object, a kind of a promise
         # on the data, and the leafs of the task graph
+        if self.chunk_output_directory is not None:
+            query = sql_queries.generate_signal_like_query(self.pattern, value_label=self.alias
+                                                           , vectorName=True
+                                                           , moduleName=self.moduleName
+                                                           , simtimeRaw=self.simtimeRaw
+                                                           , eventNumber=self.eventNumber)
+            process_chunk = functools.partial(PatternMatchingBulkExtractor.assign_variable
+                                              , alias_match_pattern=self.alias_match_pattern
+                                              , alias_pattern=self.alias_pattern
+                                              , categorical_columns=self.categorical_columns
+                                              , excluded_categorical_columns=self.categorical_columns_excluded)
+            return self.prepare_chunk_output(data_set.get_file_list(), query, self.alias
+                                             , self.get_extracted_column_count(vectorName=True), process_chunk=process_chunk)
+
         result_list = []
-        for db_file in data_set.get_file_list():
+        # estimate the memory for every file and split the files too large
+        # for a single task into ranges of `vectorId`s, if enabled
+        parts = extraction_planning.plan_extraction(data_set.get_file_list()
+                                                    , TM.vector_table.c.vectorName.like(self.pattern)
+                                                    , columns=self.get_extracted_column_count(vectorName=True)
+                                                    , max_rows=self.chunk_size
+                                                    , split_file_size=self.split_file_size)
+        for part in parts:
             # get the data for all signals that match the given SQL pattern
-            res = dask.delayed(PatternMatchingBulkExtractor.extract_all_signals)(db_file, self.pattern, self.alias
+            with extraction_planning.annotate_part(part):
+                res = self.delayed_extraction(PatternMatchingBulkExtractor.extract_all_signals, part.vector_id_range, part.row_id_range)(part.db_file, self.pattern, self.alias
                                                                        , self.alias_match_pattern, self.alias_pattern
                                                                        , self.categorical_columns,self. categorical_columns_excluded
                                                                        , base_tags=self.base_tags, additional_tags=self.additional_tags
@@ -1070,11 +1422,13 @@ class PatternMatchingBulkExtractor(BaseExtractor):
                                                                        , simtimeRaw=self.simtimeRaw
                                                                        , moduleName=self.moduleName
                                                                        , eventNumber=self.eventNumber
+                                                                       , vector_id_range=part.vector_id_range
+                                                                       , row_id_range=part.row_id_range
                                                                        )
-            attributes = DataAttributes(source_file=db_file, alias=self.alias)
+            attributes = DataAttributes(source_file=part.db_file, alias=self.alias, partition=part.partition)
             result_list.append((res, attributes))
 
-        return result_list
+        return self.finalize_partitions(result_list)
 
 
 class PatternMatchingBulkScalarExtractor(BaseExtractor):
@@ -1205,7 +1559,7 @@ class PatternMatchingBulkScalarExtractor(BaseExtractor):
         result_list = []
         for db_file in data_set.get_file_list():
             # get the data for all signals that match the given SQL pattern
-            res = dask.delayed(PatternMatchingBulkScalarExtractor.extract_all_scalars)(db_file, self.pattern, self.alias
+            res = self.delayed_extraction(PatternMatchingBulkScalarExtractor.extract_all_scalars)(db_file, self.pattern, self.alias
                                                                        , self.alias_match_pattern, self.alias_pattern
                                                                        , self.categorical_columns,self. categorical_columns_excluded
                                                                        , base_tags=self.base_tags, additional_tags=self.additional_tags
@@ -2,6 +2,7 @@
 
 import time
 import argparse
+import traceback
 
 from typing import Optional
 
@@ -9,8 +10,8 @@ import pyarrow
 
 import pandas as pd
 
-from IPython.display import display
-from IPython import embed
+# IPython is imported in the functions displaying the data, after the arguments
+# have been parsed and the data has been read
 
 from data_io import read_from_file
 
@@ -28,6 +29,8 @@ def display_full(df, max_rows:Optional[int] = None, max_columns:Optional[int] =
                  , max_colwidth:Optional[float] = None
                  , precision:int = pd.options.display.precision
                  , width:int = 1000):
+    from IPython.display import display
+
     with pd.option_context('display.max_rows', max_rows, 'display.max_columns', max_columns
                           , 'display.max_colwidth', max_colwidth , 'display.width', width
                           , 'display.precision', precision
@@ -63,6 +66,10 @@ def main():
     format_string = '{:0.' + str(args.precision) +'f}'
     # print(f'{format_string=}')
     context_options = ['display.precision', args.precision, 'display.float_format', format_string.format]
+
+    from IPython.display import display
+    from IPython import embed
+
     with pd.option_context(*context_options):
         if args.full:
             if args.query:
@@ -1,9 +1,12 @@
 
-from typing import Union, List, Callable, Optional
+from typing import Union, List, Callable, Optional, Set
 
 import functools
+import hashlib
 import itertools
+import keyword
 import operator
+import os
 
 import re
 
@@ -24,12 +27,11 @@ import numpy as np
 import pandas as pd
 import seaborn as sb
 import matplotlib as mpl
+import matplotlib.backends.backend_agg
 
 # ---
 
 import dask
-import dask.dataframe as ddf
-
 import dask.distributed
 from dask.delayed import Delayed
 
@@ -39,12 +41,83 @@ from yaml_helper import decode_node, proto_constructor
 from data_io import DataSet, read_from_file
 from extractors import RawExtractor, DataAttributes
 
-from utility.filesystem import check_file_access_permissions
+from utility.filesystem import check_file_access_permissions, check_directory_access_permissions, get_files_fingerprint
+from utility.code_cache import get_code_cache
+from utility import quantile_sketch
+from utility import summary_statistics
+from utility import binning
+from utility.profiling import profiled
 
 from common.debug import start_ipython_dbg_cmdline
 
 # ---
 
+# The theme applied last in this (worker) process and the rc parameters set by
+# every theme applied so far, see `set_plotting_theme`
+_current_theme = None
+_theme_rc_cache = {}
+
+def set_plotting_theme(context:str = 'paper', axes_style:str = 'dark', rc:Optional[dict] = None):
+    r"""
+    Apply the seaborn theme given by `context`, `axes_style` and the
+    additional matplotlib rc parameters `rc`.
+
+    The rc parameters set by every distinct theme are cached per process, so
+    switching between themes only updates those parameters, and applying the
+    theme that is already active does nothing.
+
+    Parameters
+    ----------
+    context: str
+        the seaborn plotting context
+
+    axes_style: str
+        the seaborn axes style
+
+    rc: Optional[dict]
+        the additional matplotlib rc parameters
+    """
+    global _current_theme
+
+    key = (context, axes_style, repr(sorted(rc.items())) if rc else None)
+    if key == _current_theme:
+        return
+
+    if key in _theme_rc_cache:
+        mpl.rcParams.update(_theme_rc_cache[key])
+    else:
+        if rc:
+            sb.set_theme(context=context, style=axes_style, rc=rc)
+        else:
+            sb.set_theme(context=context, style=axes_style)
+        # the parameters set by `seaborn.set_theme`
+        keys = set(sb.axes_style(axes_style)).union(sb.plotting_context(context)).union(['axes.prop_cycle', 'font.family'])
+        keys.update(rc or {})
+        _theme_rc_cache[key] = { k: mpl.rcParams[k] for k in keys if k in mpl.rcParams }
+        logd(f'set_plotting_theme: added theme {key=}')
+
+    _current_theme = key
+
+
+def warm_up_plotting(backend:str = 'agg', context:str = 'paper', axes_style:str = 'dark'):
+    r"""
+    Prepare the current (worker) process for plotting: select the backend,
+    apply the default theme and draw a figure with text once, so that the
+    font cache is built and the fonts are loaded before the first plotting
+    task runs.
+    """
+    mpl.use(backend)
+    set_plotting_theme(context, axes_style)
+
+    figure = mpl.figure.Figure(figsize=(1, 1))
+    canvas = mpl.backends.backend_agg.FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.plot([0, 1], [0, 1])
+    ax.set_title('warm-up')
+    canvas.draw()
+    logd('warm_up_plotting: done')
+
+
 class PlottingReaderFeather(YAMLObject):
     r"""
     Import the data, saved as [feather/arrow](https://arrow.apache.org/docs/python/feather.html), from the input files
@@ -65,28 +138,75 @@ class PlottingReaderFeather(YAMLObject):
 
     sample_seed: int
         the seed to use for the sampling RNG
+
+    filter_query: str
+        if not None, the query expression for selecting the rows to keep from every input file
+
+    columns: Optional[List[str]]
+        if not None, only these columns are read from the input files
     """
     yaml_tag = u'!PlottingReaderFeather'
 
-    def __init__(self, input_files:str, numerical_columns:List[str] = [], sample:float = None, sample_seed:int = 23, filter_query:str = None):
+    def __init__(self, input_files:str, numerical_columns:List[str] = [], sample:float = None, sample_seed:int = 23, filter_query:str = None
+                 , columns:Optional[List[str]] = None):
         self.input_files = input_files
         self.numerical_columns = numerical_columns
         self.sample = sample
         self.sample_seed = sample_seed
         self.filter_query = filter_query
+        self.columns = columns
+
+    def push_down(self, filter_query:Optional[str] = None, columns:Optional[List[str]] = None):
+        r"""
+        Restrict the rows and columns read from the input files further, in
+        addition to `filter_query` and `columns`.
+
+        Parameters
+        ----------
+        filter_query: Optional[str]
+            the query expression the rows have to match as well
+
+        columns: Optional[List[str]]
+            the columns to read, intersected with `columns`
+        """
+        if filter_query:
+            if self.filter_query:
+                self.filter_query = f'({self.filter_query}) and ({filter_query})'
+            else:
+                self.filter_query = filter_query
+            logi(f'PlottingReaderFeather::push_down: {self.filter_query=}')
+
+        if columns is not None:
+            if self.columns is not None:
+                columns = [ c for c in columns if c in self.columns ]
+            # the columns of the reader's own query are needed for the filtering
+            self.columns = sorted(set(columns).union(PlottingTask.get_query_columns(self.filter_query)))
+            logi(f'PlottingReaderFeather::push_down: {self.columns=}')
 
     def read_data(self):
         data_set = DataSet(self.input_files)
+        file_list = data_set.get_file_list()
 
-        data_list = list(map(dask.delayed(functools.partial(read_from_file, sample=self.sample, sample_seed=self.sample_seed, filter_query=self.filter_query))
-                             , data_set.get_file_list()))
+        data_list = list(map(dask.delayed(functools.partial(read_from_file, sample=self.sample, sample_seed=self.sample_seed, filter_query=self.filter_query, columns=self.columns))
+                             , file_list))
         concat_result = dask.delayed(pd.concat)(data_list)
-        convert_columns_result = dask.delayed(RawExtractor.convert_columns_to_category)(concat_result, numerical_columns=self.numerical_columns)
+        if self.columns is not None:
+            numerical_columns = [ c for c in self.numerical_columns if c in self.columns ]
+        else:
+            numerical_columns = self.numerical_columns
+        convert_columns_result = dask.delayed(RawExtractor.convert_columns_to_category)(concat_result, numerical_columns=numerical_columns)
         logd(f'PlottingReaderFeather::read_data: {data_list=}')
         logd(f'PlottingReaderFeather::read_data: {convert_columns_result=}')
         # d = dask.compute(convert_columns_result)
         # logd(f'{d=}')
-        return [(convert_columns_result, DataAttributes())]
+        # the fingerprint identifies the content of the dataset, see `PlottingTask.cache_directory`
+        attributes = DataAttributes(fingerprint=get_files_fingerprint(file_list
+                                                                      , self.numerical_columns
+                                                                      , self.sample, self.sample_seed
+                                                                      , self.filter_query
+                                                                      , self.columns))
+        attributes.add_source_files(file_list)
+        return [(convert_columns_result, attributes)]
 
 
 class PlottingTask(YAMLObject):
@@ -102,9 +222,10 @@ class PlottingTask(YAMLObject):
     dataset_name: str
         the dataset to operate on
 
-    output_file: str
+    output_file: Union[str, List[str]]
         the file path the generated plot is saved to, with the suffix choosing
-        the output format
+        the output format, or a list of such file paths. The figure is laid out
+        once and saved to every path, e.g. as PNG preview and as PDF.
 
     plot_type: str
         the kind of plot to generate, either one of:
@@ -169,6 +290,11 @@ class PlottingTask(YAMLObject):
     bin_size: float
         the size of the position bin used in heatmaps
 
+    bin_reduction: str
+        the reduction applied to the values in a position bin of a heatmap,
+        either one of `count`, `sum`, `mean`, `min`, `max` or the name of any
+        other reduction accepted by `pandas.core.groupby.SeriesGroupBy.aggregate`
+
     title_template: str
         the template string to use to label one plot in a grid, for syntax see
         [seaborn.FacetGrid](https://seaborn.pydata.org/generated/seaborn.FacetGrid.set_titles.html#seaborn.FacetGrid.set_titles)
@@ -205,11 +331,87 @@ class PlottingTask(YAMLObject):
 
     colormap: Optional[str]
         the colormap to use for heatmaps
+
+    sketch: bool
+        whether the input data consists of quantile sketches, as produced by
+        `transforms.SketchTransform`, instead of raw samples. Only the plot
+        types `ecdf`, `box` and `violin` can be drawn from sketches.
+
+    preaggregate: bool
+        whether to calculate the statistics for the error bars and boxes with a
+        vectorized groupby and draw the summary directly, instead of passing
+        all rows to seaborn. Supported for the plot types `lineplot`, `bar`,
+        `point` and `box`. Line plots show the standard deviation, bar and point
+        plots the confidence interval of the mean.
+
+    confidence_level: float
+        the confidence level of the intervals drawn with `preaggregate`
+
+    bootstrap_samples: Optional[int]
+        if None, the confidence intervals drawn with `preaggregate` are
+        calculated from the t-distribution, otherwise they are estimated with
+        the given number of bootstrap iterations
+
+    bootstrap_seed: int
+        the seed to use for the bootstrapping RNG
+
+    density: bool
+        whether to draw `lineplot` and `scatterplot` (and the plots in `ys`) as
+        an image of the density of the points, aggregated per facet and hue
+        into a pixel grid, instead of drawing every point. The time to render
+        depends on the size of the image, not on the number of rows. Line plots
+        are drawn as the density of their vertices.
+
+    density_resolution: List[int]
+        the number of pixels of the density image of a facet on the x-axis and on the y-axis
+
+    rasterized: bool
+        whether to rasterize the artists of line and scatter plots in vector
+        output formats, such as PDF and SVG
+
+    max_points_per_category: Optional[int]
+        if not None, the maximum number of points drawn for every combination
+        of the categorical axis, `hue`, `row` and `column` in `stripplot` and
+        `swarm` plots. Larger partitions are downsampled uniformly at random,
+        always keeping the minimum and the maximum of the numeric axis, `y`,
+        or `x` for horizontal plots with a categorical `y`.
+
+    downsample_seed: int
+        the seed to use for the downsampling RNG
+
+    raster_dpi: Optional[float]
+        the resolution of the output files in raster formats, such as PNG. If
+        None, the resolution given by the `savefig.dpi` rc parameter is used.
+        Vector formats are not affected.
+
+    facet_parallel: bool
+        whether to render the facets given by `row` and `column` in parallel,
+        each in a separate task on the cluster, and composite them into the
+        grid as images. The axis limits and the levels of `hue` are shared by
+        all facets. Supported for the plot types `lineplot`, `scatterplot`,
+        `ecdf`, `box`, `boxen`, `stripplot`, `swarm`, `bar`, `point` and `violin`.
+
+    facet_resolution: List[int]
+        the size in pixels of the image of a facet rendered with `facet_parallel`
+
+    cache_directory: Optional[str]
+        if not None, the directory for caching the selected data and the
+        fingerprints of the rendered plots. The fingerprint of the input data
+        (the files, their sizes and modification times and the reader
+        parameters) together with the fields in `data_fields` identifies the
+        selected data, which is then read from the cache instead of the input
+        files. If the fingerprint of all other (cosmetic) fields is unchanged
+        as well and the output file exists, the task is skipped. Only datasets
+        read directly by a `PlottingReaderFeather` have a fingerprint.
     """
     yaml_tag = u'!PlottingTask'
 
+    # the fields of the task that determine the selected data, all other fields
+    # only determine how the selected data is drawn
+    data_fields = ['dataset_name', 'selector']
+
     def __init__(self, dataset_name:str
-                 , output_file:str
+                 , output_file:Union[str, List[str]]
                  , plot_type:Optional[str] = None
                  , x:Optional[str] = None
                  , y:Optional[str] = None
@@ -248,11 +450,27 @@ class PlottingTask(YAMLObject):
                  , yticks_minor:List[float] = None
                  , colormap:Optional[str] = None
                  , grid_transform:Optional[Callable] = None
+                 , sketch:bool = False
+                 , preaggregate:bool = False
+                 , confidence_level:float = 0.95
+                 , bootstrap_samples:Optional[int] = None
+                 , bootstrap_seed:int = 23
+                 , bin_reduction:str = 'mean'
+                 , density:bool = False
+                 , density_resolution:List[int] = [400, 300]
+                 , rasterized:bool = False
+                 , max_points_per_category:Optional[int] = None
+                 , downsample_seed:int = 23
+                 , cache_directory:Optional[str] = None
+                 , facet_parallel:bool = False
+                 , facet_resolution:List[int] = [600, 600]
+                 , raster_dpi:Optional[float] = None
                  ):
         self.dataset_name = dataset_name
 
-        check_file_access_permissions(output_file)
         self.output_file = output_file
+        for path in self.get_output_files():
+            check_file_access_permissions(path)
 
         if plot_types:
             self.plot_type = plot_types[0]
@@ -272,14 +490,14 @@ class PlottingTask(YAMLObject):
             self.ys = ys
         else:
             # check if the plot type only needs the x-axis specified
-            for plot_type in [ 'ecdf', 'histogram' ]:
+            for plot_type in [ 'ecdf', 'histogram', 'count' ]:
                 if (self.plot_type == plot_type):
                     break
                 elif (self.plot_types and (plot_type in self.plot_types)):
                     # TODO: should check if all plot types don't need the y-axis
                     break
-                else:
-                    raise Exception('Either the "y" or "ys" parameter need to be given')
+            else:
+                raise Exception('Either the "y" or "ys" parameter need to be given')
             self.y = None
             self.ys = None
 
@@ -332,6 +550,31 @@ class PlottingTask(YAMLObject):
 
         self.grid_transform = grid_transform
 
+        self.sketch = sketch
+
+        self.preaggregate = preaggregate
+        self.confidence_level = confidence_level
+        self.bootstrap_samples = bootstrap_samples
+        self.bootstrap_seed = bootstrap_seed
+
+        self.bin_reduction = bin_reduction
+
+        self.density = density
+        self.density_resolution = density_resolution
+        self.rasterized = rasterized
+
+        self.max_points_per_category = max_points_per_category
+        self.downsample_seed = downsample_seed
+
+        self.facet_parallel = facet_parallel
+        self.facet_resolution = facet_resolution
+
+        self.raster_dpi = raster_dpi
+
+        self.cache_directory = cache_directory
+        if self.cache_directory:
+            check_directory_access_permissions(self.cache_directory)
+
         self.set_backend(matplotlib_backend)
         self.set_theme(context, axes_style)
 
@@ -489,43 +732,195 @@ class PlottingTask(YAMLObject):
 
         return data
 
+    @staticmethod
+    def get_query_columns(query:Optional[str]) -> Set[str]:
+        r"""
+        Return the names that might refer to columns in the given query
+        expression, i.e. all identifiers and backtick quoted names outside of
+        string literals, except references to variables prefixed with `@`.
+        The result may contain names that are not columns.
+        """
+        if not query:
+            return set()
+        # remove the string literals
+        query = re.sub(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", ' ', query)
+        columns = set(re.findall(r'`([^`]+)`', query))
+        query = re.sub(r'`[^`]+`', ' ', query)
+        columns.update([ name for name in re.findall(r'(?<![@\w.])([A-Za-z_]\w*)', query) if not keyword.iskeyword(name) ])
+        return columns
+
+    def get_referenced_columns(self) -> Optional[Set[str]]:
+        r"""
+        Return the names of all columns this task might use, or None if they
+        can't be determined, e.g. because a `grid_transform` is used.
+        """
+        if self.grid_transform:
+            return None
+
+        columns = set([ c for c in [self.x, self.y, self.hue, self.style, self.size, self.row, self.column] if c ])
+        columns.update(self.ys or [])
+        columns.update(self.get_query_columns(self.selector) if type(self.selector) == str else [])
+        # other column names might be passed on to seaborn, e.g. `units` or `weights`
+        columns.update([ v for v in (self.plot_kwargs or {}).values() if type(v) == str ])
+        if self.sketch:
+            columns.update(quantile_sketch.SKETCH_COLUMNS)
+        if self.plot_type == 'heat':
+            # the value column of the heat map
+            columns.add('cbr')
+        return columns
+
+    def get_data_fingerprint(self, data) -> Optional[str]:
+        r"""
+        Return the fingerprint of the selected data, calculated from the
+        fingerprints of the input data and the fields in `data_fields`, or None
+        if not all parts of the input data have a fingerprint.
+        """
+        fingerprints = [ getattr(attributes, 'fingerprint', None) for _, attributes in data ]
+        if len(fingerprints) == 0 or None in fingerprints:
+            return None
+
+        h = hashlib.sha1()
+        for fingerprint in fingerprints:
+            h.update(fingerprint.encode('utf-8'))
+        for field in self.data_fields:
+            h.update(f'{field}={getattr(self, field)!r}\n'.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_render_fingerprint(self, data_fingerprint:str) -> str:
+        r"""
+        Return the fingerprint of the rendered plot, calculated from the
+        fingerprint of the selected data and all other (cosmetic) fields.
+        """
+        h = hashlib.sha1(data_fingerprint.encode('utf-8'))
+        for field in sorted(self.__dict__):
+            if field in self.data_fields or field == 'data_repo':
+                continue
+            value = getattr(self, field)
+            if isinstance(value, mpl.colors.Colormap):
+                # the default colormap is an object without a stable `repr`
+                value = value.name
+            h.update(f'{field}={value!r}\n'.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_cache_paths(self, data_fingerprint:str):
+        r"""
+        Return the path of the cached selected data and the path of the file
+        with the fingerprint of the plot rendered to `output_file`
+        """
+        output_hash = hashlib.sha1(str(self.output_file).encode('utf-8')).hexdigest()
+        return (f'{self.cache_directory}/{data_fingerprint}.feather'
+                , f'{self.cache_directory}/{output_hash}.fingerprint')
+
+    def is_up_to_date(self, data_fingerprint:str, render_fingerprint:str) -> bool:
+        _, fingerprint_path = self.get_cache_paths(data_fingerprint)
+        if not (all(map(os.path.exists, self.get_output_files())) and os.path.exists(fingerprint_path)):
+            return False
+        with open(fingerprint_path, 'r') as fingerprint_file:
+            return fingerprint_file.read().strip() == render_fingerprint
+
+    def write_cache_file(self, path:str, write):
+        # write to a temporary file first, so that a cancelled task never
+        # leaves a partial file behind
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            write(temporary_path)
+            os.replace(temporary_path, path)
+        except Exception as e:
+            logw(f'PlottingTask: could not write the cache file "{path}": {e}')
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+
     def prepare(self):
         data = self.get_data(self.dataset_name)
-        # concatenate everything first
-        cdata = dask.delayed(pd.concat)(map(operator.itemgetter(0), data))
-        job = dask.delayed(self.plot_data)(cdata)
+
+        data_fingerprint = self.get_data_fingerprint(data) if self.cache_directory else None
+        if data_fingerprint:
+            render_fingerprint = self.get_render_fingerprint(data_fingerprint)
+            if self.is_up_to_date(data_fingerprint, render_fingerprint):
+                logi(f'PlottingTask: "{self.output_file}" is up to date, skipping')
+                return dask.delayed(None)
+
+            data_path, _ = self.get_cache_paths(data_fingerprint)
+            if os.path.exists(data_path):
+                # only the drawing has changed, the input files are not read at all
+                logi(f'PlottingTask: drawing "{self.output_file}" from the cached data in "{data_path}"')
+                cached_data = dask.delayed(pd.read_feather)(data_path)
+                return dask.delayed(self.plot_data)(cached_data, data_fingerprint, render_fingerprint, cached=True)
+        else:
+            if self.cache_directory:
+                logi(f'PlottingTask: no fingerprint for the dataset "{self.dataset_name}", not caching "{self.output_file}"')
+            render_fingerprint = None
+
+        # Concatenate everything first. The concatenation is a pure function
+        # of the input jobs, so all tasks plotting the same dataset share the
+        # same key in the task graph: the dataset is materialized only once
+        # and the plotting tasks are scheduled on the worker holding it.
+        cdata = dask.delayed(pd.concat, pure=True)(list(map(operator.itemgetter(0), data)))
+        job = dask.delayed(self.plot_data)(cdata, data_fingerprint, render_fingerprint)
 
         return job
 
+    @staticmethod
+    def select_data(data:pd.DataFrame, selector:Optional[str] = None) -> pd.DataFrame:
+        r"""
+        Select the rows matching `selector` from `data` and move the index into
+        a column, like `data.query(selector).reset_index()`.
+
+        The input `DataFrame` is shared with the other tasks plotting the same
+        dataset, so it is never modified. Only the selected rows are copied and
+        without a selector, the columns of the input are not copied at all.
+        Columns are only ever replaced in the result, never modified in place,
+        so the input is not affected by the plotting code.
+
+        Parameters
+        ----------
+        data: pd.DataFrame
+            the input data
+
+        selector: Optional[str]
+            the query string for selecting the rows, see `pandas.DataFrame.query`
+        """
+        if selector:
+            mask = data.eval(selector)
+            data = data.loc[mask.to_numpy()]
+
+        if isinstance(data.index, pd.MultiIndex):
+            return data.reset_index()
+
+        index_name = data.index.name
+        if index_name is None:
+            index_name = 'index' if not 'index' in data.columns else 'level_0'
+
+        result = data.copy(deep=False)
+        result.index = pd.RangeIndex(len(data))
+        result.insert(0, index_name, data.index.to_numpy())
+
+        return result
+
 
     def set_backend(self, backend:str = 'agg'):
         self.matplotlib_backend = backend
-        mpl.use(self.matplotlib_backend)
-        logi(f'set_backend: using backend "{self.matplotlib_backend}"')
+        # switching the backend closes all figures, so only do so if necessary
+        if mpl.get_backend().lower() != self.matplotlib_backend.lower():
+            mpl.use(self.matplotlib_backend)
+            logi(f'set_backend: using backend "{self.matplotlib_backend}"')
 
     def set_theme(self, context:str = 'paper', axes_style:str = 'dark'):
         self.context = context
         self.axes_style = axes_style
-        if self.matplotlib_rc_dict:
-            sb.set_theme(context=self.context, style=self.axes_style, rc=self.matplotlib_rc_dict)
-        else:
-            sb.set_theme(context=self.context, style=self.axes_style)
+        set_plotting_theme(self.context, self.axes_style, self.matplotlib_rc_dict)
 
     def eval_grid_transform(self):
-        # Create a copy of the global environment for evaluating the extra
-        # code fragment so as to not pollute the global namespace itself.
-        global_env = globals().copy()
-
-        # Compile the code fragment
-        compiled_grid_transform = compile(self.grid_transform, filename='<string>', mode='exec')
-        # Actually evaluate the code within the given namespace to allow
-        # access to all the defined symbols, such as helper functions that are not defined inline.
-        eval(compiled_grid_transform, global_env)
-        grid_transform = eval('grid_transform', global_env)
+        # Compile and evaluate the code fragment in a copy of the global
+        # environment, so as to not pollute the global namespace itself, and
+        # return the function named `grid_transform` defined therein.
+        # The result is cached per worker process.
+        grid_transform = get_code_cache().get_function('grid_transform', self.grid_transform, globals())
 
         return grid_transform
 
-    def plot_data(self, data):
+    @profiled('plot', detail='self.output_file')
+    def plot_data(self, data, data_fingerprint:Optional[str] = None, render_fingerprint:Optional[str] = None, cached:bool = False):
         logd(f'-0---000---<<<<>>>>>    {self.__dict__=}')
         logd(f'-0---000---<<<<>>>>>    {mpl.rcParams["backend"]=}')
 
@@ -547,11 +942,14 @@ class PlottingTask(YAMLObject):
         # logd(f'<<<<>>>>>    {data=}')
         # logd(f'<<<<>>>>>-------------')
 
-        if self.selector:
-            selected_data = data.query(self.selector).reset_index()
-            # logi(f'after selector: {data=}')
+        if cached:
+            # the data has already been selected before it was cached
+            selected_data = data
         else:
-            selected_data = data.reset_index()
+            selected_data = self.select_data(data, self.selector)
+            if data_fingerprint:
+                data_path, _ = self.get_cache_paths(data_fingerprint)
+                self.write_cache_file(data_path, selected_data.to_feather)
 
         def distributionplot(plot_type):
                 return self.plot_distribution(df=selected_data
@@ -589,38 +987,114 @@ class PlottingTask(YAMLObject):
                                         , kwargs=self.plot_kwargs
                                        )
 
+        def sketchplot(plot_type):
+                return self.plot_sketch(df=selected_data
+                                        , plot_type=plot_type
+                                        , x=self.x, y=self.y
+                                        , hue=self.hue
+                                        , row=self.row, column=self.column
+                                        , kwargs=self.plot_kwargs
+                                       )
+
+        def aggregatedplot(plot_type):
+                return self.plot_aggregated(df=selected_data
+                                        , plot_type=plot_type
+                                        , x=self.x, y=self.y
+                                        , hue=self.hue, style=self.style
+                                        , row=self.row, column=self.column
+                                        , kwargs=self.plot_kwargs
+                                       )
+
+        def densityplot(plot_type):
+                return self.plot_density(df=selected_data
+                                        , plot_type=plot_type
+                                        , x=self.x, y=self.y
+                                        , hue=self.hue
+                                        , row=self.row, column=self.column
+                                        , kwargs=self.plot_kwargs
+                                       )
+
+        def facetplot(plot_type):
+                return self.plot_facets_parallel(df=selected_data
+                                        , plot_type=plot_type
+                                        , x=self.x, y=self.y
+                                        , hue=self.hue, style=self.style
+                                        , row=self.row, column=self.column
+                                        , kwargs=self.plot_kwargs
+                                       )
+
         fig = None
-        match self.plot_type:
-            case 'lineplot':
-                fig = relplot('line')
-            case 'ecdf':
-                fig = distributionplot('ecdf')
-            case 'histogram':
-                fig = distributionplot('hist')
-            case 'scatterplot':
-                fig = relplot('scatter')
-            case 'box':
-                fig = catplot('box')
-            case 'boxen':
-                fig = catplot('boxen')
-            case 'stripplot':
-                fig = catplot('strip')
-            case 'swarm':
-                fig = catplot('swarm')
-            case 'bar':
-                fig = catplot('bar')
-            case 'count':
-                fig = catplot('count')
-            case 'point':
-                fig = catplot('point')
-            case 'violin':
-                fig = catplot('violin')
-            case 'heat':
-                fig = heatplot('heat')
-            case _:
-                raise Exception(f'Unknown plot type: "{self.plot_type}"')
-
-        if self.ys:
+        facets_rendered = False
+        if self.sketch:
+            # the data consists of quantile sketches, not of raw samples
+            match self.plot_type:
+                case 'ecdf':
+                    fig = sketchplot('ecdf')
+                case 'box':
+                    fig = sketchplot('box')
+                case 'violin':
+                    fig = sketchplot('violin')
+                case _:
+                    raise Exception(f'Plot type "{self.plot_type}" can not be drawn from sketches')
+        elif self.preaggregate:
+            # the statistics are calculated for all groups at once and only the
+            # summary is drawn
+            match self.plot_type:
+                case 'lineplot':
+                    fig = aggregatedplot('line')
+                case 'bar':
+                    fig = aggregatedplot('bar')
+                case 'point':
+                    fig = aggregatedplot('point')
+                case 'box':
+                    fig = aggregatedplot('box')
+                case _:
+                    raise Exception(f'Plot type "{self.plot_type}" can not be drawn from pre-aggregated data')
+        elif self.density:
+            # the points are aggregated into an image
+            match self.plot_type:
+                case 'lineplot':
+                    fig = densityplot('line')
+                case 'scatterplot':
+                    fig = densityplot('scatter')
+                case _:
+                    raise Exception(f'Plot type "{self.plot_type}" can not be drawn as density')
+        elif self.facet_parallel and (self.row or self.column) and self.plot_type in self.facet_plot_functions:
+            # the facets are rendered in parallel, including the plots in `ys`
+            fig = facetplot(self.plot_type)
+            facets_rendered = True
+        else:
+            match self.plot_type:
+                case 'lineplot':
+                    fig = relplot('line')
+                case 'ecdf':
+                    fig = distributionplot('ecdf')
+                case 'histogram':
+                    fig = distributionplot('hist')
+                case 'scatterplot':
+                    fig = relplot('scatter')
+                case 'box':
+                    fig = catplot('box')
+                case 'boxen':
+                    fig = catplot('boxen')
+                case 'stripplot':
+                    fig = catplot('strip')
+                case 'swarm':
+                    fig = catplot('swarm')
+                case 'bar':
+                    fig = catplot('bar')
+                case 'count':
+                    fig = catplot('count')
+                case 'point':
+                    fig = catplot('point')
+                case 'violin':
+                    fig = catplot('violin')
+                case 'heat':
+                    fig = heatplot('heat')
+                case _:
+                    raise Exception(f'Unknown plot type: "{self.plot_type}"')
+
+        if self.ys and not facets_rendered:
             self.plot_multiplot(fig, selected_data)
 
         if hasattr(fig, 'tight_layout'):
@@ -638,15 +1112,41 @@ class PlottingTask(YAMLObject):
         logd(f'mpl.rcParams:')
         logd(pprint.pp(mpl.rcParams))
 
-        if hasattr(fig, 'savefig'):
-            fig.savefig(self.output_file, bbox_inches=self.bbox_inches)
-            logi(f'{fig=} saved to {self.output_file}')
-        else:
-            mpl.pyplot.savefig(self.output_file)
-            logi(f'{fig=} saved to {self.output_file}')
+        self.save_figure(fig)
+
+        if render_fingerprint:
+            _, fingerprint_path = self.get_cache_paths(data_fingerprint)
+            def write_fingerprint(path):
+                with open(path, 'w') as fingerprint_file:
+                    fingerprint_file.write(render_fingerprint)
+            self.write_cache_file(fingerprint_path, write_fingerprint)
 
         return fig
 
+    # the output formats that are not affected by `raster_dpi`
+    vector_formats = ['pdf', 'svg', 'svgz', 'eps', 'ps', 'pgf']
+
+    def get_output_files(self) -> List[str]:
+        if isinstance(self.output_file, str):
+            return [self.output_file]
+        return list(self.output_file)
+
+    def save_figure(self, fig):
+        r"""
+        Save the laid out figure to every path in `output_file`
+        """
+        for path in self.get_output_files():
+            extension = os.path.splitext(path)[1].lstrip('.').lower()
+            kwargs = {}
+            if self.raster_dpi and not extension in self.vector_formats:
+                kwargs['dpi'] = self.raster_dpi
+
+            if hasattr(fig, 'savefig'):
+                fig.savefig(path, bbox_inches=self.bbox_inches, **kwargs)
+            else:
+                mpl.pyplot.savefig(path, **kwargs)
+            logi(f'{fig=} saved to {path}')
+
     def plot_multiplot(self, figure, selected_data):
         legend_handles = []
 
@@ -660,12 +1160,23 @@ class PlottingTask(YAMLObject):
 
             for v, pt in zip(self.ys, self.plot_types):
                 logi(f'trying to plot "{v}" as {pt}')
+                if self.density:
+                    # one density image per hue, with the extent shared by all facets
+                    for k, d in data.dropna(subset=[v]).groupby(by=[self.hue]):
+                        if d.empty:
+                            continue
+                        color = palette[hue_levels.index(k[0]) % len(palette)]
+                        self.draw_density(ax, d[x], d[v], color, extents[v])
+                        key_string = str(k).strip("(),'")
+                        legend_handles.append(mpl.patches.Patch(color=color, label=f'{v},{key_string}'))
+                    continue
+
                 match pt:
                     case 'lineplot':
                         for k, d in data.dropna(subset=[v]).groupby(by=[self.hue]):
                             if d.empty:
                                 continue
-                            r = mpl.pyplot.plot(d[x], d[v])[0]
+                            r = mpl.pyplot.plot(d[x], d[v], rasterized=self.rasterized)[0]
                             key_string = str(k).strip("(),'")
                             r.set_label(f'{v},{key_string}')
                             legend_handles.append(r)
@@ -673,7 +1184,7 @@ class PlottingTask(YAMLObject):
                         for k, d in data.dropna(subset=[v]).groupby(by=[self.hue]):
                             if d.empty:
                                 continue
-                            r = mpl.pyplot.scatter(d[x], d[v], alpha=self.alpha, s=8)
+                            r = mpl.pyplot.scatter(d[x], d[v], alpha=self.alpha, s=8, rasterized=self.rasterized)
                             key_string = str(k).strip("(),'")
                             r.set_label(f'{v},{key_string}')
                             legend_handles.append(r)
@@ -685,6 +1196,11 @@ class PlottingTask(YAMLObject):
         else:
             raise Exception('multipass drawing is only implemented for grids')
 
+        if self.density:
+            palette = sb.color_palette('Pastel1')
+            hue_levels = self.get_levels(selected_data, self.hue)
+            extents = { v: self.get_density_extent(selected_data, self.x, v) for v in self.ys }
+
         with sb.color_palette('Pastel1'):
             g.map_dataframe(multiplot, self.x, self.y)
 
@@ -820,6 +1336,11 @@ class PlottingTask(YAMLObject):
         match plot_type:
             case 'line':
                 kwargs['errorbar'] = 'sd'
+                if self.rasterized:
+                    kwargs['rasterized'] = True
+            case 'scatter':
+                if self.rasterized:
+                    kwargs['rasterized'] = True
             case 'box':
                 kwargs['boxprops'] = boxprops
                 kwargs['medianprops'] = medianprops
@@ -850,9 +1371,88 @@ class PlottingTask(YAMLObject):
 
         return grid
 
+    @staticmethod
+    def downsample_categories(df:pd.DataFrame, value_column:str, grouping_columns:List[str]
+                              , max_points:int, seed:int = 23) -> pd.DataFrame:
+        r"""
+        Select at most `max_points` rows of every partition of `df` sharing the
+        same values in `grouping_columns`, uniformly at random, while always
+        keeping the rows with the minimum and the maximum of `value_column`, if
+        it is numeric.
+
+        Every row is assigned a random priority, the extremes the highest
+        priority, and the rows with the highest priorities of every partition
+        are selected. This is equivalent to reservoir sampling every
+        partition, but done in one vectorized pass over all rows. The order
+        of the selected rows is preserved.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            the input data
+
+        value_column: Optional[str]
+            the column whose minimum and maximum are kept
+
+        grouping_columns: List[str]
+            the columns defining the partitions
+
+        max_points: int
+            the maximum number of rows per partition
+
+        seed: int
+            the seed to use for the RNG
+        """
+        n = len(df)
+        if n <= max_points:
+            return df
+
+        if grouping_columns:
+            # rows with a missing key get the group id -1 and are treated as a group of their own
+            group_ids = df.groupby(by=grouping_columns, sort=False, observed=True).ngroup().to_numpy() + 1
+        else:
+            group_ids = np.zeros(n, dtype=np.int64)
+
+        rng = np.random.default_rng(seed)
+        priority = rng.random(n)
+
+        # the first row of every group, in the order of the group ids
+        def first_of_groups(order):
+            sorted_ids = group_ids[order]
+            is_first = np.concatenate([[True], sorted_ids[1:] != sorted_ids[:-1]])
+            return order[is_first]
+
+        if value_column is not None and pd.api.types.is_numeric_dtype(df[value_column]):
+            values = df[value_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            # the minimum and the maximum of every group come first, missing values last
+            priority[np.isnan(values)] = 2.
+            priority[first_of_groups(np.lexsort((np.where(np.isnan(values), np.inf, values), group_ids)))] = -1.
+            priority[first_of_groups(np.lexsort((np.where(np.isnan(values), np.inf, -values), group_ids)))] = -1.
+
+        order = np.lexsort((priority, group_ids))
+        sorted_ids = group_ids[order]
+        group_starts = np.searchsorted(sorted_ids, sorted_ids, side='left')
+        rank = np.arange(0, n) - group_starts
+
+        selected = np.sort(order[rank < max_points])
+
+        return df.iloc[selected]
+
     def plot_catplot(self, df, x='v2x_rate', y='cbr', hue='moduleName', row='dcc', column='traciStart', plot_type='box', **kwargs):
         kwargs = self.set_plot_specific_options(plot_type, **kwargs)
 
+        if plot_type in ['strip', 'swarm'] and self.max_points_per_category:
+            # the layout of swarm plots is super-linear in the number of points
+            n_rows = len(df)
+            # horizontal plots have the categories on `y` and the values on `x`
+            if y is not None and not pd.api.types.is_numeric_dtype(df[y]):
+                value_column, category_column = x, y
+            else:
+                value_column, category_column = y, x
+            df = self.downsample_categories(df, value_column, [ c for c in [category_column, hue, row, column] if c ]
+                                            , self.max_points_per_category, seed=self.downsample_seed)
+            logi(f'PlottingTask::plot_catplot: downsampled from {n_rows} to {len(df)} rows')
+
         logd(f'PlottingTask::plot_catplot: {df.columns=}')
         grid = sb.catplot(data=df, x=x, y=y, row=row, col=column
                         , hue=hue
@@ -885,6 +1485,492 @@ class PlottingTask(YAMLObject):
         return grid
 
 
+    @staticmethod
+    def get_levels(df:pd.DataFrame, column_name:Optional[str]) -> list:
+        r"""
+        Return the distinct values in the given column, in the order of the
+        categories for categorical columns, sorted otherwise. If `column_name`
+        is None, a single level `None` is returned.
+        """
+        if column_name is None:
+            return [None]
+        if isinstance(df[column_name].dtype, pd.CategoricalDtype):
+            return [ l for l in df[column_name].cat.categories if (df[column_name] == l).any() ]
+        return sorted(df[column_name].dropna().unique())
+
+    @staticmethod
+    def get_dodged_position(x_levels:list, hue_levels:list, x_value, hue_value) -> float:
+        r"""
+        Return the position on the x-axis for the artist of the given category
+        and hue level, with the hue levels of a category side by side, like
+        seaborn's categorical plots.
+        """
+        width = 0.8 / len(hue_levels)
+        return x_levels.index(x_value) - 0.4 + width * (hue_levels.index(hue_value) + 0.5)
+
+    def plot_sketch(self, df, x=None, y='value', hue='moduleName', row=None, column=None, plot_type='box', **kwargs):
+        r"""
+        Draw an ECDF, box or violin plot from the quantile sketches in `df`, as
+        produced by a `SketchTransform`, instead of from the raw samples.
+        For ECDFs, the sketches are in the column `x`, for box and violin
+        plots in the column `y`.
+        """
+        kwargs = self.set_plot_specific_options(plot_type, **kwargs)
+
+        value_column = x if plot_type == 'ecdf' else y
+
+        # the sketch columns might have been exported as categories
+        df = df.copy(deep=False)
+        for c in [value_column] + quantile_sketch.SKETCH_COLUMNS:
+            df[c] = df[c].astype(float)
+
+        logd(f'PlottingTask::plot_sketch: {df.columns=}')
+        logd(f'PlottingTask::plot_sketch: {plot_type=}')
+
+        if plot_type == 'ecdf':
+            def ecdf(*args, **kws):
+                data = kws.pop('data')
+                xs, qs = quantile_sketch.get_knots(data, value_column)
+                mpl.pyplot.gca().plot(xs, qs, color=kws.get('color'), label=kws.get('label'))
+
+            grid = sb.FacetGrid(df, row=row, col=column, hue=hue)
+            grid.map_dataframe(ecdf)
+            if hue:
+                grid.add_legend()
+
+            grid = self.set_grid_defaults(grid)
+
+            return grid
+
+        x_levels = self.get_levels(df, x)
+        hue_levels = self.get_levels(df, hue)
+        palette = sb.color_palette(n_colors=len(hue_levels))
+        width = 0.8 / len(hue_levels)
+
+        def position(x_value, hue_value):
+            return self.get_dodged_position(x_levels, hue_levels, x_value, hue_value)
+
+        def sketchplot(*args, **kws):
+            data = kws.pop('data')
+            ax = mpl.pyplot.gca()
+
+            keys = [ c for c in [x, hue] if c ]
+            cells = data.groupby(by=keys, observed=True) if keys else [((None,), data)]
+
+            stats = []
+            positions = []
+            colors = []
+            for key, cell in cells:
+                key = key if isinstance(key, tuple) else (key,)
+                x_value = key[0] if x else None
+                hue_value = key[-1] if hue else None
+
+                q1, median, q3 = quantile_sketch.quantiles(cell, value_column, [0.25, 0.5, 0.75])
+                vmin = cell[quantile_sketch.SKETCH_MIN].min()
+                vmax = cell[quantile_sketch.SKETCH_MAX].max()
+                iqr = q3 - q1
+                weights = cell[quantile_sketch.SKETCH_WEIGHT]
+                mean = (cell[value_column] * weights).sum() / weights.sum()
+
+                if plot_type == 'box':
+                    stats.append({ 'med': median, 'q1': q1, 'q3': q3, 'mean': mean
+                                 , 'whislo': max(vmin, q1 - 1.5 * iqr)
+                                 , 'whishi': min(vmax, q3 + 1.5 * iqr)
+                                 , 'fliers': []
+                                 })
+                else:
+                    coords = np.linspace(vmin, vmax, 100)
+                    stats.append({ 'coords': coords, 'vals': quantile_sketch.density(cell, value_column, coords)
+                                 , 'mean': mean, 'median': median, 'min': vmin, 'max': vmax
+                                 })
+                positions.append(position(x_value, hue_value))
+                colors.append(palette[hue_levels.index(hue_value)])
+
+            if plot_type == 'box':
+                artists = ax.bxp(stats, positions=positions, widths=width * 0.9
+                                 , patch_artist=True, showfliers=False, manage_ticks=False
+                                 , boxprops=kwargs.get('boxprops'), medianprops=kwargs.get('medianprops')
+                                 , whiskerprops=kwargs.get('whiskerprops'), capprops=kwargs.get('capprops')
+                                 )
+                for patch, color in zip(artists['boxes'], colors):
+                    patch.set_facecolor(color)
+            else:
+                artists = ax.violin(stats, positions=positions, widths=width * 0.9, showmedians=True)
+                for body, color in zip(artists['bodies'], colors):
+                    body.set_facecolor(color)
+
+            ax.set_xticks(range(0, len(x_levels)))
+            ax.set_xticklabels([ '' if l is None else str(l) for l in x_levels ])
+
+        grid = sb.FacetGrid(df, row=row, col=column)
+        grid.map_dataframe(sketchplot)
+
+        if hue:
+            grid.add_legend(legend_data={ str(l): mpl.patches.Patch(color=c) for l, c in zip(hue_levels, palette) }
+                            , title=hue)
+
+        grid = self.set_grid_defaults(grid)
+
+        return grid
+
+
+    def plot_aggregated(self, df, x='v2x_rate', y='cbr', hue='moduleName', style=None, row=None, column=None, plot_type='line', **kwargs):
+        r"""
+        Calculate the statistics of `y` for every combination of `x`, `hue`,
+        `style`, `row` and `column` with a vectorized groupby and draw the
+        summary with matplotlib, instead of passing all rows to seaborn.
+        Line plots show the mean and the standard deviation, bar and point
+        plots the mean and its confidence interval, and box plots the quartiles
+        and whiskers (without outliers).
+        """
+        kwargs = self.set_plot_specific_options(plot_type, **kwargs)
+
+        if plot_type != 'line':
+            # the categorical plot types don't distinguish styles
+            style = None
+
+        keys = [ c for c in [row, column, hue, style, x] if c ]
+        summary = summary_statistics.summarize(df, y, keys
+                                               , confidence_level=self.confidence_level
+                                               , bootstrap_samples=self.bootstrap_samples
+                                               , seed=self.bootstrap_seed)
+        logd(f'PlottingTask::plot_aggregated: {plot_type=}  {len(df)=}  {len(summary)=}')
+
+        hue_levels = self.get_levels(summary, hue)
+        palette = sb.color_palette(n_colors=len(hue_levels))
+        legend_data = { str(l): mpl.lines.Line2D([], [], color=c) for l, c in zip(hue_levels, palette) } if hue else {}
+
+        if plot_type == 'line':
+            style_levels = self.get_levels(summary, style)
+            linestyles = ['-', '--', ':', '-.']
+            if style:
+                legend_data.update({ str(l): mpl.lines.Line2D([], [], color='.26', linestyle=linestyles[i % len(linestyles)])
+                                     for i, l in enumerate(style_levels) })
+
+            def lineplot(*args, **kws):
+                data = kws.pop('data')
+                ax = mpl.pyplot.gca()
+                line_keys = [ c for c in [hue, style] if c ]
+                lines = data.groupby(by=line_keys, observed=True) if line_keys else [((None,), data)]
+                for key, line in lines:
+                    key = key if isinstance(key, tuple) else (key,)
+                    color = palette[hue_levels.index(key[0])] if hue else palette[0]
+                    linestyle = linestyles[style_levels.index(key[-1]) % len(linestyles)] if style else '-'
+                    line = line.sort_values(by=x)
+                    ax.plot(line[x], line['mean'], color=color, linestyle=linestyle, alpha=self.alpha)
+                    ax.fill_between(line[x], line['mean'] - line['sd'], line['mean'] + line['sd']
+                                    , color=color, alpha=0.2, linewidth=0)
+
+            grid = sb.FacetGrid(summary, row=row, col=column)
+            grid.map_dataframe(lineplot)
+        else:
+            x_levels = self.get_levels(summary, x)
+            width = 0.8 / len(hue_levels)
+
+            def catplot(*args, **kws):
+                data = kws.pop('data')
+                ax = mpl.pyplot.gca()
+                x_values = data[x] if x else [None] * len(data)
+                hue_values = data[hue] if hue else [None] * len(data)
+                colors = [ palette[hue_levels.index(h)] for h in hue_values ]
+                means = data['mean'].to_numpy()
+                yerr = [means - data['ci_low'].to_numpy(), data['ci_high'].to_numpy() - means]
+
+                if plot_type == 'point':
+                    # the points of a hue level are connected, without dodging
+                    for h in hue_levels:
+                        selected = np.array([ v == h for v in hue_values ]) if hue else np.full(len(data), True)
+                        positions = [ x_levels.index(v) for v, s in zip(x_values, selected) if s ]
+                        order = np.argsort(positions)
+                        ax.errorbar(np.array(positions)[order], means[selected][order]
+                                    , yerr=[e[selected][order] for e in yerr]
+                                    , color=palette[hue_levels.index(h)], marker='o')
+                else:
+                    positions = [ self.get_dodged_position(x_levels, hue_levels, v, h) for v, h in zip(x_values, hue_values) ]
+                    if plot_type == 'bar':
+                        ax.bar(positions, means, width=width, color=colors)
+                        ax.errorbar(positions, means, yerr=yerr, fmt='none', ecolor='.26')
+                    else:
+                        stats = [ { 'med': r.median, 'q1': r.q1, 'q3': r.q3, 'mean': r.mean
+                                  , 'whislo': r.whislo, 'whishi': r.whishi, 'fliers': [] }
+                                  for r in data.itertuples() ]
+                        artists = ax.bxp(stats, positions=positions, widths=width * 0.9
+                                         , patch_artist=True, showfliers=False, manage_ticks=False
+                                         , boxprops=kwargs.get('boxprops'), medianprops=kwargs.get('medianprops')
+                                         , whiskerprops=kwargs.get('whiskerprops'), capprops=kwargs.get('capprops')
+                                         )
+                        for patch, color in zip(artists['boxes'], colors):
+                            patch.set_facecolor(color)
+
+                ax.set_xticks(range(0, len(x_levels)))
+                ax.set_xticklabels([ '' if l is None else str(l) for l in x_levels ])
+
+            grid = sb.FacetGrid(summary, row=row, col=column)
+            grid.map_dataframe(catplot)
+
+        if legend_data:
+            grid.add_legend(legend_data=legend_data, title=hue)
+
+        grid = self.set_grid_defaults(grid)
+
+        return grid
+
+
+    # the seaborn axes-level function and the name of the plot specific
+    # options for every plot type that can be rendered facet by facet
+    facet_plot_functions = { 'lineplot': ('lineplot', 'line')
+                           , 'scatterplot': ('scatterplot', 'scatter')
+                           , 'ecdf': ('ecdfplot', 'ecdf')
+                           , 'box': ('boxplot', 'box')
+                           , 'boxen': ('boxenplot', 'boxen')
+                           , 'stripplot': ('stripplot', 'strip')
+                           , 'swarm': ('swarmplot', 'swarm')
+                           , 'bar': ('barplot', 'bar')
+                           , 'point': ('pointplot', 'point')
+                           , 'violin': ('violinplot', 'violin')
+                           }
+
+    @staticmethod
+    def render_facet(data:pd.DataFrame, plot_function:str, x:str, y:Optional[str], hue:Optional[str], style:Optional[str]
+                     , hue_levels:list, x_levels:Optional[list], xlim:tuple, ylim:tuple
+                     , extra_plots:list, resolution:List[int], theme:dict, kwargs:dict) -> np.ndarray:
+        r"""
+        Draw the data of one facet with the given seaborn axes-level function
+        into an image covering exactly the area given by `xlim` and `ylim`,
+        without any decorations. This runs in a separate worker process, so
+        everything needed is passed as parameter.
+
+        Parameters
+        ----------
+        data: pd.DataFrame
+            the data of the facet
+
+        plot_function: str
+            the name of the seaborn axes-level function
+
+        x: str
+            the column to plot on the x-axis
+
+        y: Optional[str]
+            the column to plot on the y-axis
+
+        hue: Optional[str]
+            the column to map onto the color
+
+        style: Optional[str]
+            the column to map onto the line or marker style, for relational plots
+
+        hue_levels: list
+            the levels of `hue` over all facets
+
+        x_levels: Optional[list]
+            the categories on the x-axis over all facets, for categorical plots
+
+        xlim: tuple
+            the limits of the x-axis, shared by all facets
+
+        ylim: tuple
+            the limits of the y-axis, shared by all facets
+
+        extra_plots: list
+            the additional (column, plot type) pairs to draw onto the facet, see `ys`
+
+        resolution: List[int]
+            the size of the image in pixels
+
+        theme: dict
+            the parameters for `seaborn.set_theme`
+
+        kwargs: dict
+            the additional parameters for the seaborn function
+        """
+        set_plotting_theme(**theme)
+
+        figure = mpl.figure.Figure(figsize=(resolution[0] / 100, resolution[1] / 100), dpi=100)
+        canvas = mpl.backends.backend_agg.FigureCanvasAgg(figure)
+        ax = figure.add_axes((0, 0, 1, 1))
+        ax.set_axis_off()
+
+        palette = sb.color_palette(n_colors=len(hue_levels))
+        colors = { 'hue': hue, 'hue_order': hue_levels, 'palette': palette } if hue else { 'color': palette[0] }
+        if x_levels is not None:
+            kwargs = dict(kwargs, order=x_levels)
+        if plot_function in ['lineplot', 'scatterplot'] and style:
+            kwargs = dict(kwargs, style=style)
+
+        getattr(sb, plot_function)(data=data, x=x, y=y, ax=ax, legend=False, **colors, **kwargs)
+
+        # the additional plots of `ys`, drawn like in `plot_multiplot`
+        extra_palette = sb.color_palette('Pastel1')
+        for v, pt in extra_plots:
+            groups = data.dropna(subset=[v]).groupby(by=hue, observed=True) if hue else [(None, data.dropna(subset=[v]))]
+            for key, d in groups:
+                color = extra_palette[hue_levels.index(key) % len(extra_palette)]
+                if pt == 'lineplot':
+                    ax.plot(d[x], d[v], color=color)
+                else:
+                    ax.scatter(d[x], d[v], color=color, s=8)
+
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+        ax.set_axis_off()
+
+        canvas.draw()
+        return np.asarray(canvas.buffer_rgba()).copy()
+
+    @staticmethod
+    def map_facets(function:Callable, arguments:List[dict]) -> list:
+        r"""
+        Call `function` for every set of keyword arguments in `arguments`, as
+        separate tasks on the cluster when running on a dask worker, serially
+        otherwise.
+        """
+        try:
+            with dask.distributed.worker_client() as client:
+                futures = [ client.submit(function, pure=False, **a) for a in arguments ]
+                return client.gather(futures)
+        except ValueError:
+            # not running within a dask worker
+            return [ function(**a) for a in arguments ]
+
+    @staticmethod
+    def get_limits(df:pd.DataFrame, columns:List[str], include_zero:bool = False) -> tuple:
+        r"""
+        Return the range of the values in the given columns, with a margin of 5%
+        """
+        minima = [ df[c].astype(float).min() for c in columns ]
+        maxima = [ df[c].astype(float).max() for c in columns ]
+        lower = np.nanmin(minima + ([0.] if include_zero else []))
+        upper = np.nanmax(maxima + ([0.] if include_zero else []))
+        margin = (upper - lower) * 0.05 if upper > lower else 0.5
+        return (lower - margin, upper + margin)
+
+    def plot_facets_parallel(self, df, plot_type, x, y, hue, style, row, column, **kwargs):
+        r"""
+        Render every facet of the plot in a separate task and composite the
+        images into the grid, with the axes, titles and legend drawn once.
+        The axis limits and the levels of the categories and of `hue` are
+        determined up front from all facets, so the facets line up.
+        """
+        plot_function, option_name = self.facet_plot_functions[plot_type]
+        kwargs = self.set_plot_specific_options(option_name, **kwargs)
+
+        hue_levels = self.get_levels(df, hue) if hue else [None]
+        categorical = not plot_function in ['lineplot', 'scatterplot', 'ecdfplot']
+        x_levels = self.get_levels(df, x) if categorical else None
+
+        if plot_function == 'ecdfplot':
+            xlim = self.get_limits(df, [x])
+            ylim = (-0.05, 1.05)
+        else:
+            if categorical:
+                xlim = (-0.5, len(x_levels) - 0.5)
+            else:
+                xlim = self.get_limits(df, [x])
+            ylim = self.get_limits(df, [y] + (self.ys or []), include_zero=(plot_function == 'barplot'))
+
+        extra_plots = list(zip(self.ys, self.plot_types)) if self.ys else []
+        theme = { 'context': self.context, 'axes_style': self.axes_style }
+        if self.matplotlib_rc_dict:
+            theme['rc'] = self.matplotlib_rc_dict
+
+        row_levels = self.get_levels(df, row) if row else None
+        column_levels = self.get_levels(df, column) if column else None
+        facet_columns = [ c for c in [row, column] if c ]
+        facets = [ (key if isinstance(key, tuple) else (key,), d) for key, d in df.groupby(by=facet_columns, observed=True) ]
+
+        logi(f'PlottingTask::plot_facets_parallel: rendering {len(facets)} facets')
+        images = self.map_facets(self.render_facet
+                                 , [ dict(data=d, plot_function=plot_function, x=x, y=y, hue=hue, style=style
+                                          , hue_levels=hue_levels, x_levels=x_levels, xlim=xlim, ylim=ylim
+                                          , extra_plots=extra_plots, resolution=self.facet_resolution
+                                          , theme=theme, kwargs=kwargs)
+                                     for _, d in facets ])
+
+        keys = pd.DataFrame([ key for key, _ in facets ], columns=facet_columns)
+        grid = sb.FacetGrid(keys, row=row, col=column, row_order=row_levels, col_order=column_levels)
+        for (key, _), image in zip(facets, images):
+            ax = grid.axes_dict[key if len(key) > 1 else key[0]]
+            ax.imshow(image, extent=(xlim[0], xlim[1], ylim[0], ylim[1]), aspect='auto', interpolation='antialiased')
+            ax.set_xlim(xlim)
+            ax.set_ylim(ylim)
+            if categorical:
+                ax.set_xticks(range(0, len(x_levels)))
+                ax.set_xticklabels([ str(l) for l in x_levels ])
+
+        legend_data = {}
+        if hue:
+            palette = sb.color_palette(n_colors=len(hue_levels))
+            legend_data.update({ str(l): mpl.patches.Patch(color=c) for l, c in zip(hue_levels, palette) })
+            extra_palette = sb.color_palette('Pastel1')
+            for v, _ in extra_plots:
+                legend_data.update({ f'{v},{l}': mpl.patches.Patch(color=extra_palette[i % len(extra_palette)])
+                                     for i, l in enumerate(hue_levels) })
+        if legend_data:
+            grid.add_legend(legend_data=legend_data, title=hue)
+
+        grid = self.set_grid_defaults(grid)
+
+        return grid
+
+
+    @staticmethod
+    def get_density_extent(df:pd.DataFrame, x:str, y:str) -> tuple:
+        r"""
+        Return the area covered by the points in `df`, as (left, right, bottom, top)
+        """
+        xs = df[x].to_numpy(dtype=np.float64)
+        ys = df[y].to_numpy(dtype=np.float64)
+        if len(xs) == 0:
+            return (0., 1., 0., 1.)
+        return (np.nanmin(xs), np.nanmax(xs), np.nanmin(ys), np.nanmax(ys))
+
+    def draw_density(self, ax, xs, ys, color, extent):
+        r"""
+        Draw the density of the points (`xs`, `ys`) onto `ax` as an image in
+        the given color, with the opacity of a pixel increasing with the
+        logarithm of the number of points in it.
+        """
+        counts = binning.count_pixels(xs, ys, extent, self.density_resolution)
+        image = np.zeros(counts.shape + (4,))
+        image[..., :3] = mpl.colors.to_rgb(color)
+        if counts.max() > 0:
+            image[..., 3] = self.alpha * np.log1p(counts) / np.log1p(counts.max())
+
+        return ax.imshow(image, extent=extent, origin='lower', aspect='auto', interpolation='nearest')
+
+    def plot_density(self, df, x='posX', y='posY', hue='moduleName', row=None, column=None, plot_type='scatter', **kwargs):
+        r"""
+        Draw the density of the points in `df` as an image per facet and hue.
+        All facets cover the same area, so the axes are shared.
+        """
+        logd(f'PlottingTask::plot_density: {plot_type=}  {len(df)=}')
+
+        extent = self.get_density_extent(df, x, y)
+        hue_levels = self.get_levels(df, hue)
+        palette = sb.color_palette(n_colors=len(hue_levels))
+
+        def density(*args, **kws):
+            data = kws.pop('data')
+            ax = mpl.pyplot.gca()
+            groups = data.groupby(by=hue, observed=True) if hue else [(None, data)]
+            for key, d in groups:
+                self.draw_density(ax, d[x], d[y], palette[hue_levels.index(key)], extent)
+            ax.set_xlim(extent[0], extent[1])
+            ax.set_ylim(extent[2], extent[3])
+
+        grid = sb.FacetGrid(df, row=row, col=column)
+        grid.map_dataframe(density)
+
+        if hue:
+            grid.add_legend(legend_data={ str(l): mpl.patches.Patch(color=c) for l, c in zip(hue_levels, palette) }
+                            , title=hue)
+
+        grid = self.set_grid_defaults(grid)
+
+        return grid
+
+
     def plot_heatplot(self, df, x='posX', y='posX', z='cbr', hue='moduleName', style='prefix', row=None, column=None, **kwargs):
         kwargs.pop('plot_type')
         logd(f'-'*40)
@@ -894,41 +1980,48 @@ class PlottingTask(YAMLObject):
         setattr(self, 'xlabel', None)
         setattr(self, 'ylabel', None)
 
-        def bin_position_f(df, column):
-            bin_position = lambda x: int(x / self.bin_size) * self.bin_size
-            df[column] = df[column].transform(bin_position)
+        # the bins of all facets cover the same area, so the grids have the same shape
+        x_range = binning.get_bin_range(df[x].to_numpy(dtype=np.float64), self.bin_size)
+        y_range = binning.get_bin_range(df[y].to_numpy(dtype=np.float64), self.bin_size)
 
-        # bin the position data
-        bin_position_f(df, x)
-        bin_position_f(df, y)
-
-        logi(f'PlottingTask::plot_data: {df=}')
-        logd(f'PlottingTask::plot_relplot: {df.columns=}')
+        logd(f'PlottingTask::plot_heatplot: {df.columns=}  {x_range=}  {y_range=}')
 
         if not column is None:
-            return self.plot_heatmap_grid(df, x, y, z, column)
+            return self.plot_heatmap_grid(df, x, y, z, column, x_range, y_range)
         else:
-            return self.plot_heatmap_nogrid(df, x, y, z)
-
+            return self.plot_heatmap_nogrid(df, x, y, z, x_range, y_range)
 
-    def plot_heatmap_grid(self, df, x, y, z, column):
+    def bin_data(self, df, x, y, z, x_range, y_range):
+        r"""
+        Bin the values of `z` at the positions in `x` and `y`, reducing the
+        values in every bin with `bin_reduction`. Empty bins are filled with 0.
+        """
+        return binning.bin_2d(df[x].to_numpy(dtype=np.float64)
+                              , df[y].to_numpy(dtype=np.float64)
+                              , df[z].to_numpy(dtype=np.float64)
+                              , bin_size=self.bin_size
+                              , reduction=self.bin_reduction
+                              , x_range=x_range, y_range=y_range
+                              # TODO: configurable fill value
+                              , fill_value=0.
+                             )
+
+
+    def plot_heatmap_grid(self, df, x, y, z, column, x_range=None, y_range=None):
         grid = sb.FacetGrid(df, col=column)
 
         def heatmap(*args, **kwargs):
             df = kwargs.pop('data')
             logd('-*-'*20)
             logd(f'{df=}')
-            df.loc[y] = df[y].transform(lambda x: -x)
-            df_mean = df[[column, x, y, z]].groupby(by=[column, x, y]).aggregate(pd.Series.mean).reset_index()
-            # TODO: configurable fill value
-            df_pivot = df_mean.pivot(index=y, columns=x, values=z).fillna(0.)
+            x_edges, y_edges, values = self.bin_data(df, x, y, z, x_range, y_range)
             if self.yrange:
                 kwargs['vmin'] = self.yrange[0]
                 kwargs['vmax'] = self.yrange[1]
             kwargs.pop('color')
 
             ax = mpl.pyplot.gca()
-            mesh = ax.pcolormesh(df_pivot
+            mesh = ax.pcolormesh(x_edges, y_edges, values
                           # , cbar=True
                           , cmap=sb.color_palette("blend:white,red", as_cmap=True)
                           # , cmap=self.colormap
@@ -942,27 +2035,6 @@ class PlottingTask(YAMLObject):
             # ax.set_ylabel('')
             return ax
 
-            # ax = sb.heatmap(df_pivot
-            #               , cbar=True
-            #               , cmap=sb.color_palette(self.colormap, as_cmap=True)
-            #               # , robust=True
-            #               , square=True
-            #               , norm='linear'
-            #               # , annot=True
-            #                   # , hue='cbr'
-            #               , alpha=self.alpha
-            #             , size=9
-            #               , **kwargs
-            #                   )
-            # logd(f'{ax.__dict__=}')
-            # ax.set_xticks([])
-            # ax.set_yticks([])
-            # ax.set_xlabel('')
-            # ax.set_ylabel('')
-            # logd(f'{type(ax)=}')
-            # logd(f'{type(ax.figure)=}')
-            # return ax
-
         grid.map_dataframe(heatmap, z)
 
         grid.set_axis_labels('','')
@@ -974,34 +2046,20 @@ class PlottingTask(YAMLObject):
         return grid
 
 
-    def plot_heatmap_nogrid(self, df, x, y, z):
-        # tranform positions on the y-axis
-        # df.loc[y] = df[y].transform(lambda x: -x)
-        df_mean = df[[x, y, z]].groupby(by=[x, y]).aggregate(pd.Series.mean).reset_index()
-        df_pivot = df_mean.pivot(index=y, columns=x, values=z).fillna(0.)
+    def plot_heatmap_nogrid(self, df, x, y, z, x_range=None, y_range=None):
+        x_edges, y_edges, values = self.bin_data(df, x, y, z, x_range, y_range)
+        # label the rows and columns with the start of their bin, like the
+        # index of a pivot table
+        df_grid = pd.DataFrame(values, index=pd.Index(y_edges[:-1], name=y), columns=pd.Index(x_edges[:-1], name=x))
 
         kwargs = {}
         if self.yrange:
             kwargs['vmin'] = self.yrange[0]
             kwargs['vmax'] = self.yrange[1]
 
-        # fig, ax = mpl.pyplot.subplots()
-        # mesh = ax.pcolormesh(df_pivot
-        #               # , cbar=True
-        #               # , cmap=sb.color_palette("blend:white,red", as_cmap=True)
-        #                 , cmap=sb.color_palette(self.colormap, as_cmap=True)
-        #               # , cmap=self.colormap
-        #               , norm='linear'
-        #               , **kwargs
-        #               )
-        # fig.colorbar(mesh, ax=ax)
-        # ax.set_xticks([])
-        # ax.set_yticks([])
-        # return fig
-
-        grid = sb.heatmap(data=df_pivot
+        grid = sb.heatmap(data=df_grid
                           , cbar=True
-                          , cmap=sb.color_palette(self.colormap, as_cmap=True)
+                          , cmap=self.colormap if isinstance(self.colormap, mpl.colors.Colormap) else sb.color_palette(self.colormap, as_cmap=True)
                           # , robust=True
                           , square=True
                           , norm='linear'
@@ -0,0 +1,271 @@
+r"""
+A long-running server executing recipes on a warm dask cluster.
+
+Started with `run_recipe.py --serve`, the server sets up the cluster and the
+workers once, keeps the modules of the recipe phases imported after their first
+use and accepts recipe submissions over a Unix domain socket, e.g. with
+`run_recipe.py --submit <recipe> ...`.
+The recipes are executed one after another, the log messages of an execution
+are forwarded to the submitting client.
+
+The datasets read by the readers of the plotting phase are persisted in the
+memory of the cluster and kept in a `DatasetCache`. A later submission with a
+reader whose input files and parameters are unchanged, i.e. with the same
+fingerprint, reuses the persisted dataset instead of reading the files again.
+
+The protocol consists of one line of JSON per message. A client sends a
+single request, either `{"arguments": [...], "cwd": "..."}` for executing
+`run_recipe.py` with the given command line arguments in the given
+directory, or `{"command": "status"}` or `{"command": "shutdown"}`. The server
+replies with any number of `{"log": "..."}` messages and a final message with
+the key `status`.
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+import collections
+import copy
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+from common.logging_facilities import logi, loge, logd, logw
+
+from utility.stopwatch import startWatch, stopWatch
+
+
+class DatasetCache():
+    r"""
+    A cache of datasets persisted in the memory of the cluster, identified by
+    the fingerprints of their `DataAttributes`, evicting the least recently
+    used dataset beyond `max_datasets`
+
+    Parameters
+    ----------
+    max_datasets : int
+        the maximum number of datasets kept
+    """
+    def __init__(self, max_datasets:int = 8):
+        self.max_datasets = max_datasets
+        self.datasets = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(data:List[Tuple]) -> Optional[Tuple[str]]:
+        fingerprints = tuple(getattr(attributes, 'fingerprint', None) for _, attributes in data)
+        if None in fingerprints:
+            return None
+        return fingerprints
+
+    def get_or_persist(self, name:str, data:List[Tuple]) -> List[Tuple]:
+        r"""
+        Return the cached dataset with the same fingerprint as `data`, a list
+        of `(Delayed, DataAttributes)` as returned by a reader, or persist
+        `data` in the memory of the cluster, add it to the cache and return it
+        """
+        key = DatasetCache.get_key(data)
+        if key is None:
+            logd(f'DatasetCache::get_or_persist: no fingerprint for "{name}", not caching it')
+            return data
+
+        if key in self.datasets:
+            self.hits += 1
+            self.datasets.move_to_end(key)
+            logi(f'DatasetCache::get_or_persist: reusing the cached dataset for "{name}"')
+            cached = self.datasets[key]
+        else:
+            import dask
+
+            self.misses += 1
+            logi(f'DatasetCache::get_or_persist: persisting the dataset for "{name}"')
+            persisted = dask.persist(*[ delayed for delayed, _ in data ])
+            cached = list(zip(persisted, [ attributes for _, attributes in data ]))
+            self.datasets[key] = cached
+            while len(self.datasets) > self.max_datasets:
+                # dropping the reference releases the data in the cluster
+                self.datasets.popitem(last=False)
+
+        # the attributes might be modified by the transforms of a recipe
+        return [ (delayed, copy.deepcopy(attributes)) for delayed, attributes in cached ]
+
+    def clear(self):
+        self.datasets.clear()
+
+    def __repr__(self) -> str:
+        return f'DatasetCache(datasets={len(self.datasets)}, max_datasets={self.max_datasets}, hits={self.hits}, misses={self.misses})'
+
+
+class ForwardingLogHandler(logging.Handler):
+    r"""
+    A logging handler sending the formatted log records to a client connection
+    """
+    def __init__(self, wfile, level=logging.NOTSET):
+        super().__init__(level)
+        self.wfile = wfile
+        self.connected = True
+
+    def emit(self, record):
+        if not self.connected:
+            return
+        try:
+            send_message(self.wfile, { 'log': self.format(record) })
+        except OSError:
+            # the client went away, the execution continues regardless
+            self.connected = False
+
+
+def send_message(wfile, message:dict):
+    wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+    wfile.flush()
+
+
+class RecipeServer(socketserver.UnixStreamServer):
+    r"""
+    The server accepting recipe submissions on the Unix domain socket
+    `socket_path` and executing them sequentially with `execute`
+
+    Parameters
+    ----------
+    socket_path : str
+        the path of the Unix domain socket to listen on
+
+    execute : Callable
+        the function executing a submission, called with the command line
+        arguments of the submission and the `DatasetCache`
+
+    max_datasets : int
+        the maximum number of datasets kept in the cache
+    """
+    def __init__(self, socket_path:str, execute:Callable, max_datasets:int = 8):
+        if os.path.exists(socket_path):
+            if is_server_running(socket_path):
+                raise Exception(f'a server is already listening on {socket_path}')
+            # left over from a server that was killed
+            os.unlink(socket_path)
+
+        self.socket_path = socket_path
+        self.execute = execute
+        self.dataset_cache = DatasetCache(max_datasets)
+        self.submissions = 0
+        super().__init__(socket_path, RecipeRequestHandler)
+
+    def serve(self):
+        logi(f'RecipeServer::serve: listening on {self.socket_path}')
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logi('RecipeServer::serve: stopped')
+
+
+class RecipeRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except Exception as e:
+            send_message(self.wfile, { 'status': 'error', 'error': f'invalid request: {e!r}' })
+            return
+
+        command = request.get('command', 'run')
+        if command == 'status':
+            send_message(self.wfile, { 'status': 'finished', 'submissions': self.server.submissions
+                                      , 'cache': repr(self.server.dataset_cache) })
+            return
+        if command == 'shutdown':
+            send_message(self.wfile, { 'status': 'finished' })
+            # `shutdown` blocks until the loop of `serve_forever` exits, which
+            # waits for this handler to return
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        self.server.submissions += 1
+        logi(f'RecipeRequestHandler::handle: submission {self.server.submissions}: {request["arguments"]}')
+
+        handler = ForwardingLogHandler(self.wfile)
+        handler.setFormatter(logging.Formatter('%(levelname)s | %(module)s::%(name)s::%(funcName)s | %(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+
+        start = startWatch()
+        cwd = os.getcwd()
+        try:
+            os.chdir(request.get('cwd', cwd))
+            self.server.execute(request['arguments'], self.server.dataset_cache)
+            status = { 'status': 'finished' }
+        except SystemExit as e:
+            # raised by the argument parser and for `--dump-recipe-only`
+            status = { 'status': 'finished' if not e.code else 'error', 'error': f'exit with code {e.code}' }
+        except Exception as e:
+            loge(f'RecipeRequestHandler::handle: {e!r}')
+            status = { 'status': 'error', 'error': ''.join(traceback.format_exception(e)) }
+        finally:
+            os.chdir(cwd)
+            root_logger.removeHandler(handler)
+
+        elapsed, _ = stopWatch(start)
+        status['elapsed'] = elapsed
+        logi(f'RecipeRequestHandler::handle: submission {self.server.submissions} {status["status"]} after {elapsed:.2f}s'
+             f', {self.server.dataset_cache}')
+        if handler.connected:
+            try:
+                send_message(self.wfile, status)
+            except OSError:
+                pass
+
+
+def send_request(socket_path:str, request:dict, output=sys.stderr) -> dict:
+    r"""
+    Send `request` to the server listening on `socket_path`, write the
+    forwarded log messages to `output` and return the final message
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with connection.makefile('rb') as rfile:
+            for line in rfile:
+                message = json.loads(line)
+                if 'log' in message:
+                    print(message['log'], file=output)
+                if 'status' in message:
+                    return message
+
+    return { 'status': 'error', 'error': 'the connection to the server was closed' }
+
+
+def submit(socket_path:str, arguments:List[str]) -> int:
+    r"""
+    Submit the execution of `run_recipe.py` with the command line `arguments`
+    to the server listening on `socket_path`, in the current directory
+
+    Returns
+    -------
+    The exit status: 0 if the execution finished, 1 otherwise
+    """
+    try:
+        response = send_request(socket_path, { 'arguments': arguments, 'cwd': os.getcwd() })
+    except OSError as e:
+        loge(f'submit: could not connect to the server at {socket_path}: {e!r}')
+        return 1
+
+    if response['status'] != 'finished':
+        loge(f'submit: the execution failed: {response.get("error")}')
+        return 1
+
+    logi(f'submit: finished after {response.get("elapsed", 0):.2f}s')
+    return 0
+
+
+def is_server_running(socket_path:str) -> bool:
+    try:
+        send_request(socket_path, { 'command': 'status' })
+        return True
+    except OSError:
+        return False
@@ -1,12 +1,21 @@
 #!/usr/bin/python3
 
+from __future__ import annotations
+
+import contextlib
+import copy
+import importlib
+import json
+import os
+import pathlib
 import pprint
 import sys
 import shutil
 import argparse
+import time
 import traceback
 
-from typing import Callable
+from typing import Callable, List, Set, TYPE_CHECKING
 
 # ---
 
@@ -25,29 +34,23 @@ try:
 except ImportError:
     from yaml import Loader, Dumper
 
-import pandas as pd
-
-import dask
-import dask.distributed
-from dask.distributed import LocalCluster
-from dask_jobqueue import SLURMCluster
-
-from dask.distributed import Client
-
 # ---
 
-from recipe import Recipe
+# The heavy modules, i.e. dask, pandas and the modules of the recipe phases
+# with the plotting libraries, are imported in the functions using them, so
+# that only the phases that are run pay for their imports and the command line
+# is parsed and answered (`--help`, `--submit`, `--stop-server`) without them.
+if TYPE_CHECKING:
+    from dask.distributed import Client
 
-import extractors
-import transforms
-import exporters
-import plots
+from recipe import Recipe
 
-from sql_queries import generate_signal_query
+import tag_regular_expressions as tag_regex
 
-# ---
+from utility.stopwatch import startWatch, stopWatch
+from utility.filesystem import get_files_fingerprint
 
-import tag_regular_expressions as tag_regex
+import recipe_server
 
 _debug = False
 
@@ -75,21 +78,38 @@ def eval_recipe_tag_definitions(recipe, attributes_regex_map, iterationvars_rege
     return attributes_regex_map, iterationvars_regex_map, parameters_regex_map
 
 
+def get_input_dataset_names(task) -> Set[str]:
+    r"""
+    Return the names of the datasets a transform or exporter reads from the data repo
+    """
+    names = set(getattr(task, 'dataset_names', None) or [])
+    for attribute in ['dataset_name', 'dataset_name_left', 'dataset_name_right']:
+        if getattr(task, attribute, None) is not None:
+            names.add(getattr(task, attribute))
+    return names
+
+
 def prepare_evaluation_phase(recipe:Recipe, options, data_repo):
     logi(f'prepare_evaluation_phase: {recipe}  {recipe.name}')
 
+    # the tags of the recipe are added to copies of the default maps, so they
+    # don't leak into the recipes submitted later to a server
+    attributes_regex_map, iterationvars_regex_map, parameters_regex_map = \
+            dict(tag_regex.attributes_regex_map), dict(tag_regex.iterationvars_regex_map), dict(tag_regex.parameters_regex_map)
+
     if hasattr(recipe.evaluation, 'tags'):
         attributes_regex_map, iterationvars_regex_map, parameters_regex_map = eval_recipe_tag_definitions(recipe \
-                , tag_regex.attributes_regex_map, tag_regex.iterationvars_regex_map, tag_regex.parameters_regex_map)
-    else:
-        attributes_regex_map, iterationvars_regex_map, parameters_regex_map = \
-                tag_regex.attributes_regex_map, tag_regex.iterationvars_regex_map, tag_regex.parameters_regex_map
+                , attributes_regex_map, iterationvars_regex_map, parameters_regex_map)
 
 
     if not hasattr(recipe.evaluation, 'extractors'):
         logi('prepare_evaluation_phase: no `extractors` in recipe.Evaluation')
         return
 
+    # the datasets not produced in this batch in watch mode, from the
+    # extractors without new input files and the transforms depending on them
+    skipped_datasets = set()
+
     for extractor_tuple in recipe.evaluation.extractors:
         extractor_name = list(extractor_tuple.keys())[0]
         extractor = list(extractor_tuple.values())[0]
@@ -102,7 +122,17 @@ def prepare_evaluation_phase(recipe:Recipe, options, data_repo):
             extractor.input_files = [ options.extraction_overrides[extractor_name] ]
             logi(f'overriding {extractor_name} with {extractor.input_files}')
 
+        if options.watch_files is not None:
+            # only extract the newly completed input files
+            if not extractor_name in options.watch_files:
+                logi(f'watch: no new input files for extractor {extractor_name}')
+                skipped_datasets.add(extractor_name)
+                continue
+            extractor.input_files = options.watch_files[extractor_name]
+            logi(f'watch: extracting {len(extractor.input_files)} new input files with {extractor_name}')
+
         extractor.set_tag_maps(attributes_regex_map, iterationvars_regex_map, parameters_regex_map)
+        extractor.set_name(extractor_name)
 
         delayed_data = extractor.prepare()
         # print(f'{extractor=}')
@@ -121,6 +151,12 @@ def prepare_evaluation_phase(recipe:Recipe, options, data_repo):
             if options.run_tree and not transform_name in options.run_tree['evaluation']['transforms']:
                 logi(f'skipping transform {transform_name}')
                 continue
+            missing_inputs = get_input_dataset_names(transform).difference(data_repo)
+            if missing_inputs and missing_inputs <= skipped_datasets:
+                logi(f'watch: skipping transform {transform_name}, its input {missing_inputs} is not extracted in this batch')
+                skipped_datasets.add(transform.output_dataset_name)
+                continue
+
             logi(f'preparing transform {transform_name}')
             transform.set_data_repo(data_repo)
             transform.prepare()
@@ -144,6 +180,14 @@ def prepare_evaluation_phase(recipe:Recipe, options, data_repo):
                 exporter.output_filename = options.export_overrides[exporter_name]
                 logi(f'overriding {exporter_name} with {exporter.output_filename}')
 
+            if options.watch_files is not None and exporter.concatenate:
+                exporter.batch = options.watch_batch
+
+            missing_inputs = get_input_dataset_names(exporter).difference(data_repo)
+            if missing_inputs and missing_inputs <= skipped_datasets:
+                logi(f'watch: skipping exporter {exporter_name}, its input {missing_inputs} is not extracted in this batch')
+                continue
+
             exporter.set_data_repo(data_repo)
             job = exporter.prepare()
             jobs.extend(job)
@@ -159,9 +203,84 @@ def prepare_evaluation_phase(recipe:Recipe, options, data_repo):
     return data_repo, jobs
 
 
-def prepare_plotting_phase(recipe:Recipe, options, data_repo):
+def push_down_plot_selectors(recipe:Recipe, options):
+    r"""
+    Push the row filters (the `selector`) and the column projections (the
+    columns referenced by `x`, `y`, `hue`, ...) of the plotting tasks down
+    into the readers of the datasets they plot, so that only the needed slice
+    of every input file is read, transferred and concatenated.
+
+    The filter pushed into a reader is the disjunction of the selectors of all
+    tasks plotting its dataset, the projection the union of their columns.
+    The tasks still apply their own selector afterwards. Nothing is pushed
+    down into readers of datasets that are used by a transform.
+
+    Parameters
+    ----------
+    recipe : Recipe
+        The recipe
+
+    options : argparse.Namespace
+        The command line options
+    """
+    if not hasattr(recipe.plot, 'reader'):
+        return
+
+    def is_skipped(phase, name):
+        return options.run_tree and not name in options.run_tree['plot'][phase]
+
+    transform_inputs = set()
+    for transform_tuple in getattr(recipe.plot, 'transforms', []):
+        transform_name = list(transform_tuple.keys())[0]
+        transform = list(transform_tuple.values())[0]
+        if is_skipped('transforms', transform_name):
+            continue
+        transform_inputs.update(get_input_dataset_names(transform))
+
+    tasks_by_dataset = {}
+    for task_tuple in recipe.plot.tasks:
+        task_name = list(task_tuple.keys())[0]
+        task = list(task_tuple.values())[0]
+        if is_skipped('tasks', task_name):
+            continue
+        tasks_by_dataset.setdefault(task.dataset_name, []).append(task)
+
+    for dataset_tuple in recipe.plot.reader:
+        dataset_name = list(dataset_tuple.keys())[0]
+        reader = list(dataset_tuple.values())[0]
+
+        if not hasattr(reader, 'push_down') or not dataset_name in tasks_by_dataset:
+            continue
+        if dataset_name in transform_inputs:
+            logi(f'push_down_plot_selectors: "{dataset_name}" is used by a transform, not pushing down selectors')
+            continue
+
+        tasks = tasks_by_dataset[dataset_name]
+
+        # references to local variables can't be evaluated in the reader
+        selectors = [ task.selector for task in tasks ]
+        if all(type(selector) == str and selector and not '@' in selector for selector in selectors):
+            selectors = list(dict.fromkeys(selectors))
+            filter_query = selectors[0] if len(selectors) == 1 else ' or '.join([ f'({selector})' for selector in selectors ])
+        else:
+            filter_query = None
+
+        columns = [ task.get_referenced_columns() for task in tasks ]
+        if None in columns:
+            columns = None
+        else:
+            columns = sorted(set().union(*columns))
+
+        logi(f'push_down_plot_selectors: "{dataset_name}": {filter_query=}  {columns=}')
+        reader.push_down(filter_query=filter_query, columns=columns)
+
+
+def prepare_plotting_phase(recipe:Recipe, options, data_repo, dataset_cache=None):
     logi(f'prepare_plotting_phase: {recipe}  {recipe.name}')
 
+    if not options.no_pushdown:
+        push_down_plot_selectors(recipe, options)
+
     if not hasattr(recipe.plot, 'reader'):
         logi('prepare_plotting_phase: no `reader` in recipe.Plot')
     else:
@@ -177,6 +296,8 @@ def prepare_plotting_phase(recipe:Recipe, options, data_repo):
                 reader.input_files = options.reader_overrides[dataset_name]
                 logi(f'plot: prepare_plotting_phase overriding input files for "{dataset_name}": "{reader.input_files=}"')
             data = reader.read_data()
+            if dataset_cache is not None:
+                data = dataset_cache.get_or_persist(dataset_name, data)
             data_repo[dataset_name] = data
             logi(f'added reader {dataset_name}')
 
@@ -227,15 +348,76 @@ def prepare_plotting_phase(recipe:Recipe, options, data_repo):
     return data_repo, jobs
 
 
-def process_recipe(options):
-    f = open(options.recipe, mode='r')
+# the modules with the YAML constructors for the objects in the sections of a
+# recipe, imported only when the phase of a section is run
+PHASE_MODULES = { 'evaluation': [ 'extractors', 'transforms', 'exporters' ]
+                , 'plot': [ 'transforms', 'plots' ]
+                }
+
+
+def get_phases(options) -> List[str]:
+    r"""
+    Return the phases of the recipe run with the given options
+    """
+    if options.eval_only:
+        return [ 'evaluation' ]
+    if options.plot_only:
+        return [ 'plot' ]
+    return [ 'evaluation', 'plot' ]
 
-    recipe = yaml.unsafe_load(f.read())
+
+def register_constructors(phases:List[str]):
+    r"""
+    Import the modules needed for the given phases and register the YAML
+    constructors for their objects
+    """
+    for phase in phases:
+        for module_name in PHASE_MODULES[phase]:
+            importlib.import_module(module_name).register_constructors()
+
+
+def load_recipe(recipe_file:str, phases:List[str] = list(PHASE_MODULES)) -> Recipe:
+    r"""
+    Load the recipe from `recipe_file`, constructing only the sections of the
+    given phases. The sections of the other phases are dropped before their
+    objects are constructed, so e.g. an evaluation-only run does not import
+    `plots` and with it the plotting libraries.
+
+    Parameters
+    ----------
+    recipe_file : str
+        The path to the recipe
+
+    phases : List[str]
+        The phases to construct, `evaluation` and/or `plot`
+    """
+    register_constructors(phases)
+
+    with open(recipe_file, mode='r') as f:
+        loader = yaml.UnsafeLoader(f.read())
+    try:
+        node = loader.get_single_node()
+        if node is None:
+            return None
+        if isinstance(node, yaml.MappingNode):
+            node.value = [ (key, value) for key, value in node.value
+                           if not (key.value in PHASE_MODULES and not key.value in phases) ]
+        return loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+def dump_recipe(recipe:Recipe):
+    output = dump(recipe, Dumper=Dumper)
+    terminal_size = shutil.get_terminal_size()
+    logd(pprint.pformat(output, width=terminal_size.columns))
+
+
+def process_recipe(options, dataset_cache=None):
+    recipe = load_recipe(options.recipe, get_phases(options))
 
     if options.dump_recipe or options.dump_recipe_only:
-        output = dump(recipe, Dumper=Dumper)
-        terminal_size = shutil.get_terminal_size()
-        logd(pprint.pformat(output, width=terminal_size.columns))
+        dump_recipe(recipe)
         if options.dump_recipe_only:
             exit()
 
@@ -245,21 +427,24 @@ def process_recipe(options):
     if not options.plot_only:
         if not hasattr(recipe, 'evaluation'):
             logi('process_recipe: no Evaluation in recipe')
-            return
+            return data_repo, job_list, 0
         data_repo, jobs = prepare_evaluation_phase(recipe, options, data_repo)
         job_list.extend(jobs)
 
+    # the jobs of the exporters come first, their results are the numbers of rows exported
+    n_export_jobs = len(job_list)
+
     if options.eval_only:
-        return data_repo, job_list
+        return data_repo, job_list, n_export_jobs
 
     if not hasattr(recipe, 'plot'):
         logi('process_recipe: no Plot in recipe')
-        return data_repo, job_list
+        return data_repo, job_list, n_export_jobs
 
-    data_repo, jobs = prepare_plotting_phase(recipe, options, data_repo)
+    data_repo, jobs = prepare_plotting_phase(recipe, options, data_repo, dataset_cache=dataset_cache)
     job_list.extend(jobs)
 
-    return data_repo, job_list
+    return data_repo, job_list, n_export_jobs
 
 
 def extract_dict_from_string(string):
@@ -272,7 +457,7 @@ def extract_dict_from_string(string):
 
 def parse_arguments(arguments):
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('recipe', help='input recipe')
+    parser.add_argument('recipe', nargs='?', help='input recipe')
 
     parser.add_argument('--override-extractor', type=str, help='override extractor parameters')
     parser.add_argument('--override-exporter', type=str, help='override exporter parameters')
@@ -285,7 +470,8 @@ def parse_arguments(arguments):
     parser.add_argument('--run', type=str, default='all', help='run selected tasks/steps only') #TODO:description
 
     parser.add_argument('--worker', type=int, default=4, help='the number of worker processes')
-    parser.add_argument('--mem', type=int, default=1, help='the memory, in GB, to reserve for each worker process')
+    parser.add_argument('--mem', type=float, default=1, help='the memory, in GB, to reserve for each worker process')
+    parser.add_argument('--memory-aware', action='store_true', default=False, help='estimate the memory of every extraction task from the metadata of the input files, limit the concurrent extraction tasks per worker to its memory (set with `--mem`) and split files too large for a single task')
 
     parser.add_argument('--cluster', type=str, help='cluster address')
     parser.add_argument('--single-threaded', action='store_true', default=False, help='run in single-threaded mode; this overrides the value of the `--worker` flag')
@@ -296,6 +482,32 @@ def parse_arguments(arguments):
 
     parser.add_argument('--tmpdir', type=str, default='/opt/tmpssd/tmp', help='directory for temporary files')
 
+    parser.add_argument('--no-pushdown', action='store_true', default=False, help='do not push the selectors and columns of the plotting tasks down into the readers')
+
+    parser.add_argument('--streaming', action='store_true', default=False, help='submit the jobs as futures and process them as they complete, without gathering their results')
+
+    parser.add_argument('--profile', action='store_true', default=False, help='record the time, rows, bytes read and memory of every extraction, transform, export and plotting task and write a report')
+    parser.add_argument('--profile-output', type=str, default=None, help='directory for the profiling report; defaults to the value of `--tmpdir`')
+    parser.add_argument('--profile-dask', action='store_true', default=False, help='additionally write a dask performance report when profiling with a dask client')
+
+    parser.add_argument('--fault-tolerant', action='store_true', default=False, help='retry failed extraction tasks, quarantine input files failing repeatedly and checkpoint the extracted data of every file')
+    parser.add_argument('--retries', type=int, default=2, help='the number of retries of a failed extraction task before its input file is quarantined')
+    parser.add_argument('--retry-backoff', type=float, default=5.0, help='the delay, in seconds, before the first retry of a failed extraction task, doubled for every further retry')
+    parser.add_argument('--state-directory', type=str, default=None, help='directory for the checkpoints and the quarantine; defaults to `<tmpdir>/<recipe>_state`')
+    parser.add_argument('--resume', action='store_true', default=False, help='resume an interrupted fault-tolerant run: restore the checkpoints, skip the finished jobs and the quarantined files; implies `--fault-tolerant`')
+
+    parser.add_argument('--serve', action='store_true', default=False, help='run as server: set up the cluster once and execute the recipes submitted with `--submit`, keeping the datasets read in the plotting phase cached')
+    parser.add_argument('--submit', action='store_true', default=False, help='submit the recipe, with the remaining arguments, to the server started with `--serve`')
+    parser.add_argument('--stop-server', action='store_true', default=False, help='stop the server started with `--serve`')
+    parser.add_argument('--socket', type=str, default=None, help='the Unix domain socket of the server; defaults to `<tmpdir>/run_recipe-<uid>.sock`')
+    parser.add_argument('--cache-datasets', type=int, default=8, help='the maximum number of datasets kept cached by the server')
+
+    parser.add_argument('--watch', action='store_true', default=False, help='watch the input files of the extractors and extract every batch of newly completed files, exporting the data of every batch to separate files')
+    parser.add_argument('--watch-interval', type=float, default=60, help='the interval, in seconds, between looking for new input files')
+    parser.add_argument('--stable-time', type=float, default=60, help='the time, in seconds, the size and modification time of an input file have to stay unchanged for it to be considered complete')
+    parser.add_argument('--marker-suffix', type=str, default=None, help='consider an input file complete once a marker file, its path with this suffix appended (e.g. `.done`), exists')
+    parser.add_argument('--refresh-plots', action='store_true', default=False, help='in watch mode, redraw the plots whose input data changed after every extraction')
+
     parser.add_argument('--plot-task-graphs', action='store_true', default=False, help='plot the evaluation and plotting phase task graph')
 
     parser.add_argument('--verbose', '-v', action='count', default=0, help='increase logging verbosity')
@@ -308,6 +520,12 @@ def parse_arguments(arguments):
 
     args = parser.parse_args(arguments)
 
+    if args.recipe is None and not (args.serve or args.stop_server):
+        parser.error('the recipe is required')
+
+    if args.socket is None:
+        args.socket = f'{args.tmpdir}/run_recipe-{os.getuid()}.sock'
+
     if args.debug:
         global _debug
         _debug = True
@@ -315,6 +533,28 @@ def parse_arguments(arguments):
     if args.single_threaded:
         args.worker = 1
 
+    if args.resume:
+        args.fault_tolerant = True
+
+    if args.watch and args.serve:
+        parser.error('`--watch` can not be used with `--serve`')
+
+    # the input files of the extractors for the current batch in watch mode,
+    # and the number of the batch
+    setattr(args, 'watch_files', None)
+    setattr(args, 'watch_batch', None)
+
+    if args.serve and args.fault_tolerant:
+        # the checkpoints of one submission would be restored for the next
+        logw('fault-tolerant extraction is not supported in server mode, disabling it')
+        args.fault_tolerant = False
+        args.resume = False
+
+    if args.fault_tolerant and args.state_directory is None:
+        args.state_directory = f'{args.tmpdir}/{pathlib.Path(args.recipe).stem}_state'
+    # identifies the files quarantined in this run in the summary
+    setattr(args, 'run_id', f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}')
+
     if args.slurm:
         if not args.nodelist:
             raise Exception('A nodelist ist required when using SLURM.')
@@ -408,29 +648,49 @@ def parse_arguments(arguments):
 
 
 def setup_pandas():
+    import pandas as pd
+
     # verbose printing of DataFrames
     pd.set_option('display.max_columns', None)
     pd.set_option('display.max_colwidth', None)
 
 
-class WorkerPlugin(dask.distributed.WorkerPlugin):
+def create_worker_plugin(options):
     r"""
-    A dask worker plugin for setting defaults in the worker process
+    Create the dask worker plugin for setting defaults in the worker process.
+    The class is defined here since its base class is only available once
+    `dask.distributed` is imported, when a cluster is set up.
 
     Parameters
     ----------
     options : dict
         The dictionary containing the configuration for the worker, usually the same as for the launcher
     """
-    def __init__(self, options, *args, **kwargs):
-        self.options = options
+    import dask.distributed
+
+    class WorkerPlugin(dask.distributed.WorkerPlugin):
+        def __init__(self, options, *args, **kwargs):
+            self.options = options
+
+        def setup(self, worker: dask.distributed.Worker):
+            from utility import profiling
 
-    def setup(self, worker: dask.distributed.Worker):
-        # append the current path to the PYTHONPATH of the worker
-        sys.path.append('.')
-        setup_logging_defaults(level=self.options.log_level)
-        set_logging_level(self.options.log_level)
-        setup_pandas()
+            # append the current path to the PYTHONPATH of the worker
+            sys.path.append('.')
+            setup_logging_defaults(level=self.options.log_level)
+            set_logging_level(self.options.log_level)
+            setup_pandas()
+            if self.options.profile:
+                profiling.enable_profiling()
+            if self.options.fault_tolerant:
+                setup_fault_tolerance(self.options)
+            if not self.options.eval_only:
+                import plots
+                # import the plotting libraries and build the font cache once per
+                # worker process instead of in the first plotting task
+                plots.warm_up_plotting()
+
+    return WorkerPlugin(options)
 
 
 def setup_dask(options):
@@ -442,10 +702,23 @@ def setup_dask(options):
     options : dict
         The dictionary containing the configuration for the launcher
     """
-    plugin = WorkerPlugin(options)
+    import dask
+    import extraction_planning
 
     dask.config.set({'distributed.scheduler.worker-ttl': None})
 
+    if options.fault_tolerant:
+        # let a task be rescheduled after the loss of a worker until
+        # `fault_tolerance.run_checkpointed` puts its input file into quarantine
+        dask.config.set({'distributed.scheduler.allowed-failures': options.retries + 1})
+
+    # declare the memory of the workers as resource for the memory-aware
+    # scheduling of the extraction tasks
+    if options.memory_aware:
+        resources = { extraction_planning.MEMORY_RESOURCE: int(options.mem * 2**30) }
+    else:
+        resources = None
+
     # single-threaded mode for debugging
     if options.single_threaded:
         logi('using local single-threaded process cluster')
@@ -454,12 +727,19 @@ def setup_dask(options):
         # connections objects being transported between threads
         return None
 
+    from dask.distributed import Client, LocalCluster
+
+    plugin = create_worker_plugin(options)
+
     if options.slurm:
+        from dask_jobqueue import SLURMCluster
+
         logi('using SLURM cluster')
         cluster = SLURMCluster(cores = 1
                              , n_workers = options.worker
                              , memory = str(options.mem) + 'GB'
                              , job_extra_directives = [ f'--nodelist={options.nodelist} --partition={options.partition}' ]
+                             , worker_extra_args = [ '--resources', f'{extraction_planning.MEMORY_RESOURCE}={resources[extraction_planning.MEMORY_RESOURCE]}' ] if resources else []
                              , interface = 'lo'
                              , shared_temp_directory = options.tmpdir
                              )
@@ -473,6 +753,7 @@ def setup_dask(options):
                                  , host='localhost'
                                  # , interface='lo'
                                  , local_directory = options.tmpdir
+                                 , resources = resources
                                  )
             cluster.scale(options.worker)
             client = Client(cluster)
@@ -485,11 +766,89 @@ def setup_dask(options):
             return client
     else:
         logi(f'using local cluster with dashboard at localhost:8787')
-        client = Client(dashboard_address='localhost:8787', n_workers=options.worker)
+        client = Client(dashboard_address='localhost:8787', n_workers=options.worker, resources=resources)
         client.register_worker_plugin(plugin)
         return client
 
 
+def setup_memory_aware_extraction(client:Client, options):
+    r"""
+    Enable the memory-aware planning of the extraction tasks, see
+    `extraction_planning`. The extraction tasks are annotated with their
+    estimated memory as resource requirement if the workers declare their
+    memory as resource, i.e. if they were started by `setup_dask` or with
+    `--resources MEMORY=<bytes>`.
+
+    Parameters
+    ----------
+    client : Client
+        The client of the cluster, or None in single-threaded mode
+
+    options : dict
+        The dictionary containing the configuration for the launcher
+    """
+    import extraction_planning
+
+    memory_limit = int(options.mem * 2**30)
+    annotate_resources = False
+
+    if client is not None:
+        if options.cluster and options.cluster != 'local':
+            # the workers of an external cluster might not declare the resource
+            worker_memory = extraction_planning.get_worker_memory_resource(client)
+            if worker_memory is None:
+                logw(f'setup_memory_aware_extraction: the workers of {options.cluster} do not declare the resource'
+                     f' {extraction_planning.MEMORY_RESOURCE}, the extraction tasks are only prioritised by their estimated memory')
+            else:
+                memory_limit = worker_memory
+                annotate_resources = True
+        else:
+            annotate_resources = True
+
+    logi(f'setup_memory_aware_extraction: {memory_limit=}  {annotate_resources=}')
+    extraction_planning.set_memory_limit(memory_limit, annotate_resources=annotate_resources)
+
+
+def setup_fault_tolerance(options):
+    r"""
+    Enable the fault-tolerant extraction in this process, see `utility.fault_tolerance`
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the launcher
+    """
+    from utility import fault_tolerance
+
+    fault_tolerance.enable_fault_tolerance(options.state_directory, retries=options.retries
+                                           , backoff=options.retry_backoff, run_id=options.run_id)
+
+
+def write_fault_tolerance_summary(options):
+    r"""
+    Log the input files that failed in this run and those skipped because
+    they were quarantined in an earlier run, and write them to `summary.json`
+    in the state directory
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the launcher
+    """
+    from utility import fault_tolerance
+
+    summary = fault_tolerance.summarize(options.state_directory, options.run_id)
+    with open(f'{options.state_directory}/summary.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    for record in summary['failed']:
+        logw(f'failed input: {record["file"]}  ({record["attempts"]} attempts): {record["reason"]}')
+    for record in summary['skipped']:
+        logw(f'skipped input: {record["file"]}, quarantined in run {record["run_id"]}: {record["reason"]}')
+    logi(f'write_fault_tolerance_summary: {len(summary["failed"])} failed and {len(summary["skipped"])} skipped input files'
+         f', see {options.state_directory}/summary.json')
+
+
 def compute_graph(jobs):
     r"""
     Compute the task graph
@@ -499,6 +858,8 @@ def compute_graph(jobs):
     jobs : List[dask.Delayed]
         The list of jobs/tasks to compute
     """
+    import dask
+
     logi('=-!!'*40)
     logi('recombobulating splines...')
     logi(f'compute_graph: {jobs=}')
@@ -506,6 +867,358 @@ def compute_graph(jobs):
     logi('=-!!'*40)
     return result
 
+def compute_graph_streaming(client:Client, jobs, result_jobs:Set[int] = set()):
+    r"""
+    Compute the task graph by submitting the jobs as futures and consuming
+    them in the order of their completion. The result of every job is
+    released as soon as it is finished instead of being gathered on the
+    client, so the memory of the client stays flat. Failed jobs are logged and
+    don't stop the remaining jobs.
+
+    Parameters
+    ----------
+    client : Client
+        The client of the cluster to compute the jobs on
+
+    jobs : List[dask.Delayed]
+        The list of jobs/tasks to compute
+
+    result_jobs : Set[int]
+        The indices of the jobs with a small result that is kept in their record
+
+    Returns
+    -------
+    A list with one small status record per job, a dictionary with the index
+    of the job, its key, its status (`finished` or `error`), the time until its
+    completion, for failed jobs the exception and for the finished jobs in
+    `result_jobs` the result
+    """
+    import dask.distributed
+
+    logi(f'compute_graph_streaming: submitting {len(jobs)} jobs')
+    start = startWatch()
+
+    futures = client.compute(jobs)
+
+    # distinct jobs might share the same key, e.g. identical no-op jobs
+    job_indices = {}
+    unique_futures = {}
+    for i, future in enumerate(futures):
+        job_indices.setdefault(future.key, []).append(i)
+        unique_futures.setdefault(future.key, future)
+
+    status = [ None ] * len(futures)
+    n_completed = 0
+    for future in dask.distributed.as_completed(list(unique_futures.values())):
+        elapsed, _ = stopWatch(start)
+        for i in job_indices[future.key]:
+            n_completed += 1
+            record = { 'job': i, 'key': str(future.key), 'status': future.status, 'elapsed': elapsed }
+            if future.status == 'error':
+                exception = future.exception()
+                record['exception'] = repr(exception)
+                loge(f'compute_graph_streaming: job {i} ({future.key}) failed after {elapsed:.2f}s: {exception!r}')
+                loge(''.join(traceback.format_tb(future.traceback())))
+            else:
+                if i in result_jobs:
+                    record['result'] = future.result()
+                logi(f'compute_graph_streaming: job {i} ({future.key}) finished after {elapsed:.2f}s'
+                     f'  [{n_completed}/{len(futures)}, {n_completed / elapsed:.2f} jobs/s]')
+            status[i] = record
+
+        # drop the result from the cluster memory without transferring it
+        for i in job_indices[future.key]:
+            futures[i].release()
+
+    elapsed, _ = stopWatch(start)
+    n_failed = len([ record for record in status if record['status'] == 'error' ])
+    logi(f'compute_graph_streaming: {len(status) - n_failed} jobs finished, {n_failed} failed in {elapsed:.2f}s')
+
+    return status
+
+
+# the options configuring the cluster and its workers, which are taken from the
+# command line of the server for the recipes submitted to it
+SERVER_OPTIONS = [ 'worker', 'mem', 'memory_aware', 'cluster', 'single_threaded', 'slurm', 'partition', 'nodelist'
+                 , 'tmpdir', 'profile', 'fault_tolerant', 'resume' ]
+
+
+def execute_recipe(options, client:Client, dataset_cache=None):
+    r"""
+    Prepare the task graph of the recipe and compute it
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the launcher
+
+    client : Client
+        The client of the cluster, or None in single-threaded mode
+
+    dataset_cache : Optional[recipe_server.DatasetCache]
+        The cache of the datasets read in the plotting phase, when running as server
+    """
+    from utility import profiling
+    from utility import fault_tolerance
+
+    if options.profile:
+        profiling.enable_profiling()
+        profile_output = options.profile_output or options.tmpdir
+        report_name = pathlib.Path(options.recipe).stem
+    start = startWatch()
+
+    with profiling.profile_section('prepare', 'process_recipe', options.recipe):
+        data_repo, job_list, n_export_jobs = process_recipe(options, dataset_cache=dataset_cache)
+
+    # the indices of the jobs, for recording the finished ones
+    job_indices = list(range(0, len(job_list)))
+    if options.resume:
+        finished_jobs = fault_tolerance.get_finished_jobs(options.state_directory)
+        job_indices = [ i for i in job_indices if i not in finished_jobs ]
+        logi(f'resuming: skipping the {len(job_list) - len(job_indices)} jobs finished in earlier runs')
+        job_list = [ job_list[i] for i in job_indices ]
+
+    # the positions of the jobs of the exporters in `job_list`
+    export_jobs = set([ k for k, i in enumerate(job_indices) if i < n_export_jobs ])
+
+    if options.profile and options.profile_dask and client is not None:
+        pathlib.Path(profile_output).mkdir(parents=True, exist_ok=True)
+        report_context = profiling.dask_performance_report(f'{profile_output}/{report_name}_dask_performance.html')
+    else:
+        report_context = contextlib.nullcontext()
+
+    # now actually compute the constructed computation graph
+    try:
+        if len(job_list) == 0:
+            # e.g. when resuming a finished evaluation, the summary is still written
+            loge('No tasks to run')
+            return
+
+        with report_context:
+            if options.streaming and client is not None:
+                result = compute_graph_streaming(client, job_list, result_jobs=export_jobs)
+                finished_jobs = [ job_indices[record['job']] for record in result if record['status'] == 'finished' ]
+                exported_rows = [ record.get('result') for record in result if record['job'] in export_jobs ]
+            else:
+                if options.streaming:
+                    logw('streaming execution requires a dask client, computing the graph at once')
+                result = compute_graph(job_list)
+                finished_jobs = job_indices
+                exported_rows = [ result[k] for k in export_jobs ]
+        if options.fault_tolerant:
+            fault_tolerance.add_finished_jobs(finished_jobs, options.state_directory)
+    finally:
+        if options.fault_tolerant:
+            write_fault_tolerance_summary(options)
+
+    if options.profile:
+        total_wall_time, _ = stopWatch(start)
+        records = profiling.collect_records(client)
+        summary = profiling.write_report(records, profile_output, report_name, total_wall_time=total_wall_time)
+        logi(f'profile per stage:\n{summary}')
+
+    # the streaming execution continues after failed jobs, the run still has to fail
+    n_failed = len(job_list) - len(finished_jobs)
+    if n_failed > 0:
+        raise Exception(f'{n_failed} of {len(job_list)} jobs failed')
+
+    # e.g. the input files couldn't be opened by the workers
+    exported_rows = [ rows for rows in exported_rows if rows is not None ]
+    if len(exported_rows) > 0 and sum(exported_rows) == 0:
+        if options.watch_files is not None:
+            logw('execute_recipe: the new input files contained no data to export')
+        else:
+            raise Exception('the exporters wrote no data, all the extracted DataFrames are empty;'
+                            ' check the `input_files` of the extractors and the log of the workers')
+
+
+def refresh_plots(options, client:Client, reader_fingerprints:dict):
+    r"""
+    Run the plotting tasks whose input data changed since the last call,
+    determined by the fingerprints of the input files of the readers
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the launcher
+
+    client : Client
+        The client of the cluster, or None in single-threaded mode
+
+    reader_fingerprints : dict
+        The fingerprints of the readers at the last call, updated in place
+    """
+    import data_io
+
+    recipe = load_recipe(options.recipe, [ 'plot' ])
+    if not hasattr(recipe, 'plot'):
+        return
+
+    def get_items(section):
+        return [ (list(t.keys())[0], list(t.values())[0]) for t in getattr(recipe.plot, section, None) or [] ]
+
+    affected = set()
+    for reader_name, reader in get_items('reader'):
+        fingerprint = get_files_fingerprint(data_io.FileWatcher.get_files(reader.input_files))
+        if reader_fingerprints.get(reader_name) != fingerprint:
+            reader_fingerprints[reader_name] = fingerprint
+            affected.add(reader_name)
+
+    # the datasets derived from the changed ones
+    for _, transform in get_items('transforms'):
+        if get_input_dataset_names(transform).intersection(affected):
+            affected.add(transform.output_dataset_name)
+
+    plot_run_tree = { 'evaluation': { 'extractors': set(), 'transforms': set(), 'exporter': set() }
+                    , 'plot': { 'reader': set([ name for name, _ in get_items('reader') ])
+                              , 'transforms': set([ name for name, _ in get_items('transforms') ])
+                              , 'tasks': set([ name for name, task in get_items('tasks') if task.dataset_name in affected ]) } }
+    if options.run_tree:
+        for phase in plot_run_tree['plot']:
+            plot_run_tree['plot'][phase] &= options.run_tree['plot'][phase]
+
+    if len(plot_run_tree['plot']['tasks']) == 0:
+        logi('refresh_plots: no plots affected by the new data')
+        return
+
+    logi(f'refresh_plots: refreshing {plot_run_tree["plot"]["tasks"]}')
+    plot_options = copy.copy(options)
+    plot_options.plot_only = True
+    plot_options.eval_only = False
+    plot_options.run_tree = plot_run_tree
+    execute_recipe(plot_options, client)
+
+
+def watch(options, client:Client):
+    r"""
+    Watch the input files of the extractors of the recipe and run the
+    evaluation phase for every batch of newly completed files, until
+    interrupted. The exporters concatenating their input save the data of
+    batch `n` to `<output_filename stem>_batch-<n>.<suffix>`, so a failed batch
+    is retried by overwriting its own files. A batch is recorded in
+    `<tmpdir>/<recipe>_watch.json`, with its input and output files, once all
+    its jobs finished, so a restarted watch continues with the files not yet
+    processed.
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the launcher
+
+    client : Client
+        The client of the cluster, or None in single-threaded mode
+    """
+    import data_io
+
+    state_file = pathlib.Path(options.tmpdir) / f'{pathlib.Path(options.recipe).stem}_watch.json'
+    if state_file.exists():
+        with open(state_file, 'r') as f:
+            batches = json.load(f)['batches']
+        logi(f'watch: {len(batches)} batches processed in earlier runs, from {state_file}')
+    else:
+        batches = []
+    processed = set().union(*[ batch['input_files'] for batch in batches ])
+
+    watcher = data_io.FileWatcher(stable_time=options.stable_time, marker_suffix=options.marker_suffix)
+    reader_fingerprints = {}
+
+    logi(f'watch: looking for new input files every {options.watch_interval}s')
+    while True:
+        recipe = load_recipe(options.recipe, [ 'evaluation' ])
+
+        extractor_files = {}
+        for extractor_tuple in getattr(recipe.evaluation, 'extractors', None) or []:
+            extractor_name = list(extractor_tuple.keys())[0]
+            extractor = list(extractor_tuple.values())[0]
+            if options.run_tree and not extractor_name in options.run_tree['evaluation']['extractors']:
+                continue
+            extractor_files[extractor_name] = data_io.FileWatcher.get_files(extractor.input_files)
+
+        new_files = sorted(set().union(*extractor_files.values()).difference(processed))
+        complete = set(watcher.get_complete_files(new_files))
+        logd(f'watch: {len(new_files)} new input files, {len(complete)} complete')
+
+        if len(complete) > 0:
+            batch_options = copy.copy(options)
+            batch_options.eval_only = True
+            batch_options.plot_only = False
+            batch_options.watch_files = { name: [ data_io.FileWatcher.get_literal_path(f) for f in files if f in complete ]
+                                          for name, files in extractor_files.items() if complete.intersection(files) }
+            # the number of a failed batch is reused by its retry
+            batch_options.watch_batch = len(batches)
+
+            logi(f'watch: processing batch {batch_options.watch_batch} with {len(complete)} new input files: {sorted(complete)}')
+            try:
+                execute_recipe(batch_options, client)
+            except Exception as e:
+                loge(f'watch: processing the new input files failed, retrying with the next batch: {e!r}')
+                loge(''.join(traceback.format_exception(e)))
+            else:
+                output_files = []
+                for exporter_tuple in recipe.evaluation.exporter or []:
+                    exporter_name = list(exporter_tuple.keys())[0]
+                    exporter = list(exporter_tuple.values())[0]
+                    if not exporter.concatenate:
+                        continue
+                    if exporter_name in options.export_overrides:
+                        exporter.output_filename = options.export_overrides[exporter_name]
+                    output_file = exporter.get_batch_filename(batch_options.watch_batch)
+                    if pathlib.Path(output_file).exists():
+                        output_files.append(output_file)
+
+                batches.append({ 'input_files': sorted(complete), 'output_files': output_files })
+                processed.update(complete)
+                with open(state_file, 'w') as f:
+                    json.dump({ 'batches': batches }, f, indent=2)
+
+                if options.refresh_plots and not options.eval_only:
+                    try:
+                        refresh_plots(options, client, reader_fingerprints)
+                    except Exception as e:
+                        loge(f'watch: refreshing the plots failed: {e!r}')
+                        loge(''.join(traceback.format_exception(e)))
+
+        time.sleep(options.watch_interval)
+
+
+def serve(options, client:Client):
+    r"""
+    Run as server, executing the recipes submitted to the socket `options.socket`
+    on the cluster of `client`, see `recipe_server`
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary containing the configuration for the server
+
+    client : Client
+        The client of the cluster, or None in single-threaded mode
+    """
+    server_directory = os.getcwd()
+
+    def execute_submission(arguments, dataset_cache):
+        submission_options = parse_arguments(arguments)
+        for name in SERVER_OPTIONS:
+            setattr(submission_options, name, getattr(options, name))
+        set_logging_level(submission_options.log_level)
+        if client is not None:
+            # the relative paths in the recipe are resolved by the workers
+            # against the directory of the submission, like by the server
+            client.run(os.chdir, os.getcwd())
+        try:
+            execute_recipe(submission_options, client, dataset_cache=dataset_cache)
+        finally:
+            set_logging_level(options.log_level)
+            if client is not None:
+                client.run(os.chdir, server_directory)
+
+    server = recipe_server.RecipeServer(options.socket, execute_submission, max_datasets=options.cache_datasets)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        logi('serve: interrupted')
+
+
 def main():
     setup_logging_defaults(logging.WARNING)
 
@@ -516,24 +1229,47 @@ def main():
 
     logd(f'{options=}')
 
+    if options.submit:
+        arguments = [ argument for argument in sys.argv[1:] if argument != '--submit' ]
+        sys.exit(recipe_server.submit(options.socket, arguments))
+
+    if options.stop_server:
+        recipe_server.send_request(options.socket, { 'command': 'shutdown' })
+        logi(f'stopped the server at {options.socket}')
+        return
+
+    if options.dump_recipe_only:
+        # neither a cluster nor the modules of the phases not dumped are needed
+        dump_recipe(load_recipe(options.recipe, get_phases(options)))
+        return
+
     setup_pandas()
 
+    if options.fault_tolerant:
+        from utility import fault_tolerance
+
+        if not options.resume:
+            fault_tolerance.reset_state(options.state_directory)
+        setup_fault_tolerance(options)
+        logi(f'fault-tolerant extraction with {options.retries} retries, state in {options.state_directory}')
+
     client = setup_dask(options)
 
-    # register constructors for all YAML objects
-    extractors.register_constructors()
-    transforms.register_constructors()
-    exporters.register_constructors()
-    plots.register_constructors()
+    if options.memory_aware:
+        setup_memory_aware_extraction(client, options)
 
-    data_repo, job_list = process_recipe(options)
+    if options.serve:
+        serve(options, client)
+        return
 
-    if len(job_list) == 0:
-        loge('No tasks to run')
+    if options.watch:
+        try:
+            watch(options, client)
+        except KeyboardInterrupt:
+            logi('watch: interrupted')
         return
 
-    # now actually compute the constructed computation graph
-    result = compute_graph(job_list)
+    execute_recipe(options, client)
 
     # ...
     return
@@ -552,3 +1288,5 @@ if __name__=='__main__':
             ipdb.post_mortem(e.__traceback__)
         else:
             loge('not dropping into an interactive debugging environment since the executing interpreter is not interactive')
+
+        sys.exit(1)
@@ -84,6 +84,7 @@ class OmnetppTableModel:
                               , sqla.Column('vectorId', sqla.Integer, nullable=False, primary_key=True)
                               , sqla.Column('moduleName', sqla.String, nullable=False)
                               , sqla.Column('vectorName', sqla.String, nullable=False)
+                              , sqla.Column('vectorCount', sqla.Integer)
                              )
     r"""
     Equivalent SQLite statement:
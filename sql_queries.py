@@ -1,3 +1,5 @@
+from typing import Optional, Tuple
+
 import sqlalchemy as sqla
 
 from sql_model import OmnetppTableModel as TM
@@ -38,6 +40,50 @@ The equivalent SQL query:
 """
 signal_names_query = sqla.select(TM.vector_table.c.vectorName)
 
+r"""
+Query the number of pages and the size of a page of the database, i.e. the
+size of the database file.
+The equivalent SQL query:
+
+.. code-block:: sql
+
+ PRAGMA page_count;
+ PRAGMA page_size;
+
+"""
+page_count_query = sqla.text('PRAGMA page_count')
+page_size_query = sqla.text('PRAGMA page_size')
+
+r"""
+Query the largest `rowId` in the `vectorData` table.
+The equivalent SQL query:
+
+.. code-block:: sql
+
+ SELECT max(rowId) FROM vectorData;
+
+"""
+max_row_id_query = sqla.select(sqla.func.max(TM.vectorData_table.c.rowId))
+
+
+def generate_vector_count_query(where_clause:Optional[sqla.sql.elements.ColumnElement] = None):
+    r"""
+    Query the `vectorId`, `vectorName` and the number of rows in `vectorData`
+    (`vectorCount`) of the vectors selected by `where_clause`, or of all
+    vectors if no clause is given.
+    The equivalent SQL query:
+
+    .. code-block:: sql
+
+     SELECT vectorId, vectorName, vectorCount FROM vector WHERE <where_clause>;
+
+    """
+    query = sqla.select(TM.vector_table.c.vectorId, TM.vector_table.c.vectorName, TM.vector_table.c.vectorCount)
+    if where_clause is not None:
+        query = query.where(where_clause)
+    return query.order_by(TM.vector_table.c.vectorId)
+
+
 r"""
 Query the `scalar` table and return all the rows contained in it.
 The equivalent SQL query:
@@ -245,9 +291,12 @@ def generate_signal_query(signal_name:str, value_label:str='value'
                           , moduleName:bool=True
                           , simtimeRaw:bool=True
                           , eventNumber:bool=False
+                          , vector_id_range:Optional[Tuple[int, int]]=None
+                          , row_id_range:Optional[Tuple[int, int]]=None
                           ):
     return generate_data_query(TM.vector_table.c.vectorName == signal_name, value_label=value_label
-                               , moduleName=moduleName, simtimeRaw=simtimeRaw, eventNumber=eventNumber)
+                               , moduleName=moduleName, simtimeRaw=simtimeRaw, eventNumber=eventNumber
+                               , vector_id_range=vector_id_range, row_id_range=row_id_range)
 
 
 def generate_signal_like_query(signal_name_pattern:str, value_label:str='value'
@@ -255,9 +304,12 @@ def generate_signal_like_query(signal_name_pattern:str, value_label:str='value'
                           , moduleName:bool=True
                           , simtimeRaw:bool=True
                           , eventNumber:bool=False
+                          , vector_id_range:Optional[Tuple[int, int]]=None
+                          , row_id_range:Optional[Tuple[int, int]]=None
                           ):
     return generate_data_query(TM.vector_table.c.vectorName.like(signal_name_pattern), value_label=value_label
-                               , vectorName=vectorName, moduleName=moduleName, simtimeRaw=simtimeRaw, eventNumber=eventNumber)
+                               , vectorName=vectorName, moduleName=moduleName, simtimeRaw=simtimeRaw, eventNumber=eventNumber
+                               , vector_id_range=vector_id_range, row_id_range=row_id_range)
 
 
 def generate_signal_for_module_query(signal_name:str, module_name:str, value_label='value'
@@ -283,7 +335,16 @@ def generate_data_query(where_clause:sqla.sql.elements.ColumnElement
                         , moduleName:bool=True
                         , simtimeRaw:bool=True
                         , eventNumber:bool=False
+                        , vector_id_range:Optional[Tuple[int, int]]=None
+                        , row_id_range:Optional[Tuple[int, int]]=None
                         ):
+    r"""
+    Extract the data of the vectors selected by `where_clause`, optionally
+    restricted to the vectors with a `vectorId` within the inclusive range
+    `vector_id_range` and to the rows of `vectorData` with a `rowId` within
+    the inclusive range `row_id_range`, e.g. for extracting a large file in
+    multiple parts
+    """
     columns = []
     if vectorName:
         columns.append(TM.vector_table.c.vectorName)
@@ -307,6 +368,11 @@ def generate_data_query(where_clause:sqla.sql.elements.ColumnElement
                               where_clause
                              )
 
+    if vector_id_range is not None:
+        query = query.where(TM.vector_table.c.vectorId.between(*vector_id_range))
+    if row_id_range is not None:
+        query = query.where(TM.vectorData_table.c.rowId.between(*row_id_range))
+
     return query
 
 
@@ -395,24 +461,24 @@ def get_signal_with_position(x_signal:str, y_signal:str
 
     # get the vectorIds for the x & y position signals
     pxidsq = sqla.select(TM.vector_table.c.vectorId, TM.vector_table.c.moduleName) \
-              .where(TM.vector_table.c.vectorName == x_signal)
+              .where(TM.vector_table.c.vectorName == x_signal).subquery()
     pyidsq = sqla.select(TM.vector_table.c.vectorId, TM.vector_table.c.moduleName) \
-              .where(TM.vector_table.c.vectorName == y_signal)
+              .where(TM.vector_table.c.vectorName == y_signal).subquery()
 
     # get the data for the x & y position vectorIds, each within a given interval
     pxs = sqla.select(pxidsq.c.moduleName
                       , TM.vectorData_table.c.eventNumber
                       , TM.vectorData_table.c.simtimeRaw
                       , TM.vectorData_table.c.value
-                      ).join(TM.vectorData_table
-                             , TM.vectorData_table.c.vectorId == pxidsq.c.vectorId)
+                      ).select_from(pxidsq.join(TM.vectorData_table
+                             , TM.vectorData_table.c.vectorId == pxidsq.c.vectorId))
 
     pys = sqla.select(pyidsq.c.moduleName
                       , TM.vectorData_table.c.eventNumber
                       , TM.vectorData_table.c.simtimeRaw
                       , TM.vectorData_table.c.value
-                      ).join(TM.vectorData_table
-                             , TM.vectorData_table.c.vectorId == pyidsq.c.vectorId)
+                      ).select_from(pyidsq.join(TM.vectorData_table
+                             , TM.vectorData_table.c.vectorId == pyidsq.c.vectorId))
 
     # apply geographic restriction: check if the position is within a rectangular area
     if restriction:
@@ -421,21 +487,25 @@ def get_signal_with_position(x_signal:str, y_signal:str
         pxs = pxs.where(TM.vectorData_table.c.value <= x_max).where(TM.vectorData_table.c.value >= x_min)
         pys = pys.where(TM.vectorData_table.c.value <= y_max).where(TM.vectorData_table.c.value >= y_min)
 
+    # the columns of a `Select` are only accessible through a subquery
+    pxs = pxs.subquery()
+    pys = pys.subquery()
+
     # join x & y positions over the eventNumber
     position_join = sqla.join(pxs, pys, pxs.c.eventNumber == pys.c.eventNumber)
 
     # select the proper columns
     positions = sqla.select(pxs.c.moduleName, pxs.c.eventNumber, pxs.c.simtimeRaw
                     , pxs.c.value.label('px'), pys.c.value.label('py')
-                    ).select_from(position_join)
+                    ).select_from(position_join).subquery()
 
     # get the actual signal values
     vals = sqla.select(TM.vector_table.c.vectorId, TM.vectorData_table.c.eventNumber, TM.vectorData_table.c.value) \
-              .where(TM.vector_table.c.vectorName == signal_name \
-                      ).join(
+              .select_from(TM.vector_table.join(
                               TM.vectorData_table
                               , TM.vectorData_table.c.vectorId == TM.vector_table.c.vectorId
-                              )
+                              )) \
+              .where(TM.vector_table.c.vectorName == signal_name).subquery()
 
     columns = []
     if moduleName:
@@ -1,4 +1,5 @@
 import operator
+import os
 from typing import Union, List, Callable, Optional
 
 from collections import defaultdict
@@ -12,11 +13,12 @@ from yaml import YAMLObject
 import numpy as np
 import pandas as pd
 
-import matplotlib
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-
-import seaborn as sb
+# the plotting libraries are only imported when a code fragment uses them
+from utility.lazy_import import LazyModule
+matplotlib = LazyModule('matplotlib')
+mpl = matplotlib
+plt = LazyModule('matplotlib.pyplot')
+sb = LazyModule('seaborn')
 
 import dask
 
@@ -24,7 +26,13 @@ from yaml_helper import decode_node, proto_constructor
 
 from common.logging_facilities import logi, loge, logd, logw
 
-from extractors import DataAttributes
+from extractors import BaseExtractor, DataAttributes
+
+from common.constants import AGGREGATION_WINDOW
+
+from utility.code_cache import get_code_cache
+from utility import quantile_sketch
+from utility.profiling import profiled
 
 # for debugging purposes
 from common.debug import start_ipython_dbg_cmdline
@@ -100,6 +108,7 @@ class ExtraCodeFunctionMixin:
         Compile and evaluate the given function and an additional, optional
         code fragment within a separate global environment and return the
         executable function object.
+        The result is cached in the worker process, see `utility.code_cache.CompiledCodeCache`.
 
         Parameters
         ----------
@@ -111,21 +120,15 @@ class ExtraCodeFunctionMixin:
             the definition of a function over multiple lines or split into multiple
             functions for readibility.
         """
-        # create a copy of the global environment for evaluating the extra
-        # code fragment so as to not pollute the global namespace itself
-        global_env = globals().copy()
-
-        if type(extra_code) == str:
-            # compile the code fragment
-            compiled_extra_code = compile(extra_code, filename='<string>', mode='exec')
-            # actually evaluate the code within the given namespace to allow
-            # access to all the defined symbols, such as helper functions that are not defined inline
-            eval(compiled_extra_code, global_env)
-
         if isinstance(function, Callable):
-            evaluated_function = function
-        else:
-            evaluated_function = eval(function, global_env)
+            return function
+
+        # The compiled code objects and the evaluated function are cached per
+        # worker process, keyed by the source of `function` and `extra_code`,
+        # so that this is only done once per worker and not for every task.
+        # The evaluation happens in a copy of the global environment so as to
+        # not pollute the global namespace itself.
+        evaluated_function = get_code_cache().get_function(function, extra_code, globals())
 
         return evaluated_function
 
@@ -150,6 +153,7 @@ class ConcatTransform(Transform, YAMLObject):
         self.dataset_names = dataset_names
         self.output_dataset_name = output_dataset_name
 
+    @profiled('transform', detail='self.output_dataset_name')
     def concat(self, dfs:List[pd.DataFrame]):
         r = pd.concat(dfs)
         return r
@@ -181,6 +185,9 @@ class MergeTransform(Transform, YAMLObject):
 
     Basically a wrapper around `pandas.merge <https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.merge.html>`_
 
+    Categorical key columns are aligned to the union of the categories of both
+    sides before joining, so the keys aren't cast to `object`.
+
     Parameters
     ----------
     dataset_name_left: str
@@ -204,10 +211,33 @@ class MergeTransform(Transform, YAMLObject):
     matching_attribute: str
         the attribute to match the datasets on
 
+    join_strategy: str
+        the join algorithm, either one of:
+            - `hash`: a generic hash join with `pandas.merge`
+            - `sorted`: a sort-merge join over the key columns, the inputs are sorted if necessary
+            - `auto`: use the sort-merge join if both inputs are already sorted by the key columns, a hash join otherwise
+
+    broadcast_side: str
+        which dataset to broadcast, either one of:
+            - `left` or `right`: the `DataFrame`s of the given dataset are
+              concatenated once and every `DataFrame` of the other dataset is
+              joined with the result. This is useful if one side is small,
+              e.g. a per-run table, since the broadcast data is transferred
+              only once to every worker instead of once for every pair of inputs.
+            - `none`: pair the inputs as given by `match_by_filename`
+            - `auto`: if the inputs aren't matched by `matching_attribute`,
+              broadcast a dataset consisting of a single `DataFrame` while the
+              other consists of multiple, provided the input files of the
+              single `DataFrame` are not larger than those of an average
+              `DataFrame` of the other dataset. Matched inputs are never
+              broadcast, that would join data of different runs.
     """
 
     yaml_tag = u'!MergeTransform'
 
+    join_strategies = ['auto', 'hash', 'sorted']
+    broadcast_sides = ['auto', 'left', 'right', 'none']
+
     def __init__(self, dataset_name_left:str
                  , dataset_name_right:str
                  , output_dataset_name:str
@@ -215,6 +245,8 @@ class MergeTransform(Transform, YAMLObject):
                  , right_key_columns:Optional[List[str]] = None
                  , match_by_filename:bool = True
                  , matching_attribute:str = 'source_files'
+                 , join_strategy:str = 'auto'
+                 , broadcast_side:str = 'auto'
                  ):
         self.dataset_name_left = dataset_name_left
         self.dataset_name_right = dataset_name_right
@@ -226,27 +258,212 @@ class MergeTransform(Transform, YAMLObject):
         self.match_by_filename = match_by_filename
         self.matching_attribute = matching_attribute
 
+        if not join_strategy in self.join_strategies:
+            msg = f'Unknown join strategy for {type(self).__name__}: "{join_strategy}", expected one of {self.join_strategies}'
+            loge(msg)
+            raise(ValueError(msg))
+        self.join_strategy = join_strategy
+
+        if not broadcast_side in self.broadcast_sides:
+            msg = f'Unknown broadcast side for {type(self).__name__}: "{broadcast_side}", expected one of {self.broadcast_sides}'
+            loge(msg)
+            raise(ValueError(msg))
+        self.broadcast_side = broadcast_side
+
+    @staticmethod
+    def is_empty(df:Optional[pd.DataFrame]) -> bool:
+        return df is None or df.empty
+
+    @staticmethod
+    def get_key_columns(data_l:pd.DataFrame, data_r:pd.DataFrame
+                        , left_key_columns:Optional[Union[List[str], str]] = None
+                        , right_key_columns:Optional[Union[List[str], str]] = None):
+        r"""
+        Return the lists of key columns for both sides, defaulting to the
+        columns common to both inputs, like `pandas.merge`
+        """
+        if left_key_columns is None and right_key_columns is None:
+            common_columns = [ c for c in data_l.columns if c in data_r.columns ]
+            return common_columns, common_columns
+
+        if type(left_key_columns) == str:
+            left_key_columns = [left_key_columns]
+        if type(right_key_columns) == str:
+            right_key_columns = [right_key_columns]
+
+        return list(left_key_columns), list(right_key_columns)
+
+    @staticmethod
+    def align_categories(data_l:pd.DataFrame, data_r:pd.DataFrame
+                         , left_columns:List[str], right_columns:List[str]):
+        r"""
+        Set the categories of the categorical key columns of both inputs to
+        the union of the categories of both sides, so they can be joined
+        without being cast to `object`.
+        The inputs are shallow copied, the original `DataFrame`s are not modified.
+        """
+        data_l = data_l.copy(deep=False)
+        data_r = data_r.copy(deep=False)
+
+        for column_l, column_r in zip(left_columns, right_columns):
+            cl = data_l[column_l]
+            cr = data_r[column_r]
+            if isinstance(cl.dtype, pd.CategoricalDtype) and isinstance(cr.dtype, pd.CategoricalDtype):
+                if not cl.cat.categories.equals(cr.cat.categories):
+                    categories = cl.cat.categories.union(cr.cat.categories)
+                    data_l[column_l] = cl.cat.set_categories(categories)
+                    data_r[column_r] = cr.cat.set_categories(categories)
+            elif isinstance(cl.dtype, pd.CategoricalDtype):
+                data_l[column_l] = cl.astype(cr.dtype)
+            elif isinstance(cr.dtype, pd.CategoricalDtype):
+                data_r[column_r] = cr.astype(cl.dtype)
+
+        return data_l, data_r
+
+    @staticmethod
+    def is_sorted(data:pd.DataFrame, key_columns:List[str]) -> bool:
+        # check the leading key column first, that is cheap
+        if not data[key_columns[0]].is_monotonic_increasing:
+            return False
+        if len(key_columns) == 1:
+            return True
+        return pd.MultiIndex.from_frame(data[key_columns]).is_monotonic_increasing
+
+    def merge_sorted(self, data_l:pd.DataFrame, data_r:pd.DataFrame
+                     , left_key_columns:List[str], right_key_columns:List[str]):
+        r"""
+        Join the inputs on their sorted key columns. `pandas.Index.join` uses
+        a merge join without building a hash table if both indices are monotonic.
+        """
+        if not self.is_sorted(data_l, left_key_columns):
+            data_l = data_l.sort_values(by=left_key_columns, kind='stable')
+        if not self.is_sorted(data_r, right_key_columns):
+            data_r = data_r.sort_values(by=right_key_columns, kind='stable')
+
+        indexed_l = data_l.set_index(left_key_columns)
+        # the index levels need to have the same names for joining
+        indexed_r = data_r.set_index(right_key_columns).rename_axis(index=left_key_columns)
+
+        df_merged = indexed_l.join(indexed_r, how='inner', rsuffix='_r').reset_index()
+
+        # keep the key columns of the right side, like `pandas.merge`
+        for column_l, column_r in zip(left_key_columns, right_key_columns):
+            if column_l != column_r and not column_r in df_merged.columns:
+                df_merged[column_r] = df_merged[column_l]
+
+        # the columns in the order of `pandas.merge`, so the result has the
+        # same layout for either join strategy: the left columns, then the
+        # right columns without the keys shared with the left side
+        shared_keys = [ column_r for column_l, column_r in zip(left_key_columns, right_key_columns) if column_l == column_r ]
+        right_columns = [ f'{c}_r' if c in data_l.columns else c for c in data_r.columns if not c in shared_keys ]
+
+        return df_merged[list(data_l.columns) + right_columns]
+
+    @profiled('transform', detail='self.output_dataset_name')
     def merge(self, data_l:pd.DataFrame, data_r:pd.DataFrame
               , left_key_columns:Optional[List[str]] = None
               , right_key_columns:Optional[List[str]] = None):
-        def is_empty(df):
-            if not df is None:
-                if df.empty:
-                    return True
-                return False
-            return True
-
-        if is_empty(data_l):
+        if self.is_empty(data_l):
             logd(f'left input to merge is empty: {data_l=}')
             return None
-        if is_empty(data_l):
+        if self.is_empty(data_r):
             logd(f'right input to merge is empty: {data_r=}')
             return None
 
-        df_merged = data_l.merge(data_r, left_on=left_key_columns, right_on=right_key_columns, suffixes=['', '_r'])
+        keys_l, keys_r = self.get_key_columns(data_l, data_r, left_key_columns, right_key_columns)
+        data_l, data_r = self.align_categories(data_l, data_r, keys_l, keys_r)
+
+        use_sorted = False
+        if len(keys_l) > 0:
+            if self.join_strategy == 'sorted':
+                use_sorted = True
+            elif self.join_strategy == 'auto':
+                use_sorted = self.is_sorted(data_l, keys_l) and self.is_sorted(data_r, keys_r)
+
+        if use_sorted:
+            logd(f'MergeTransform: using sort-merge join on {keys_l=} {keys_r=}')
+            df_merged = self.merge_sorted(data_l, data_r, keys_l, keys_r)
+        else:
+            df_merged = data_l.merge(data_r, left_on=left_key_columns, right_on=right_key_columns, suffixes=['', '_r'])
         # start_ipython_dbg_cmdline(locals())
         return df_merged
 
+    @staticmethod
+    def estimate_size(data_list) -> Optional[int]:
+        r"""
+        Estimate the size of a dataset by the size of the input files it has
+        been extracted from, None if they are unknown or not accessible
+        """
+        source_files = set()
+        for _, attributes in data_list:
+            source_files.update(attributes.get_source_files())
+        if len(source_files) == 0:
+            return None
+        try:
+            return sum([ os.path.getsize(source_file) for source_file in source_files ])
+        except OSError:
+            return None
+
+    def get_broadcast_side(self, data_list_l, data_list_r) -> Optional[str]:
+        if self.broadcast_side in ['left', 'right']:
+            return self.broadcast_side
+        if self.broadcast_side == 'auto' and not self.match_by_filename:
+            for side, data_list_small, data_list_large in [ ('right', data_list_r, data_list_l), ('left', data_list_l, data_list_r) ]:
+                if not (len(data_list_small) == 1 and len(data_list_large) > 1):
+                    continue
+                size_small = self.estimate_size(data_list_small)
+                size_large = self.estimate_size(data_list_large)
+                if size_small is None or size_large is None:
+                    logd(f'{type(self).__name__}: the size of the inputs is unknown, not broadcasting')
+                    return None
+                if size_small <= size_large / len(data_list_large):
+                    return side
+        return None
+
+    def prepare_broadcast(self, side:str):
+        data_list_l = self.get_data(self.dataset_name_left)
+        data_list_r = self.get_data(self.dataset_name_right)
+
+        if side == 'left':
+            broadcast_list, partition_list = data_list_l, data_list_r
+        else:
+            broadcast_list, partition_list = data_list_r, data_list_l
+
+        # concatenate the broadcast side once; as a single key in the task
+        # graph, its result is only transferred once to every worker that
+        # needs it, instead of once for every pair
+        if len(broadcast_list) == 1:
+            broadcast_data = broadcast_list[0][0]
+        else:
+            broadcast_data = dask.delayed(pd.concat)(map(operator.itemgetter(0), broadcast_list), ignore_index=True)
+
+        broadcast_aliases = set()
+        for _, attributes in broadcast_list:
+            broadcast_aliases.update(attributes.get_aliases())
+
+        job_list = []
+
+        for data, attributes_p in partition_list:
+            if side == 'left':
+                job = dask.delayed(self.merge)(broadcast_data, data, self.left_key_columns, self.right_key_columns)
+            else:
+                job = dask.delayed(self.merge)(data, broadcast_data, self.left_key_columns, self.right_key_columns)
+
+            attributes = DataAttributes(partition=getattr(attributes_p, 'partition', None))
+            attributes.add_source_files(attributes_p.get_source_files())
+            for alias in attributes_p.get_aliases():
+                attributes.add_alias(alias)
+            for alias in broadcast_aliases:
+                attributes.add_alias(alias)
+
+            job_list.append((job, attributes))
+            logd(f'{attributes=}')
+
+        # allow other tasks to depend on the output of the delayed jobs
+        self.data_repo[self.output_dataset_name] = job_list
+
+        return job_list
+
     def prepare_matched_by_attribute(self):
         data_list_l = self.get_data(self.dataset_name_left)
         data_list_r = self.get_data(self.dataset_name_right)
@@ -256,11 +473,20 @@ class MergeTransform(Transform, YAMLObject):
         d = defaultdict(list)
 
         def add_by_attribute(data_list):
+            side = defaultdict(list)
             for data, attributes in data_list:
                 attribute = getattr(attributes, self.matching_attribute)
                 if type(attribute) == set:
                     attribute = '_'.join(list(attribute))
-                d[attribute].append((data, attributes))
+                side[attribute].append((data, attributes))
+
+            for attribute, items in side.items():
+                if len(items) == 1:
+                    d[attribute].append(items[0])
+                else:
+                    # a file extracted in multiple parts is merged as a whole
+                    data = dask.delayed(BaseExtractor.concat_partitions)(list(map(operator.itemgetter(0), items)))
+                    d[attribute].append((data, items[0][1]))
 
         add_by_attribute(data_list_l)
         add_by_attribute(data_list_r)
@@ -312,12 +538,141 @@ class MergeTransform(Transform, YAMLObject):
         return job_list
 
     def prepare(self):
+        data_list_l = self.get_data(self.dataset_name_left)
+        data_list_r = self.get_data(self.dataset_name_right)
+
+        if (side := self.get_broadcast_side(data_list_l, data_list_r)):
+            logi(f'{type(self).__name__}: broadcasting the {side} dataset')
+            return self.prepare_broadcast(side)
+
         if self.match_by_filename:
             return self.prepare_matched_by_attribute()
         else:
             return self.prepare_simple_sequential()
 
 
+class TimeAlignMergeTransform(MergeTransform, YAMLObject):
+    r"""
+    A transform for aligning the rows of two DataFrames, from two distinct
+    datasets, by time, e.g. for combining signals recorded at different events.
+    Every row of the left input is matched with the row of the right input
+    that is nearest in time, within the same partition given by `by`.
+
+    Basically a wrapper around `pandas.merge_asof <https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.merge_asof.html>`_
+    The inputs are paired, or broadcast, the same way as for `MergeTransform`.
+
+    Parameters
+    ----------
+    dataset_name_left: str
+        the left dataset to operate on
+
+    dataset_name_right: str
+        the right dataset to operate on
+
+    output_dataset_name: str
+        the name given to the output dataset
+
+    on: str
+        the name of the column with the time of the samples in both datasets
+
+    by: Optional[List[str]]
+        the columns that have to match exactly before aligning by time
+
+    direction: str
+        whether to match the previous (`backward`), the next (`forward`) or the
+        `nearest` row of the right dataset
+
+    tolerance: Optional[int]
+        the maximum distance in time between matched rows, in the unit of the
+        `on` column
+
+    allow_exact_matches: bool
+        whether to match rows with the same time
+
+    match_by_filename: bool
+        whether to match merge input by the filename the data has been extracted from
+
+    matching_attribute: str
+        the attribute to match the datasets on
+
+    broadcast_side: str
+        which dataset to broadcast, see `MergeTransform`
+    """
+
+    yaml_tag = u'!TimeAlignMergeTransform'
+
+    directions = ['backward', 'forward', 'nearest']
+
+    def __init__(self, dataset_name_left:str
+                 , dataset_name_right:str
+                 , output_dataset_name:str
+                 , on:str = 'simtimeRaw'
+                 , by:Optional[List[str]] = ['moduleName']
+                 , direction:str = 'backward'
+                 , tolerance:Optional[int] = None
+                 , allow_exact_matches:bool = True
+                 , match_by_filename:bool = True
+                 , matching_attribute:str = 'source_files'
+                 , broadcast_side:str = 'auto'
+                 ):
+        super().__init__(dataset_name_left=dataset_name_left
+                         , dataset_name_right=dataset_name_right
+                         , output_dataset_name=output_dataset_name
+                         , left_key_columns=by
+                         , right_key_columns=by
+                         , match_by_filename=match_by_filename
+                         , matching_attribute=matching_attribute
+                         , broadcast_side=broadcast_side
+                         )
+
+        if not direction in self.directions:
+            msg = f'Unknown direction for TimeAlignMergeTransform: "{direction}", expected one of {self.directions}'
+            loge(msg)
+            raise(ValueError(msg))
+
+        self.on = on
+        self.by = by
+        self.direction = direction
+        self.tolerance = tolerance
+        self.allow_exact_matches = allow_exact_matches
+
+    def sort_by_time(self, data:pd.DataFrame) -> pd.DataFrame:
+        # `merge_asof` needs a numeric, sorted time column
+        if isinstance(data[self.on].dtype, pd.CategoricalDtype):
+            data = data.copy(deep=False)
+            data[self.on] = data[self.on].astype(data[self.on].cat.categories.dtype)
+        if not data[self.on].is_monotonic_increasing:
+            data = data.sort_values(by=self.on, kind='stable')
+        return data
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def merge(self, data_l:pd.DataFrame, data_r:pd.DataFrame
+              , left_key_columns:Optional[List[str]] = None
+              , right_key_columns:Optional[List[str]] = None):
+        if self.is_empty(data_l):
+            logd(f'left input to merge is empty: {data_l=}')
+            return None
+        if self.is_empty(data_r):
+            logd(f'right input to merge is empty: {data_r=}')
+            return None
+
+        if self.by:
+            data_l, data_r = self.align_categories(data_l, data_r, self.by, self.by)
+
+        data_l = self.sort_by_time(data_l)
+        data_r = self.sort_by_time(data_r)
+
+        df_merged = pd.merge_asof(data_l, data_r
+                                  , on=self.on
+                                  , by=self.by
+                                  , direction=self.direction
+                                  , tolerance=self.tolerance
+                                  , allow_exact_matches=self.allow_exact_matches
+                                  , suffixes=['', '_r']
+                                 )
+        return df_merged
+
+
 class FunctionTransform(Transform, ExtraCodeFunctionMixin, YAMLObject):
     r"""
     A transform for applying a arbitrary function to a whole DataFrame.
@@ -357,6 +712,7 @@ class FunctionTransform(Transform, ExtraCodeFunctionMixin, YAMLObject):
         self.function = function
         self.extra_code = extra_code
 
+    @profiled('transform', detail='self.output_dataset_name')
     def process(self, data, attributes) -> pd.DataFrame:
         if data is None or (not data is None and data.empty):
             return pd.DataFrame()
@@ -436,6 +792,7 @@ class ColumnFunctionTransform(Transform, ExtraCodeFunctionMixin, YAMLObject):
         self.function = function
         self.extra_code = extra_code
 
+    @profiled('transform', detail='self.output_dataset_name')
     def process(self, data, attributes):
         # Get the function to call and possibly compile and evaluate the code defined in
         # extra_code in a separate global namespace.
@@ -537,6 +894,7 @@ class GroupedAggregationTransform(Transform, ExtraCodeFunctionMixin, YAMLObject)
         self.raw = raw
         self.pre_concatenate = pre_concatenate
 
+    @profiled('transform', detail='self.output_dataset_name')
     def aggregate_frame(self, data):
         if (data.empty):
             logw(f'GroupedAggregationTransform return is empty!')
@@ -677,6 +1035,7 @@ class GroupedFunctionTransform(Transform, ExtraCodeFunctionMixin, YAMLObject):
         self.pre_concatenate = pre_concatenate
         self.aggregate = aggregate
 
+    @profiled('transform', detail='self.output_dataset_name')
     def aggregate_frame(self, data):
         if data.empty:
             logw(f'GroupedFunctionTransform return is empty!')
@@ -749,6 +1108,411 @@ class GroupedFunctionTransform(Transform, ExtraCodeFunctionMixin, YAMLObject):
 
         return jobs
 
+class WindowedAggregationTransform(Transform, YAMLObject):
+    r"""
+    A transform for aggregating the values in a column over time windows on
+    the `simtimeRaw` column, separately for every partition sharing the same
+    values in the given list of grouping columns.
+    All reductions are computed with vectorized pandas/numpy operations.
+
+    The supported window types are:
+        - `tumbling`: consecutive, non-overlapping windows of length `window_size`
+        - `hopping`: windows of length `window_size`, starting every `window_step`
+        - `rolling`: for every row, the window of length `window_size` ending at that row
+
+    For `tumbling` and `hopping` windows, every file is reduced to partial
+    aggregates (count, sum, mean, min, max and the sum of squared deviations)
+    per group and window. With `merge_files`, the partial aggregates of all
+    input files are combined, so windows spanning multiple files (and the
+    repetitions of a run) are merged without concatenating the raw data first.
+
+    Parameters
+    ----------
+    dataset_name: str
+        the dataset to operate on
+
+    output_dataset_name: str
+        the name given to the output dataset
+
+    input_column: str
+        the name of the column the reductions should be applied to
+
+    grouping_columns: List
+        the set of columns used for partitioning the dataset; rows with a
+        missing value in one of them are dropped
+
+    aggregation_functions: Union[List[str], str]
+        the reductions to compute for every window, any of `count`, `sum`,
+        `mean`, `min`, `max`, `var` and `std`
+
+    output_column: Optional[str]
+        the name of the output column, if only one reduction is computed.
+        Otherwise the output columns are named `<input_column>_<function>`.
+
+    window_type: str
+        the kind of window, either one of `tumbling`, `hopping` or `rolling`
+
+    window_size: int
+        the length of a window, in the unit of the time column (`simtimeRaw`)
+
+    window_step: Optional[int]
+        the distance between the starts of two consecutive `hopping` windows,
+        in the unit of the time column
+
+    window_offset: int
+        the start of the first window, in the unit of the time column
+
+    time_column: str
+        the name of the column with the time of the samples
+
+    merge_files: bool
+        whether to merge the windows of all input files into a single
+        `DataFrame` or to process every input file separately
+    """
+    yaml_tag = u'!WindowedAggregationTransform'
+
+    window_types = ['tumbling', 'hopping', 'rolling']
+    supported_functions = ['count', 'sum', 'mean', 'min', 'max', 'var', 'std']
+
+    def __init__(self, dataset_name:str, output_dataset_name:str
+                 , input_column:str
+                 , grouping_columns:List = []
+                 , aggregation_functions:Union[List[str], str] = ['mean']
+                 , output_column:Optional[str] = None
+                 , window_type:str = 'tumbling'
+                 , window_size:int = AGGREGATION_WINDOW
+                 , window_step:Optional[int] = None
+                 , window_offset:int = 0
+                 , time_column:str = 'simtimeRaw'
+                 , merge_files:bool = False
+                 ):
+        self.dataset_name = dataset_name
+        self.output_dataset_name = output_dataset_name
+
+        self.input_column = input_column
+        self.output_column = output_column
+
+        self.grouping_columns = list(grouping_columns) if grouping_columns else []
+
+        if type(aggregation_functions) == str:
+            aggregation_functions = [aggregation_functions]
+        for function in aggregation_functions:
+            if not function in self.supported_functions:
+                msg = f'Unsupported aggregation function for WindowedAggregationTransform: "{function}", expected one of {self.supported_functions}'
+                loge(msg)
+                raise(ValueError(msg))
+        self.aggregation_functions = aggregation_functions
+
+        if not window_type in self.window_types:
+            msg = f'Unknown window type for WindowedAggregationTransform: "{window_type}", expected one of {self.window_types}'
+            loge(msg)
+            raise(ValueError(msg))
+        self.window_type = window_type
+
+        self.window_size = int(window_size)
+        if window_type == 'hopping':
+            if not window_step:
+                msg = 'A `window_step` is required for hopping windows in WindowedAggregationTransform!'
+                loge(msg)
+                raise(ValueError(msg))
+            self.window_step = int(window_step)
+        else:
+            self.window_step = self.window_size
+        self.window_offset = int(window_offset)
+
+        if self.window_size <= 0 or self.window_step <= 0:
+            msg = 'The `window_size` and `window_step` of WindowedAggregationTransform have to be positive!'
+            loge(msg)
+            raise(ValueError(msg))
+
+        self.time_column = time_column
+        self.merge_files = merge_files
+
+    def get_output_column(self, function:str) -> str:
+        if self.output_column and len(self.aggregation_functions) == 1:
+            return self.output_column
+        return f'{self.input_column}_{function}'
+
+    def assign_windows(self, t:np.ndarray):
+        r"""
+        Assign every sample time in `t` to the windows containing it.
+        Returns the row indices into `t`, repeated for every window the row
+        belongs to, and the start of the corresponding windows.
+        """
+        t = t - self.window_offset
+        # the index of the latest window starting at or before the sample
+        last_window = np.floor_divide(t, self.window_step)
+        # the number of overlapping windows each sample can belong to
+        n_overlap = -(-self.window_size // self.window_step)
+
+        rows = []
+        starts = []
+        for k in range(0, n_overlap):
+            window = last_window - k
+            start = window * self.window_step
+            valid = (window >= 0) & (start + self.window_size > t)
+            rows.append(np.flatnonzero(valid))
+            starts.append(start[valid])
+
+        rows = np.concatenate(rows)
+        starts = np.concatenate(starts) + self.window_offset
+
+        return rows, starts
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def partial_aggregate(self, data:pd.DataFrame) -> pd.DataFrame:
+        r"""
+        Reduce the input to mergeable partial aggregates per group and window
+        """
+        if data is None or data.empty:
+            return pd.DataFrame()
+
+        t = data[self.time_column].to_numpy(dtype=np.int64)
+        rows, starts = self.assign_windows(t)
+
+        frame = data[self.grouping_columns].iloc[rows].reset_index(drop=True)
+        frame['windowStart'] = starts
+        frame['_value'] = data[self.input_column].to_numpy(dtype=np.float64)[rows]
+
+        grouped = frame.groupby(by=self.grouping_columns + ['windowStart'], sort=False, observed=True)['_value']
+        result = grouped.agg(['count', 'sum', 'mean', 'min', 'max'])
+        # the sum of squared deviations from the mean, for merging variances
+        result['m2'] = grouped.var(ddof=0) * result['count']
+
+        return result.reset_index()
+
+    def merge_partials(self, partials:List[pd.DataFrame]) -> pd.DataFrame:
+        r"""
+        Merge the partial aggregates of multiple inputs for the same group and window
+        """
+        partials = [ p for p in partials if not (p is None or p.empty) ]
+        if len(partials) == 0:
+            return pd.DataFrame()
+
+        data = pd.concat(partials, ignore_index=True)
+        keys = self.grouping_columns + ['windowStart']
+
+        # merge the sums of squared deviations (Chan et al.)
+        sums = data.groupby(by=keys, sort=False, observed=True)[['count', 'sum']].transform('sum')
+        merged_mean = sums['sum'] / sums['count']
+        data['m2'] = data['m2'] + (data['count'] * (data['mean'] - merged_mean)**2).fillna(0.)
+
+        result = data.groupby(by=keys, sort=False, observed=True).agg(count=('count', 'sum')
+                                                                     , sum=('sum', 'sum')
+                                                                     , min=('min', 'min')
+                                                                     , max=('max', 'max')
+                                                                     , m2=('m2', 'sum'))
+        result['mean'] = result['sum'] / result['count']
+
+        return result.reset_index()
+
+    def finalize(self, partial:pd.DataFrame) -> pd.DataFrame:
+        r"""
+        Compute the requested reductions from the partial aggregates
+        """
+        if partial is None or partial.empty:
+            logw(f'WindowedAggregationTransform result is empty!')
+            return pd.DataFrame()
+
+        result = partial[self.grouping_columns + ['windowStart']].copy()
+        result['windowEnd'] = result['windowStart'] + self.window_size
+
+        count = partial['count'].astype(np.float64)
+        for function in self.aggregation_functions:
+            match function:
+                case 'count' | 'sum' | 'mean' | 'min' | 'max':
+                    value = partial[function]
+                case 'var':
+                    value = partial['m2'] / (count - 1)
+                case 'std':
+                    value = np.sqrt(partial['m2'] / (count - 1))
+            result[self.get_output_column(function)] = value
+
+        logd(f'WindowedAggregationTransform result:\n{result}')
+        return result
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def aggregate_frame(self, data:pd.DataFrame) -> pd.DataFrame:
+        return self.finalize(self.partial_aggregate(data))
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def merge_and_finalize(self, partials:List[pd.DataFrame]) -> pd.DataFrame:
+        return self.finalize(self.merge_partials(partials))
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def rolling_aggregate(self, data:pd.DataFrame) -> pd.DataFrame:
+        r"""
+        Compute the requested reductions over the trailing window of every row
+        """
+        if data is None or data.empty:
+            logw(f'WindowedAggregationTransform result is empty!')
+            return pd.DataFrame()
+
+        if self.grouping_columns:
+            # rows without a group are dropped, like by the tumbling and hopping windows
+            data = data.dropna(subset=self.grouping_columns)
+
+        # time-based rolling windows require a datetime-like column, the raw
+        # simulation time is interpreted as nanoseconds for this
+        time_index = pd.to_datetime(data[self.time_column].to_numpy(dtype=np.int64), unit='ns')
+        frame = pd.DataFrame({'_time': time_index, '_value': data[self.input_column].to_numpy(dtype=np.float64)}
+                             , index=data.index)
+        for column in self.grouping_columns:
+            frame[column] = data[column]
+        frame = frame.sort_values(by='_time', kind='stable')
+
+        window = pd.Timedelta(self.window_size, unit='ns')
+        if self.grouping_columns:
+            grouped = frame.groupby(by=self.grouping_columns, sort=False, observed=True)
+            aggregates = grouped.rolling(window, on='_time')['_value'].agg(self.aggregation_functions)
+            # the result is ordered by group, then by time; map it back onto
+            # the index of the input rows (its last level is the time column
+            # given by `on`, not the index of the rows)
+            order = np.argsort(grouped.ngroup().to_numpy(), kind='stable')
+            aggregates.index = frame.index[order]
+        else:
+            aggregates = frame.set_index('_time')['_value'].rolling(window).agg(self.aggregation_functions)
+            aggregates.index = frame.index
+
+        aggregates = aggregates.rename(columns={ f: self.get_output_column(f) for f in self.aggregation_functions })
+
+        result = data.join(aggregates[[ self.get_output_column(f) for f in self.aggregation_functions ]])
+
+        logd(f'WindowedAggregationTransform result:\n{result}')
+        return result
+
+    def prepare(self):
+        data = self.get_data(self.dataset_name)
+
+        jobs = []
+
+        if self.window_type == 'rolling':
+            if self.merge_files:
+                # rolling windows need the raw samples of all files
+                concat_result = dask.delayed(pd.concat)(map(operator.itemgetter(0), data), ignore_index=True)
+                job = dask.delayed(self.rolling_aggregate)(concat_result)
+                attributes = DataAttributes(alias=self.input_column)
+                for _, a in data:
+                    attributes.add_source_files(a.get_source_files())
+                jobs.append((job, attributes))
+            else:
+                for d, attributes in data:
+                    job = dask.delayed(self.rolling_aggregate)(d)
+                    jobs.append((job, attributes))
+        else:
+            if self.merge_files:
+                # only the compact partial aggregates of every file are combined
+                partials = [ dask.delayed(self.partial_aggregate)(d) for d, _ in data ]
+                job = dask.delayed(self.merge_and_finalize)(partials)
+                attributes = DataAttributes(alias=self.input_column)
+                for _, a in data:
+                    attributes.add_source_files(a.get_source_files())
+                jobs.append((job, attributes))
+            else:
+                for d, attributes in data:
+                    job = dask.delayed(self.aggregate_frame)(d)
+                    jobs.append((job, attributes))
+
+        # allow other tasks to depend on the output of the delayed jobs
+        self.data_repo[self.output_dataset_name] = jobs
+
+        return jobs
+
+
+class SketchTransform(Transform, YAMLObject):
+    r"""
+    A transform for summarizing the distribution of the values in a column as
+    a mergeable quantile sketch (see `utility.quantile_sketch`), separately for
+    every partition sharing the same values in the given list of grouping columns.
+
+    A sketch is computed for every input `DataFrame` and, with `merge_files`,
+    the sketches of all input files are merged. The output is a compact
+    `DataFrame` with one row per centroid: the grouping columns, the centroid
+    mean in `input_column` and the columns `sketch_weight`, `sketch_min` and
+    `sketch_max`. It can be plotted as ECDF, box or violin plot by a
+    `PlottingTask` with `sketch` set, without the raw samples.
+
+    Parameters
+    ----------
+    dataset_name: str
+        the dataset to operate on
+
+    output_dataset_name: str
+        the name given to the output dataset
+
+    input_column: str
+        the name of the column with the values to summarize
+
+    grouping_columns: List
+        the set of columns used for partitioning the dataset, all columns
+        that are later used for plotting (e.g. `x`, `hue`, `row`, `column`)
+        need to be included
+
+    compression: int
+        the maximum number of centroids per sketch, higher values increase
+        the accuracy and the size of the sketch
+
+    merge_files: bool
+        whether to merge the sketches of all input files into a single
+        `DataFrame` or to process every input file separately
+    """
+    yaml_tag = u'!SketchTransform'
+
+    def __init__(self, dataset_name:str, output_dataset_name:str
+                 , input_column:str
+                 , grouping_columns:List = []
+                 , compression:int = quantile_sketch.DEFAULT_COMPRESSION
+                 , merge_files:bool = True
+                 ):
+        self.dataset_name = dataset_name
+        self.output_dataset_name = output_dataset_name
+
+        self.input_column = input_column
+        self.grouping_columns = list(grouping_columns) if grouping_columns else []
+
+        self.compression = int(compression)
+        self.merge_files = merge_files
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def sketch(self, data:pd.DataFrame) -> pd.DataFrame:
+        if data is None or data.empty:
+            return pd.DataFrame()
+
+        result = quantile_sketch.sketch_frame(data, self.input_column, self.grouping_columns
+                                              , compression=self.compression)
+        logd(f'SketchTransform: reduced {len(data)} rows to {len(result)} centroids')
+        return result
+
+    @profiled('transform', detail='self.output_dataset_name')
+    def merge(self, sketches:List[pd.DataFrame]) -> pd.DataFrame:
+        result = quantile_sketch.merge_sketch_frames(sketches, self.input_column, self.grouping_columns
+                                                     , compression=self.compression)
+        logd(f'SketchTransform result:\n{result}')
+        return result
+
+    def prepare(self):
+        data = self.get_data(self.dataset_name)
+
+        jobs = []
+
+        if self.merge_files:
+            sketches = [ dask.delayed(self.sketch)(d) for d, _ in data ]
+            job = dask.delayed(self.merge)(sketches)
+            attributes = DataAttributes(alias=self.input_column)
+            for _, a in data:
+                attributes.add_source_files(a.get_source_files())
+            jobs.append((job, attributes))
+        else:
+            for d, attributes in data:
+                job = dask.delayed(self.sketch)(d)
+                jobs.append((job, attributes))
+
+        # allow other tasks to depend on the output of the delayed jobs
+        self.data_repo[self.output_dataset_name] = jobs
+
+        return jobs
+
+
 def register_constructors():
     r"""
     Register YAML constructors for all transforms
@@ -759,4 +1523,7 @@ def register_constructors():
     yaml.add_constructor(u'!GroupedAggregationTransform', proto_constructor(GroupedAggregationTransform))
     yaml.add_constructor(u'!GroupedFunctionTransform', proto_constructor(GroupedFunctionTransform))
     yaml.add_constructor(u'!MergeTransform', proto_constructor(MergeTransform))
+    yaml.add_constructor(u'!TimeAlignMergeTransform', proto_constructor(TimeAlignMergeTransform))
+    yaml.add_constructor(u'!WindowedAggregationTransform', proto_constructor(WindowedAggregationTransform))
+    yaml.add_constructor(u'!SketchTransform', proto_constructor(SketchTransform))
 
@@ -0,0 +1,168 @@
+r"""
+Vectorized binning of scattered values onto a regular 2D grid, e.g. for heat
+maps of positions.
+
+The bin of every value is calculated with a floor division and the values of
+all bins are accumulated at once, with `np.bincount` for counts, sums and
+means, with `np.minimum.at`/`np.maximum.at` for minima and maxima, and with a
+single groupby over the flat bin index for any other reduction. The result is
+a dense grid, as expected by `pcolormesh`, without a pivot.
+"""
+
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+def get_bin_range(values:np.ndarray, bin_size:float) -> Tuple[int, int]:
+    r"""
+    Return the index of the first bin and the number of bins covering `values`.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return 0, 0
+    first = int(np.floor(values.min() / bin_size))
+    last = int(np.floor(values.max() / bin_size))
+    return first, last - first + 1
+
+
+def bin_2d(x:np.ndarray, y:np.ndarray, z:Optional[np.ndarray]
+           , bin_size:float
+           , reduction:Union[str, Callable] = 'mean'
+           , x_range:Optional[Tuple[int, int]] = None
+           , y_range:Optional[Tuple[int, int]] = None
+           , fill_value:float = np.nan) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r"""
+    Accumulate the values `z` at the positions (`x`, `y`) onto a grid of
+    square bins of width `bin_size`.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        the positions on the x-axis
+
+    y : np.ndarray
+        the positions on the y-axis
+
+    z : Optional[np.ndarray]
+        the values to reduce, may be None for the reduction `count`
+
+    bin_size : float
+        the width of the bins
+
+    reduction : Union[str, Callable]
+        the reduction applied to the values in every bin, either one of
+        `count`, `sum`, `mean`, `min`, `max` or any other reduction accepted by
+        `pandas.core.groupby.SeriesGroupBy.aggregate`
+
+    x_range : Optional[Tuple[int, int]]
+        the index of the first bin and the number of bins on the x-axis, see
+        `get_bin_range`. If None, the range is derived from `x`. Pass the same
+        ranges for all facets of a plot to get grids of the same shape.
+
+    y_range : Optional[Tuple[int, int]]
+        the index of the first bin and the number of bins on the y-axis
+
+    fill_value : float
+        the value of the empty bins
+
+    Returns
+    -------
+    The edges of the bins on the x-axis and on the y-axis, and the grid, with
+    one row per bin on the y-axis and one column per bin on the x-axis
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    if x_range is None:
+        x_range = get_bin_range(x, bin_size)
+    if y_range is None:
+        y_range = get_bin_range(y, bin_size)
+    x_first, nx = x_range
+    y_first, ny = y_range
+
+    x_edges = (x_first + np.arange(0, nx + 1)) * bin_size
+    y_edges = (y_first + np.arange(0, ny + 1)) * bin_size
+
+    xi = np.floor(x / bin_size) - x_first
+    yi = np.floor(y / bin_size) - y_first
+    valid = (xi >= 0) & (xi < nx) & (yi >= 0) & (yi < ny)
+    if z is not None:
+        z = np.asarray(z, dtype=np.float64)
+        valid &= ~np.isnan(z)
+        z = z[valid]
+
+    # the flat index of the bin of every value, in row-major order of the grid
+    flat = yi[valid].astype(np.int64) * nx + xi[valid].astype(np.int64)
+    size = nx * ny
+
+    counts = np.bincount(flat, minlength=size)
+
+    match reduction:
+        case 'count':
+            values = counts.astype(np.float64)
+        case 'sum':
+            values = np.bincount(flat, weights=z, minlength=size)
+        case 'mean':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.bincount(flat, weights=z, minlength=size) / counts
+        case 'min':
+            values = np.full(size, np.inf)
+            np.minimum.at(values, flat, z)
+        case 'max':
+            values = np.full(size, -np.inf)
+            np.maximum.at(values, flat, z)
+        case _:
+            values = np.full(size, np.nan)
+            reduced = pd.Series(z).groupby(flat).aggregate(reduction)
+            values[reduced.index.to_numpy()] = reduced.to_numpy()
+
+    if reduction != 'count':
+        values = np.where(counts > 0, values, fill_value)
+
+    return x_edges, y_edges, values.reshape(ny, nx)
+
+
+def count_pixels(x:np.ndarray, y:np.ndarray
+                 , extent:Tuple[float, float, float, float]
+                 , shape:Tuple[int, int]) -> np.ndarray:
+    r"""
+    Count the points (`x`, `y`) falling into every pixel of an image covering
+    `extent`. The cost is linear in the number of points and the result only
+    depends on the size of the image.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        the positions on the x-axis
+
+    y : np.ndarray
+        the positions on the y-axis
+
+    extent : Tuple[float, float, float, float]
+        the area covered by the image, as (left, right, bottom, top)
+
+    shape : Tuple[int, int]
+        the number of pixels on the x-axis and on the y-axis
+
+    Returns
+    -------
+    The counts, with one row per pixel on the y-axis, starting at the bottom
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    left, right, bottom, top = extent
+    nx, ny = shape
+
+    # points on the upper boundary are counted in the last pixel
+    xi = np.floor((x - left) / (right - left) * nx) if right > left else np.zeros(len(x))
+    yi = np.floor((y - bottom) / (top - bottom) * ny) if top > bottom else np.zeros(len(y))
+    xi = np.where(xi == nx, nx - 1, xi)
+    yi = np.where(yi == ny, ny - 1, yi)
+    valid = (xi >= 0) & (xi < nx) & (yi >= 0) & (yi < ny)
+
+    flat = yi[valid].astype(np.int64) * nx + xi[valid].astype(np.int64)
+
+    return np.bincount(flat, minlength=nx * ny).reshape(ny, nx)
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from common.logging_facilities import logd
+
+from common.constants import CODE_CACHE_SIZE
+
+
+class CompiledCodeCache:
+    r"""
+    A LRU cache for code fragments that are compiled and evaluated from a
+    recipe, such as the `function` and `extra_code` parameters of a transform.
+
+    Code objects can't be serialized, so the compilation has to happen in the
+    worker process. Every worker process holds its own instance of this cache
+    (see `get_code_cache`), so every distinct code fragment is only compiled and
+    evaluated once per worker instead of once per task.
+
+    The entries are keyed by a hash of the source code of the function and of
+    the extra code fragment.
+
+    Parameters
+    ----------
+    maxsize : int
+        The maximum number of compiled code objects and the maximum number of
+        evaluated functions to keep.
+    """
+    def __init__(self, maxsize:int = CODE_CACHE_SIZE):
+        self.maxsize = maxsize
+
+        self.code_objects = OrderedDict()
+        self.functions = OrderedDict()
+
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_key(*fragments:Optional[str]) -> str:
+        r"""
+        Calculate the cache key for the given code fragments
+        """
+        h = hashlib.sha1()
+        for fragment in fragments:
+            # distinguish between `None` and the empty string
+            h.update(b'\x00' if fragment is None else b'\x01' + fragment.encode('utf-8'))
+            h.update(b'\xff')
+        return h.hexdigest()
+
+    def _lookup(self, cache:OrderedDict, key:str):
+        with self.lock:
+            if key in cache:
+                cache.move_to_end(key)
+                self.hits += 1
+                return cache[key]
+            self.misses += 1
+            return None
+
+    def _insert(self, cache:OrderedDict, key:str, value):
+        with self.lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+
+    def compile(self, source:str, mode:str = 'exec'):
+        r"""
+        Compile the given source code or return the cached code object.
+
+        Parameters
+        ----------
+        source : str
+            The source code to compile
+
+        mode : str
+            The compilation mode, see `compile`
+        """
+        key = self.hash_key(mode, source)
+        code = self._lookup(self.code_objects, key)
+        if code is None:
+            code = compile(source, filename='<string>', mode=mode)
+            self._insert(self.code_objects, key, code)
+        return code
+
+    def get_function(self, function:str, extra_code:Optional[str], global_env:dict) -> Callable:
+        r"""
+        Return the function object the expression `function` evaluates to,
+        after evaluating the code fragment `extra_code`, within a copy of the
+        given global environment.
+
+        Parameters
+        ----------
+        function : str
+            The expression evaluating to the function, e.g. a lambda or the
+            name of a function defined in `extra_code`.
+
+        extra_code : Optional[str]
+            The additional code fragment evaluated before `function`.
+
+        global_env : dict
+            The global environment to copy and evaluate the code in. The name
+            of the module is part of the cache key, so the same code evaluated
+            in different modules results in distinct entries.
+        """
+        key = self.hash_key(global_env.get('__name__'), function, extra_code)
+        evaluated_function = self._lookup(self.functions, key)
+        if evaluated_function is not None:
+            return evaluated_function
+
+        # create a copy of the global environment for evaluating the extra
+        # code fragment so as to not pollute the global namespace itself
+        env = global_env.copy()
+
+        if type(extra_code) == str:
+            # actually evaluate the code within the given namespace to allow
+            # access to all the defined symbols, such as helper functions that are not defined inline
+            eval(self.compile(extra_code, mode='exec'), env)
+
+        evaluated_function = eval(self.compile(function, mode='eval'), env)
+
+        self._insert(self.functions, key, evaluated_function)
+        logd(f'CompiledCodeCache: added {key=}  {self.hits=}  {self.misses=}')
+
+        return evaluated_function
+
+    def clear(self):
+        with self.lock:
+            self.code_objects.clear()
+            self.functions.clear()
+
+
+# every (worker) process importing this module holds its own cache
+_code_cache = CompiledCodeCache()
+
+def get_code_cache() -> CompiledCodeCache:
+    r"""
+    Return the code cache of the current (worker) process
+    """
+    return _code_cache
@@ -0,0 +1,258 @@
+r"""
+Fault-tolerant extraction with retries, a quarantine of failing input files
+and checkpoints for resuming an interrupted evaluation.
+
+Every extraction task of a file (or of a part of a file, see
+`extraction_planning`) is executed with `run_checkpointed`:
+
+- a failed extraction is retried up to `retries` times, with an exponential
+  backoff starting at `backoff` seconds, for transient failures like a busy
+  network filesystem
+- a file whose extraction still fails, or whose extraction was started more
+  than `retries` times without finishing, e.g. because the worker executing it
+  was killed for exceeding its memory, is put into quarantine. Its tasks then
+  return an empty `DataFrame`, like a file without matching data, so the
+  remaining files are still processed
+- the result of every finished task is written as checkpoint, so that an
+  evaluation interrupted by a crash can be resumed with `run_recipe.py
+  --resume`, which only extracts the files without a checkpoint
+
+The state is kept in files in a state directory shared by all workers, by
+default in the directory for temporary files:
+
+- `checkpoints/<task id>.pickle`: the result of a finished task
+- `attempts/<task id>`: the number of times a task was started, removed when it finishes
+- `quarantine/<file id>.json`: the path of a quarantined file, the reason and the run it failed in
+- `jobs.json`: the indices of the jobs of the task graph finished so far
+
+Like the profiling, fault tolerance is enabled per process, in the launcher
+and in every worker, and disabled by default. The extraction tasks are then
+built without any wrapper.
+"""
+
+from typing import Callable, Iterable, List, Optional, Set
+
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import shutil
+import time
+
+import pandas as pd
+
+from common.logging_facilities import logi, loge, logd, logw
+
+_enabled = False
+_state_directory = None
+_retries = 2
+_backoff = 5.0
+_run_id = None
+
+
+def enable_fault_tolerance(state_directory:str, retries:int = 2, backoff:float = 5.0, run_id:Optional[str] = None):
+    r"""
+    Enable fault-tolerant extraction in this process
+
+    Parameters
+    ----------
+    state_directory : str
+        the directory for the checkpoints, the attempt counters and the
+        quarantine, shared by all workers
+
+    retries : int
+        the number of times a failed extraction task is retried
+
+    backoff : float
+        the delay before the first retry, in seconds, doubled for every further retry
+
+    run_id : Optional[str]
+        the identifier of the current run, recorded for the files quarantined in it
+    """
+    global _enabled, _state_directory, _retries, _backoff, _run_id
+    _enabled = True
+    _state_directory = pathlib.Path(state_directory)
+    _retries = retries
+    _backoff = backoff
+    _run_id = run_id
+
+
+def is_fault_tolerance_enabled() -> bool:
+    return _enabled
+
+
+def get_file_id(db_file:str) -> str:
+    r"""
+    Return an identifier for `db_file` usable as file name, its name and a hash of its absolute path
+    """
+    path = os.path.abspath(db_file)
+    return f'{pathlib.PurePath(path).stem}_{hashlib.sha1(path.encode()).hexdigest()[:12]}'
+
+
+def get_task_id(name:str, db_file:str, *parameters) -> str:
+    r"""
+    Return an identifier for the extraction task of extractor `name` for
+    `db_file`, distinguished by `parameters`, e.g. the partition of the file
+    """
+    key = '|'.join([ name, os.path.abspath(db_file) ] + [ repr(p) for p in parameters ])
+    return f'{name}_{pathlib.PurePath(db_file).stem}_{hashlib.sha1(key.encode()).hexdigest()[:12]}'
+
+
+def _write_atomically(path:pathlib.Path, data:bytes):
+    r"""
+    Write `data` to `path` via a temporary file, so that an interrupted write
+    never leaves a truncated file behind
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+def reset_state(state_directory:str):
+    r"""
+    Remove the checkpoints, attempt counters, quarantine and finished jobs in
+    `state_directory`, for starting an evaluation from scratch
+    """
+    for name in [ 'checkpoints', 'attempts', 'quarantine' ]:
+        shutil.rmtree(pathlib.Path(state_directory) / name, ignore_errors=True)
+    pathlib.Path(state_directory, 'jobs.json').unlink(missing_ok=True)
+
+
+def get_quarantine(state_directory:Optional[str] = None) -> List[dict]:
+    r"""
+    Return the records of all quarantined files, with the keys `file`,
+    `task`, `reason`, `attempts`, `run_id` and `time`
+    """
+    quarantine_path = pathlib.Path(state_directory or _state_directory) / 'quarantine'
+    records = []
+    for path in sorted(quarantine_path.glob('*.json')):
+        try:
+            with open(path, 'r') as f:
+                records.append(json.load(f))
+        except Exception as e:
+            logw(f'get_quarantine: could not read {path}: {e!r}')
+    return records
+
+
+def is_quarantined(db_file:str) -> bool:
+    return (_state_directory / 'quarantine' / f'{get_file_id(db_file)}.json').exists()
+
+
+def quarantine(db_file:str, task_id:str, reason:str, attempts:int):
+    r"""
+    Put `db_file` into quarantine, so that it is skipped by all extraction tasks
+    """
+    record = { 'file': db_file, 'task': task_id, 'reason': reason, 'attempts': attempts
+              , 'run_id': _run_id, 'time': time.time() }
+    _write_atomically(_state_directory / 'quarantine' / f'{get_file_id(db_file)}.json', json.dumps(record).encode())
+    loge(f'quarantine: {db_file} quarantined after {attempts} attempts: {reason}')
+
+
+def _read_attempts(path:pathlib.Path) -> int:
+    try:
+        return int(path.read_text())
+    except (OSError, ValueError):
+        return 0
+
+
+def run_checkpointed(task_id:str, function:Callable, db_file:str, *args, **kwargs):
+    r"""
+    Call `function(db_file, *args, **kwargs)`, the extraction of `db_file`,
+    with retries and checkpointing. The result is restored from the
+    checkpoint of `task_id` if there is one. If `db_file` is quarantined or
+    all attempts fail, an empty `DataFrame` is returned.
+
+    Parameters
+    ----------
+    task_id : str
+        the identifier of the task, see `get_task_id`
+
+    function : Callable
+        the function extracting the data, raising an exception on failure
+
+    db_file : str
+        the path to the input file
+    """
+    if not _enabled:
+        return function(db_file, *args, **kwargs)
+
+    checkpoint_path = _state_directory / 'checkpoints' / f'{task_id}.pickle'
+    if checkpoint_path.exists():
+        try:
+            with open(checkpoint_path, 'rb') as f:
+                result = pickle.load(f)
+            logd(f'run_checkpointed: restored {task_id} for {db_file} from {checkpoint_path}')
+            return result
+        except Exception as e:
+            logw(f'run_checkpointed: could not restore {task_id} from {checkpoint_path}, extracting it again: {e!r}')
+
+    if is_quarantined(db_file):
+        logw(f'run_checkpointed: skipping {task_id} since {db_file} is quarantined')
+        return pd.DataFrame()
+
+    # the counter persists the attempts over crashes of the worker process
+    attempts_path = _state_directory / 'attempts' / task_id
+    attempts = _read_attempts(attempts_path)
+    if attempts > _retries:
+        quarantine(db_file, task_id, f'the extraction was started {attempts} times without finishing, the worker was possibly lost', attempts)
+        return pd.DataFrame()
+
+    error = None
+    while attempts <= _retries:
+        if error is not None:
+            delay = _backoff * 2**(attempts - 1)
+            logw(f'run_checkpointed: attempt {attempts} of {task_id} for {db_file} failed, retrying in {delay:.1f}s: {error!r}')
+            time.sleep(delay)
+
+        attempts += 1
+        _write_atomically(attempts_path, str(attempts).encode())
+        try:
+            result = function(db_file, *args, **kwargs)
+        except Exception as e:
+            error = e
+            continue
+
+        # pickled to preserve the index and the dtypes exactly
+        _write_atomically(checkpoint_path, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        attempts_path.unlink(missing_ok=True)
+        return result
+
+    quarantine(db_file, task_id, repr(error), attempts)
+    attempts_path.unlink(missing_ok=True)
+    return pd.DataFrame()
+
+
+def get_finished_jobs(state_directory:Optional[str] = None) -> Set[int]:
+    r"""
+    Return the indices of the jobs of the task graph recorded as finished
+    """
+    try:
+        with open(pathlib.Path(state_directory or _state_directory) / 'jobs.json', 'r') as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+
+def add_finished_jobs(indices:Iterable[int], state_directory:Optional[str] = None):
+    r"""
+    Record the jobs with the given indices as finished
+    """
+    state_directory = pathlib.Path(state_directory or _state_directory)
+    finished = get_finished_jobs(state_directory).union(indices)
+    _write_atomically(state_directory / 'jobs.json', json.dumps(sorted(finished)).encode())
+
+
+def summarize(state_directory:Optional[str] = None, run_id:Optional[str] = None) -> dict:
+    r"""
+    Summarize the inputs not extracted: the files `failed` and put into
+    quarantine in the run `run_id`, and the files `skipped` because they were
+    quarantined in an earlier run
+    """
+    run_id = run_id or _run_id
+    records = get_quarantine(state_directory)
+    failed = [ record for record in records if record['run_id'] == run_id ]
+    skipped = [ record for record in records if record['run_id'] != run_id ]
+    return { 'run_id': run_id, 'failed': failed, 'skipped': skipped }
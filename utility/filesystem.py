@@ -1,7 +1,10 @@
+import hashlib
 import os
 import pathlib
 import tempfile
 
+from typing import List
+
 from common.logging_facilities import logi, loge, logd, logw
 
 def check_file_access_permissions(target_file:str):
@@ -29,3 +32,18 @@ def check_directory_access_permissions(target_directory:str):
             os.unlink(path)
     except PermissionError as e:
         raise PermissionError(f'Unable to write to output directory, check access permissions for directory "{target_directory}":\n{e}')
+
+def get_files_fingerprint(paths:List[str], *extra) -> str:
+    r"""
+    Calculate a fingerprint of the given files from their paths, sizes and
+    modification times, without reading their content. Any additional
+    arguments, e.g. the parameters used for reading the files, are included
+    via their `repr`.
+    """
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        h.update(f'{path}\x00{stat.st_size}\x00{stat.st_mtime_ns}\n'.encode('utf-8'))
+    for value in extra:
+        h.update(repr(value).encode('utf-8'))
+    return h.hexdigest()
@@ -0,0 +1,43 @@
+r"""
+Modules imported on first use.
+
+The code fragments of a recipe are evaluated in the global namespace of the
+module evaluating them, e.g. in `transforms`, which therefore provides a base
+set of libraries like `matplotlib` and `seaborn` under their usual names. Most
+recipes never use them, so they are bound to a `LazyModule` that only imports
+the library once one of its attributes is accessed.
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    r"""
+    A placeholder for the module `name`, importing it on the first access of
+    one of its attributes. Submodules not imported by the package itself, e.g.
+    `pyplot` of `matplotlib`, are imported on access too.
+
+    Parameters
+    ----------
+    name : str
+        The absolute name of the module, e.g. `matplotlib.pyplot`
+    """
+    def __init__(self, name:str):
+        super().__init__(name)
+
+    def __getattr__(self, attribute:str):
+        # only called for the attributes not defined on the placeholder itself
+        module = importlib.import_module(self.__name__)
+        try:
+            value = getattr(module, attribute)
+        except AttributeError:
+            try:
+                value = importlib.import_module(f'{self.__name__}.{attribute}')
+            except ModuleNotFoundError:
+                raise AttributeError(f'module {self.__name__!r} has no attribute {attribute!r}') from None
+        setattr(self, attribute, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f'LazyModule({self.__name__!r})'
@@ -0,0 +1,357 @@
+r"""
+Lightweight instrumentation of the tasks of a recipe.
+
+Functions decorated with `profiled` record one entry per call with the wall
+time, the CPU time of the calling thread, the number of rows passed in and
+returned, the size of the input file read, the size of the output file written
+and the peak resident set size of the process. The recording is disabled by
+default and the decorated functions are called directly, so the overhead of
+an unprofiled run is a single check.
+
+The records are kept in the process executing the task, i.e. in the dask
+worker, and are collected with `collect_records` after the computation. The
+stages nest, e.g. the time of an `extract` record includes the time of the
+`tags` and `sql` records of the same call. Calls nested within a call of the
+same stage are not recorded separately, so the records of one stage don't
+overlap.
+
+The workers execute several tasks in parallel threads, so the CPU time is
+measured per thread (`time.thread_time`) and doesn't include the time of the
+other tasks of the worker. It also doesn't include the time of threads started
+by the task itself, e.g. by pyarrow. The `peak_rss` is the high-water mark of
+the resident set size of the whole worker process over its lifetime, not a
+peak of the task; `peak_rss_growth` is how much the call raised that mark.
+"""
+
+from typing import Callable, List, Optional
+
+import functools
+import inspect
+import os
+import pathlib
+import resource
+import socket
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+from common.logging_facilities import logi, loge, logd, logw
+
+from utility.stopwatch import startWatch, stopWatch
+
+PROFILE_COLUMNS = ['stage', 'name', 'detail', 'start', 'wall_time', 'cpu_time'
+                   , 'rows_in', 'rows_out', 'bytes_read', 'bytes_written'
+                   , 'peak_rss', 'peak_rss_growth', 'worker', 'thread', 'error']
+
+_enabled = False
+_records = []
+_lock = threading.Lock()
+# the stages currently being recorded in each thread
+_active = threading.local()
+
+
+def enable_profiling(enabled:bool = True):
+    r"""
+    Enable or disable the recording of profiling records in this process
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def is_profiling_enabled() -> bool:
+    return _enabled
+
+
+def get_peak_rss() -> int:
+    r"""
+    Return the peak resident set size of this process, in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # the unit of `ru_maxrss` is kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def count_rows(value) -> Optional[int]:
+    r"""
+    Return the number of rows of a `DataFrame`, or the total number of rows of
+    a list or tuple of `DataFrame`s, or None for anything else
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        counts = [ count_rows(v) for v in value ]
+        counts = [ c for c in counts if c is not None ]
+        return sum(counts) if counts else None
+    return None
+
+
+def get_file_size(path) -> Optional[int]:
+    if not isinstance(path, (str, pathlib.Path)):
+        return None
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+def add_record(record:dict):
+    with _lock:
+        _records.append(record)
+
+
+def pop_records() -> List[dict]:
+    r"""
+    Return the records of this process and clear them
+    """
+    global _records
+    with _lock:
+        records = _records
+        _records = []
+    return records
+
+
+def collect_records(client=None) -> pd.DataFrame:
+    r"""
+    Collect the records of this process and, if a client is given, of all the
+    workers of its cluster into a `DataFrame` with the columns in
+    `PROFILE_COLUMNS`
+
+    Parameters
+    ----------
+    client : Optional[dask.distributed.Client]
+        the client of the cluster the tasks ran on
+    """
+    records = pop_records()
+    if client is not None:
+        try:
+            for worker_records in client.run(pop_records).values():
+                records.extend(worker_records)
+        except Exception as e:
+            loge(f'collect_records: could not collect the profiling records of the workers: {e!r}')
+
+    return pd.DataFrame.from_records(records, columns=PROFILE_COLUMNS)
+
+
+def _lookup(arguments:dict, path:Optional[str]):
+    r"""
+    Resolve `path`, the name of an argument optionally followed by attribute
+    names, e.g. `self.output_file`, in the bound `arguments` of a call
+    """
+    if path is None:
+        return None
+    name, *attributes = path.split('.')
+    value = arguments.get(name)
+    for attribute in attributes:
+        value = getattr(value, attribute, None)
+    return value
+
+
+@contextmanager
+def profile_section(stage:str, name:str, detail:Optional[str] = None):
+    r"""
+    Record the wall and CPU time of the enclosed block, if profiling is enabled
+    """
+    if not _enabled:
+        yield
+        return
+
+    start_time = time.time()
+    rss_before = get_peak_rss()
+    start = startWatch()
+    start_cpu_time = time.thread_time()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        wall_time, _ = stopWatch(start)
+        cpu_time = time.thread_time() - start_cpu_time
+        peak_rss = get_peak_rss()
+        add_record({ 'stage': stage, 'name': name, 'detail': detail
+                    , 'start': start_time, 'wall_time': wall_time, 'cpu_time': cpu_time
+                    , 'peak_rss': peak_rss, 'peak_rss_growth': peak_rss - rss_before
+                    , 'worker': f'{socket.gethostname()}:{os.getpid()}'
+                    , 'thread': threading.current_thread().name
+                    , 'error': error })
+
+
+@contextmanager
+def dask_performance_report(filename:str):
+    r"""
+    Write a dask performance report of the computations in the enclosed block
+    to `filename`. A failure to generate the report is logged and doesn't
+    affect the computation.
+    """
+    import dask.distributed
+
+    report = dask.distributed.performance_report(filename=filename)
+    try:
+        report.__enter__()
+    except Exception as e:
+        loge(f'dask_performance_report: could not start the performance report: {e!r}')
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            report.__exit__(None, None, None)
+            logi(f'dask_performance_report: wrote the dask performance report to {filename}')
+        except Exception as e:
+            loge(f'dask_performance_report: could not write the performance report to {filename}: {e!r}')
+
+
+def profiled(stage:str, detail:Optional[str] = None
+             , input_file:Optional[str] = None, output_file:Optional[str] = None) -> Callable:
+    r"""
+    Decorator recording a profiling record for every call of the decorated
+    function, if profiling is enabled. The rows in are counted over all
+    `DataFrame` arguments, the rows out over the return value.
+
+    Parameters
+    ----------
+    stage : str
+        the stage of the processing the function belongs to, e.g. `extract` or `plot`
+
+    detail : Optional[str]
+        the argument, optionally followed by attribute names, describing the
+        call in the report, e.g. `db_file` or `self.output_file`
+
+    input_file : Optional[str]
+        the argument holding the path of the file read, the size of the file
+        is recorded as the bytes read
+
+    output_file : Optional[str]
+        the argument holding the path of the file written, the size of the file
+        after the call is recorded as the bytes written
+    """
+    def decorator(function:Callable) -> Callable:
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active_stages = _active.__dict__.setdefault('stages', set())
+            if not _enabled or stage in active_stages:
+                return function(*args, **kwargs)
+
+            try:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+            except TypeError:
+                arguments = {}
+
+            rows_in = count_rows(list(args) + list(kwargs.values()))
+            bytes_read = get_file_size(_lookup(arguments, input_file))
+            description = _lookup(arguments, detail)
+
+            start_time = time.time()
+            rss_before = get_peak_rss()
+            start = startWatch()
+            # the process time would include the other tasks running in the worker
+            start_cpu_time = time.thread_time()
+            result = None
+            error = None
+            active_stages.add(stage)
+            try:
+                result = function(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                active_stages.discard(stage)
+                wall_time, _ = stopWatch(start)
+                cpu_time = time.thread_time() - start_cpu_time
+                peak_rss = get_peak_rss()
+                add_record({ 'stage': stage, 'name': function.__qualname__
+                            , 'detail': None if description is None else str(description)
+                            , 'start': start_time, 'wall_time': wall_time, 'cpu_time': cpu_time
+                            , 'rows_in': rows_in, 'rows_out': count_rows(result)
+                            , 'bytes_read': bytes_read
+                            , 'bytes_written': get_file_size(_lookup(arguments, output_file))
+                            , 'peak_rss': peak_rss, 'peak_rss_growth': peak_rss - rss_before
+                            , 'worker': f'{socket.gethostname()}:{os.getpid()}'
+                            , 'thread': threading.current_thread().name
+                            , 'error': error })
+
+        return wrapper
+
+    return decorator
+
+
+def summarize_records(records:pd.DataFrame, by:List[str]) -> pd.DataFrame:
+    r"""
+    Aggregate the records per group of `by`, sorted by the total wall time
+    """
+    summary = records.groupby(by=by, dropna=False, sort=False).agg(
+                    calls=('wall_time', 'size')
+                    , wall_time=('wall_time', 'sum')
+                    , wall_time_max=('wall_time', 'max')
+                    , cpu_time=('cpu_time', 'sum')
+                    , rows_in=('rows_in', lambda x: x.sum(min_count=1))
+                    , rows_out=('rows_out', lambda x: x.sum(min_count=1))
+                    , bytes_read=('bytes_read', lambda x: x.sum(min_count=1))
+                    , bytes_written=('bytes_written', lambda x: x.sum(min_count=1))
+                    , peak_rss=('peak_rss', 'max')
+                    , errors=('error', 'count')
+                    )
+    summary['rows_out_per_s'] = summary['rows_out'] / summary['wall_time']
+    summary['cpu_utilization'] = summary['cpu_time'] / summary['wall_time']
+
+    return summary.sort_values('wall_time', ascending=False).reset_index()
+
+
+def write_report(records:pd.DataFrame, output_directory:str, report_name:str, total_wall_time:Optional[float] = None):
+    r"""
+    Write the records to `<report_name>_profile.csv` and
+    `<report_name>_profile.feather`, and a summary per stage and per function
+    to `<report_name>_profile.html`, in `output_directory`
+
+    Parameters
+    ----------
+    records : pd.DataFrame
+        the records, as returned by `collect_records`
+
+    output_directory : str
+        the directory to write the report to
+
+    report_name : str
+        the prefix of the names of the report files, usually the name of the recipe
+
+    total_wall_time : Optional[float]
+        the wall time of the whole run, for reference in the summary
+    """
+    output_path = pathlib.Path(output_directory)
+    output_path.mkdir(parents=True, exist_ok=True)
+    base_name = str(output_path / f'{report_name}_profile')
+
+    records.to_csv(f'{base_name}.csv', index=False)
+    records.reset_index(drop=True).to_feather(f'{base_name}.feather')
+
+    by_stage = summarize_records(records, ['stage'])
+    by_function = summarize_records(records, ['stage', 'name'])
+    slowest = records.sort_values('wall_time', ascending=False).head(25)
+
+    float_format = lambda x: f'{x:.3f}'
+    sections = [ f'<h1>Profile of {report_name}</h1>'
+               , f'<p>{len(records)} records from {records["worker"].nunique()} processes'
+                 + (f', total wall time {total_wall_time:.3f}s' if total_wall_time is not None else '')
+                 + '. The times of nested stages, e.g. <code>tags</code> and <code>sql</code> within <code>extract</code>, are included in both.</p>'
+               , '<h2>Per stage</h2>', by_stage.to_html(index=False, float_format=float_format)
+               , '<h2>Per function</h2>', by_function.to_html(index=False, float_format=float_format)
+               , '<h2>Slowest calls</h2>', slowest.to_html(index=False, float_format=float_format)
+               ]
+    with open(f'{base_name}.html', 'w') as f:
+        f.write('<html><head><meta charset="utf-8"><title>Profile of ' + report_name + '</title></head><body>\n')
+        f.write('\n'.join(sections))
+        f.write('\n</body></html>\n')
+
+    logi(f'write_report: wrote the profile of {len(records)} calls to {base_name}.{{csv,feather,html}}')
+
+    return by_stage
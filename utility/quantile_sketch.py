@@ -0,0 +1,240 @@
+r"""
+A mergeable quantile sketch in the style of a
+`t-digest <https://arxiv.org/abs/1902.04023>`_, implemented with vectorized
+numpy operations.
+
+A sketch summarizes the distribution of a set of samples as a list of
+centroids, i.e. (mean, weight) pairs, plus the exact minimum and maximum.
+The centroids are small near the tails and large in the middle of the
+distribution, so quantiles near the tails are estimated more accurately. The
+number of centroids is bounded by the `compression` parameter, independently
+of the number of samples.
+
+Sketches are merged by concatenating their centroids and compressing them again.
+
+In a `DataFrame`, a sketch is stored in long format, with one row per
+centroid, the grouping columns identifying the sketch, the centroid mean in
+the value column and the columns `SKETCH_WEIGHT`, `SKETCH_MIN` and `SKETCH_MAX`.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SKETCH_WEIGHT = 'sketch_weight'
+SKETCH_MIN = 'sketch_min'
+SKETCH_MAX = 'sketch_max'
+
+SKETCH_COLUMNS = [SKETCH_WEIGHT, SKETCH_MIN, SKETCH_MAX]
+
+DEFAULT_COMPRESSION = 100
+
+
+def compress(group_ids:np.ndarray, values:np.ndarray, weights:np.ndarray
+             , compression:int = DEFAULT_COMPRESSION) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r"""
+    Compress the weighted samples of all groups into centroids, using the
+    arcsine scale function of the t-digest.
+
+    Parameters
+    ----------
+    group_ids : np.ndarray
+        the dense integer id of the group of each sample
+
+    values : np.ndarray
+        the value of each sample, or the mean of each centroid
+
+    weights : np.ndarray
+        the weight of each sample (1 for raw samples) or centroid
+
+    compression : int
+        the maximum number of centroids per group
+
+    Returns
+    -------
+    The group id, mean and weight of each centroid, sorted by group id and mean
+    """
+    if len(values) == 0:
+        return group_ids, values, weights
+
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    order = np.lexsort((values, group_ids))
+    g = group_ids[order]
+    v = values[order]
+    w = weights[order]
+
+    n_groups = g[-1] + 1
+    totals = np.bincount(g, weights=w, minlength=n_groups)
+
+    # the cumulative weight before every sample, relative to the start of its group
+    cumulative = np.cumsum(w) - w
+    group_starts = np.searchsorted(g, np.arange(0, n_groups))
+    group_offsets = cumulative[np.minimum(group_starts, len(g) - 1)]
+    q = (cumulative - group_offsets[g] + w / 2) / totals[g]
+
+    # map the quantile of every sample onto the scale function and merge all
+    # samples within one unit of the scale into a centroid
+    k = compression * (np.arcsin(np.clip(2 * q - 1, -1, 1)) / np.pi + 0.5)
+    cluster = np.minimum(np.floor(k).astype(np.int64), compression - 1)
+
+    key = g * compression + cluster
+    unique_keys, inverse = np.unique(key, return_inverse=True)
+    centroid_weights = np.bincount(inverse, weights=w)
+    centroid_means = np.bincount(inverse, weights=w * v) / centroid_weights
+    centroid_groups = unique_keys // compression
+
+    return centroid_groups, centroid_means, centroid_weights
+
+
+def sketch_frame(data:pd.DataFrame, value_column:str, grouping_columns:List[str]
+                 , weight_column:Optional[str] = None
+                 , compression:int = DEFAULT_COMPRESSION) -> pd.DataFrame:
+    r"""
+    Build the sketches of the values in `value_column` for every partition
+    sharing the same values in `grouping_columns`.
+    If `weight_column` is given, the rows are treated as centroids of existing
+    sketches, which are merged, and the `SKETCH_MIN` and `SKETCH_MAX` columns
+    have to be present.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        the input samples or sketches
+
+    value_column : str
+        the name of the column with the samples or centroid means
+
+    grouping_columns : List[str]
+        the columns identifying a sketch
+
+    weight_column : Optional[str]
+        the name of the column with the centroid weights, if the input consists of sketches
+
+    compression : int
+        the maximum number of centroids per sketch
+    """
+    data = data.dropna(subset=[value_column])
+    if data.empty:
+        return pd.DataFrame(columns=grouping_columns + [value_column] + SKETCH_COLUMNS)
+
+    values = data[value_column].to_numpy(dtype=np.float64)
+    if weight_column:
+        weights = data[weight_column].to_numpy(dtype=np.float64)
+        minima = data[SKETCH_MIN].to_numpy(dtype=np.float64)
+        maxima = data[SKETCH_MAX].to_numpy(dtype=np.float64)
+    else:
+        weights = np.ones(len(values))
+        minima = maxima = values
+
+    if grouping_columns:
+        grouped = data.groupby(by=grouping_columns, sort=False, observed=True)
+        group_ids = grouped.ngroup().to_numpy()
+        # drop rows with missing keys, these are not part of any group
+        if (group_ids < 0).any():
+            valid = group_ids >= 0
+            data, values, weights = data[valid], values[valid], weights[valid]
+            minima, maxima, group_ids = minima[valid], maxima[valid], group_ids[valid]
+        # the key values of every group, in the order of the group ids
+        first_rows = np.unique(group_ids, return_index=True)[1]
+        group_keys = data[grouping_columns].iloc[first_rows].reset_index(drop=True)
+    else:
+        group_ids = np.zeros(len(values), dtype=np.int64)
+        group_keys = pd.DataFrame(index=[0])
+
+    n_groups = len(group_keys)
+    group_min = np.full(n_groups, np.inf)
+    np.minimum.at(group_min, group_ids, minima)
+    group_max = np.full(n_groups, -np.inf)
+    np.maximum.at(group_max, group_ids, maxima)
+
+    centroid_groups, centroid_means, centroid_weights = compress(group_ids, values, weights, compression)
+
+    result = group_keys.iloc[centroid_groups].reset_index(drop=True)
+    result[value_column] = centroid_means
+    result[SKETCH_WEIGHT] = centroid_weights
+    result[SKETCH_MIN] = group_min[centroid_groups]
+    result[SKETCH_MAX] = group_max[centroid_groups]
+
+    return result
+
+
+def merge_sketch_frames(sketches:List[pd.DataFrame], value_column:str, grouping_columns:List[str]
+                        , compression:int = DEFAULT_COMPRESSION) -> pd.DataFrame:
+    r"""
+    Merge the sketches in the given `DataFrame`s that share the same values in `grouping_columns`
+    """
+    sketches = [ s for s in sketches if not (s is None or s.empty) ]
+    if len(sketches) == 0:
+        return pd.DataFrame(columns=grouping_columns + [value_column] + SKETCH_COLUMNS)
+
+    data = pd.concat(sketches, ignore_index=True)
+
+    return sketch_frame(data, value_column, grouping_columns, weight_column=SKETCH_WEIGHT, compression=compression)
+
+
+def get_knots(data:pd.DataFrame, value_column:str) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Return the values and cumulative probabilities of the piecewise linear
+    estimate of the CDF of the sketch in `data`. All rows are treated as
+    centroids of a single sketch.
+    """
+    means = data[value_column].to_numpy(dtype=np.float64)
+    weights = data[SKETCH_WEIGHT].to_numpy(dtype=np.float64)
+
+    order = np.argsort(means, kind='stable')
+    means = means[order]
+    weights = weights[order]
+
+    total = weights.sum()
+    q = (np.cumsum(weights) - weights / 2) / total
+
+    vmin = data[SKETCH_MIN].to_numpy(dtype=np.float64).min()
+    vmax = data[SKETCH_MAX].to_numpy(dtype=np.float64).max()
+
+    xs = np.concatenate([[vmin], means, [vmax]])
+    qs = np.concatenate([[0.], q, [1.]])
+
+    return xs, qs
+
+
+def quantiles(data:pd.DataFrame, value_column:str, probabilities) -> np.ndarray:
+    r"""
+    Estimate the quantiles for the given probabilities from the sketch in `data`
+    """
+    xs, qs = get_knots(data, value_column)
+    return np.interp(probabilities, qs, xs)
+
+
+def cdf(data:pd.DataFrame, value_column:str, x) -> np.ndarray:
+    r"""
+    Estimate the cumulative distribution function at `x` from the sketch in `data`
+    """
+    xs, qs = get_knots(data, value_column)
+    return np.interp(x, xs, qs)
+
+
+def density(data:pd.DataFrame, value_column:str, coords:np.ndarray, bandwidth:Optional[float] = None) -> np.ndarray:
+    r"""
+    Estimate the probability density at `coords` from the sketch in `data`,
+    with a gaussian kernel density estimate over the weighted centroids.
+    """
+    means = data[value_column].to_numpy(dtype=np.float64)
+    weights = data[SKETCH_WEIGHT].to_numpy(dtype=np.float64)
+    total = weights.sum()
+
+    if bandwidth is None:
+        # Scott's rule, with the number of samples represented by the sketch
+        mean = (weights * means).sum() / total
+        sd = np.sqrt((weights * (means - mean)**2).sum() / total)
+        bandwidth = sd * total**(-1/5)
+    if not bandwidth > 0:
+        bandwidth = 1.
+
+    z = (coords[:, np.newaxis] - means[np.newaxis, :]) / bandwidth
+    kernel = np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi)
+
+    return (kernel * weights).sum(axis=1) / (total * bandwidth)
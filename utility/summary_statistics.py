@@ -0,0 +1,166 @@
+r"""
+Vectorized summary statistics for plotting aggregated data.
+
+Instead of passing the raw rows to seaborn, which calculates the statistics of
+every group in a python loop, the statistics of all groups are calculated at
+once with a vectorized groupby. The result has one row per group, with the
+grouping columns and the columns in `SUMMARY_COLUMNS`.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+import scipy.stats
+
+SUMMARY_COLUMNS = ['count', 'mean', 'sd', 'ci_low', 'ci_high'
+                   , 'min', 'q1', 'median', 'q3', 'max', 'whislo', 'whishi']
+
+
+def bootstrap_mean_ci(group_ids:np.ndarray, values:np.ndarray, n_groups:int
+                      , confidence_level:float = 0.95
+                      , bootstrap_samples:int = 1000
+                      , seed:Optional[int] = None):
+    r"""
+    Estimate the confidence interval of the mean of every group by bootstrapping.
+
+    Every bootstrap iteration resamples all groups at once, so the cost is
+    linear in the number of rows times `bootstrap_samples`, independent of
+    the number of groups.
+
+    Parameters
+    ----------
+    group_ids : np.ndarray
+        the dense integer id of the group of each value
+
+    values : np.ndarray
+        the values
+
+    n_groups : int
+        the number of groups
+
+    confidence_level : float
+        the confidence level of the interval
+
+    bootstrap_samples : int
+        the number of bootstrap iterations
+
+    seed : Optional[int]
+        the seed for the random number generator
+
+    Returns
+    -------
+    The lower and upper bound of the interval for every group
+    """
+    rng = np.random.default_rng(seed)
+
+    order = np.argsort(group_ids, kind='stable')
+    group_ids = group_ids[order]
+    values = values[order]
+
+    sizes = np.bincount(group_ids, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # the start offset and size of the group of every row
+    row_starts = starts[group_ids]
+    row_sizes = sizes[group_ids]
+
+    means = np.empty((bootstrap_samples, n_groups))
+    for i in range(0, bootstrap_samples):
+        # draw every row of the resample from the rows of its own group
+        resample = row_starts + np.floor(rng.random(len(values)) * row_sizes).astype(np.int64)
+        means[i] = np.bincount(group_ids, weights=values[resample], minlength=n_groups) / sizes
+
+    alpha = (1 - confidence_level) / 2
+    low, high = np.percentile(means, [100 * alpha, 100 * (1 - alpha)], axis=0)
+
+    return low, high
+
+
+def summarize(data:pd.DataFrame, value_column:str, grouping_columns:List[str]
+              , confidence_level:float = 0.95
+              , bootstrap_samples:Optional[int] = None
+              , seed:Optional[int] = None) -> pd.DataFrame:
+    r"""
+    Calculate the summary statistics of `value_column` for every group of rows
+    sharing the same values in `grouping_columns`: the number of values, the
+    mean, the standard deviation, the confidence interval of the mean, the
+    quartiles and the whiskers of a box plot (the most extreme values within
+    1.5 times the interquartile range of the box).
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        the input data
+
+    value_column : str
+        the name of the column to summarize
+
+    grouping_columns : List[str]
+        the columns defining the groups
+
+    confidence_level : float
+        the confidence level of the interval of the mean
+
+    bootstrap_samples : Optional[int]
+        if None, the confidence interval is calculated analytically from the
+        t-distribution, otherwise it is estimated with the given number of
+        bootstrap iterations
+
+    seed : Optional[int]
+        the seed for the random number generator used for bootstrapping
+    """
+    # rows with a missing value or grouping key are not part of any group, like in seaborn
+    data = data.dropna(subset=[value_column] + list(grouping_columns or []))
+    if data.empty:
+        return pd.DataFrame(columns=grouping_columns + SUMMARY_COLUMNS)
+    values = data[value_column].astype(float)
+
+    if grouping_columns:
+        keys = [ data[c] for c in grouping_columns ]
+    else:
+        keys = np.zeros(len(values), dtype=np.int64)
+    grouped = values.groupby(keys, observed=True, sort=True)
+
+    result = grouped.agg(['count', 'mean', 'std', 'min', 'max']).rename(columns={'std': 'sd'})
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    result['q1'] = quartiles[0.25].to_numpy()
+    result['median'] = quartiles[0.5].to_numpy()
+    result['q3'] = quartiles[0.75].to_numpy()
+
+    # the ids of the groups are in the same order as the rows of the result
+    group_ids = grouped.ngroup().to_numpy()
+    n_groups = len(result)
+    v = values.to_numpy()
+
+    iqr = (result['q3'] - result['q1']).to_numpy()
+    upper = (result['q3'].to_numpy() + 1.5 * iqr)[group_ids]
+    lower = (result['q1'].to_numpy() - 1.5 * iqr)[group_ids]
+    whishi = np.full(n_groups, -np.inf)
+    np.maximum.at(whishi, group_ids, np.where(v <= upper, v, -np.inf))
+    whislo = np.full(n_groups, np.inf)
+    np.minimum.at(whislo, group_ids, np.where(v >= lower, v, np.inf))
+    result['whislo'] = whislo
+    result['whishi'] = whishi
+
+    if bootstrap_samples:
+        low, high = bootstrap_mean_ci(group_ids, v, n_groups
+                                      , confidence_level=confidence_level
+                                      , bootstrap_samples=bootstrap_samples
+                                      , seed=seed)
+    else:
+        n = result['count'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            half_width = scipy.stats.t.ppf((1 + confidence_level) / 2, n - 1) * result['sd'].to_numpy() / np.sqrt(n)
+        low = result['mean'].to_numpy() - half_width
+        high = result['mean'].to_numpy() + half_width
+    result['ci_low'] = low
+    result['ci_high'] = high
+
+    if grouping_columns:
+        result = result.reset_index()
+    else:
+        result = result.reset_index(drop=True)
+
+    return result[grouping_columns + SUMMARY_COLUMNS]